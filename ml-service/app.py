@@ -1,17 +1,96 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import asyncio
+import hmac
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Form, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Callable, List, Optional
+import os
 import uvicorn
 
+from batcher import BatcherSettings, MicroBatcher
+from executors import ExecutorSaturated, ServiceExecutors
 from inference import EngagementPredictor
+from parsed_post import ParsedPost
 from media_analyzer import MediaAnalyzer
+from media_upload import (
+    StreamedMedia, UploadError, UploadTooLarge, read_media_batch, read_media_upload
+)
+from metrics import HTTP_REQUEST_SECONDS, MEDIA_ANALYSIS_SECONDS, REGISTRY, STAGE_SECONDS
+from model_registry import RegistryWatcher
 from recommendation_engine import RecommendationEngine
+from user_insights import UserInsightsPredictor
+
+SERVICE_STARTED_AT = time.perf_counter()
+
+# Thread/process pools that keep blocking work off the event loop
+executors = ServiceExecutors()
+
+# Coalesces concurrent /predict calls into predict_batch calls
+batcher_settings = BatcherSettings()
+batcher: Optional[MicroBatcher] = None
+
+# Seconds from import to accepting requests
+startup_seconds: Optional[float] = None
+
+# Hot-reloads the active model registry version (0 disables polling)
+MODEL_WATCH_SECONDS = float(os.getenv("ML_MODEL_WATCH_SECONDS", "0"))
+watcher: Optional[RegistryWatcher] = None
+
+# Required in X-Admin-Token for /admin endpoints, which are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ML_ADMIN_TOKEN")
+
+# Background model loads started at startup (kept so failures are reported)
+background_loads: List[asyncio.Future] = []
+
+
+def _log_load_failure(name: str) -> Callable[[asyncio.Future], None]:
+    def report(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"[ERROR] Background load of {name} models failed: {future.exception()!r}")
+    return report
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global batcher, startup_seconds, watcher
+    executors.start()
+    # Load models in the background; requests wait for it via ensure_loaded
+    loop = asyncio.get_running_loop()
+    for name, load in (("engagement", predictor.ensure_loaded),
+                       ("user insights", user_insights.ensure_loaded)):
+        future = loop.run_in_executor(None, load)
+        future.add_done_callback(_log_load_failure(name))
+        background_loads.append(future)
+    if batcher_settings.enabled:
+        batcher = MicroBatcher(
+            predictor.predict_batch,
+            executors.run_predict,
+            max_batch_size=batcher_settings.max_batch_size,
+            max_wait_ms=batcher_settings.max_wait_ms
+        )
+        batcher.start()
+    if MODEL_WATCH_SECONDS > 0:
+        watcher = RegistryWatcher(predictor, _run_reload, MODEL_WATCH_SECONDS)
+        watcher.start()
+    startup_seconds = round(time.perf_counter() - SERVICE_STARTED_AT, 4)
+    yield
+    if watcher is not None:
+        await watcher.stop()
+        watcher = None
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
+    executors.shutdown()
+
 
 app = FastAPI(
     title="EngagePredict ML Service",
     description="ML-powered social media engagement prediction API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -23,10 +102,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-predictor = EngagementPredictor()
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template (not raw path) keeps label cardinality bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            request.method,
+            route.path if route is not None else "unmatched",
+            str(status)
+        )
+
+
+# Upper bound on items accepted by /predict/batch
+MAX_BATCH_SIZE = int(os.getenv("ML_MAX_BATCH_SIZE", "1000"))
+
+# Initialize components (models load lazily unless ML_LAZY_LOAD=0)
+predictor = EngagementPredictor(lazy=os.getenv("ML_LAZY_LOAD", "1") == "1")
 media_analyzer = MediaAnalyzer()
 recommendation_engine = RecommendationEngine()
+# Root-level segmentation/churn pipeline (see user_insights.py)
+user_insights = UserInsightsPredictor(lazy=True)
+
+# Scrape-time gauges for component state
+REGISTRY.gauge(
+    "engagepredict_prediction_cache",
+    "Prediction cache counters and size",
+    ["stat"],
+    lambda: {
+        (stat,): value for stat, value in predictor.cache.stats().items()
+        if stat in ("size", "hits", "misses", "evictions", "expirations")
+    }
+)
+REGISTRY.gauge(
+    "engagepredict_media_cache",
+    "Media analysis cache counters and size",
+    ["stat"],
+    lambda: {
+        (stat,): value for stat, value in media_analyzer.cache.stats().items()
+        if stat in ("size", "hits", "misses", "evictions", "disk_hits", "spilled")
+    }
+)
+REGISTRY.gauge(
+    "engagepredict_executor_pending",
+    "Calls running or queued on each executor",
+    ["executor"],
+    lambda: {(name,): stats["pending"] for name, stats in executors.stats().items()}
+)
+REGISTRY.gauge(
+    "engagepredict_model_loaded",
+    "1 if the ML ensemble is loaded, 0 if serving the rule-based fallback",
+    [],
+    lambda: {(): int(predictor.is_ready())}
+)
 
 
 class MediaInfo(BaseModel):
@@ -68,6 +203,46 @@ class PredictionResponse(BaseModel):
     predictedComments: int
 
 
+class BatchPredictionRequest(BaseModel):
+    items: List[PredictionRequest]
+
+
+class BatchPredictionResponse(BaseModel):
+    results: List[PredictionResponse]
+
+
+class ReloadRequest(BaseModel):
+    version: Optional[str] = None
+
+
+class UserInsightsRequest(BaseModel):
+    sessionDurationMinutes: float
+    pagesVisited: float
+    clickThroughRate: float
+    historicalLikes: float
+    historicalComments: float
+    daysSinceLastLogin: float
+    deviceType: str
+    userId: Optional[str] = None
+
+
+class UserInsightsResponse(BaseModel):
+    userId: Optional[str] = None
+    cluster: int
+    engagementTier: str
+    tierProbabilities: dict
+    churnProbability: float
+    components: List[float]
+
+
+class BatchUserInsightsRequest(BaseModel):
+    items: List[UserInsightsRequest]
+
+
+class BatchUserInsightsResponse(BaseModel):
+    results: List[UserInsightsResponse]
+
+
 @app.get("/")
 async def root():
     return {
@@ -79,7 +254,70 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "model_loaded": predictor.is_ready()}
+    return {
+        "status": "healthy",
+        "model_loaded": predictor.is_ready(),
+        "model_version": predictor.model_version,
+        "startup": {
+            "service_seconds": startup_seconds,
+            "models": predictor.load_stats(),
+            "user_insights": user_insights.load_stats()
+        },
+        "prediction_cache": predictor.cache.stats(),
+        "media_cache": media_analyzer.cache.stats(),
+        "executors": executors.stats()
+    }
+
+
+def _saturated(error: ExecutorSaturated) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "1"})
+
+
+def _parse_request(request: PredictionRequest) -> ParsedPost:
+    return predictor.parse_post(
+        caption=request.caption,
+        hashtags=request.hashtags,
+        platform=request.platform,
+        posting_time=request.postingTime,
+        day_of_week=request.dayOfWeek,
+        media_info=request.mediaInfo.dict() if request.mediaInfo else None
+    )
+
+
+def _build_response(post: ParsedPost, prediction: dict) -> PredictionResponse:
+    # Generate recommendations
+    with STAGE_SECONDS.time("recommendations"):
+        recommendations = recommendation_engine.generate(
+            score=prediction["score"],
+            platform=post.platform,
+            media_info=post.media_info,
+            caption_length=post.caption_length,
+            hashtag_count=post.hashtag_word_count
+        )
+
+    return PredictionResponse(
+        score=prediction["score"],
+        engagementLevel=prediction["engagement_level"],
+        feedback=prediction["feedback"],
+        tips=recommendations["tips"],
+        predictedReach=prediction["predicted_reach"],
+        predictedLikes=prediction["predicted_likes"],
+        predictedComments=prediction["predicted_comments"]
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of service metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+def _media_type_label(content_type: Optional[str]) -> str:
+    if content_type and content_type.startswith("image/"):
+        return "image"
+    if content_type and content_type.startswith("video/"):
+        return "video"
+    return "other"
 
 
 @app.post("/predict", response_model=PredictionResponse)
@@ -88,50 +326,269 @@ async def predict_engagement(request: PredictionRequest):
     Predict engagement score for social media content
     """
     try:
+        post = _parse_request(request)
+
         # Get ML prediction
-        prediction = predictor.predict(
-            caption=request.caption,
-            hashtags=request.hashtags,
-            platform=request.platform,
-            posting_time=request.postingTime,
-            day_of_week=request.dayOfWeek,
-            media_info=request.mediaInfo.dict() if request.mediaInfo else None
+        if batcher is not None:
+            prediction = await batcher.submit(post)
+        else:
+            prediction = await executors.run_predict(predictor.predict_post, post)
+        return _build_response(post, prediction)
+    except ExecutorSaturated as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_engagement_batch(request: BatchPredictionRequest):
+    """
+    Predict engagement scores for many posts in one call.
+    Results are returned in the same order as the request items.
+    """
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.items)} items (max {MAX_BATCH_SIZE})"
         )
-        
-        # Generate recommendations
-        recommendations = recommendation_engine.generate(
-            score=prediction["score"],
-            platform=request.platform,
-            media_info=request.mediaInfo.dict() if request.mediaInfo else None,
-            caption_length=len(request.caption),
-            hashtag_count=len(request.hashtags.split()) if request.hashtags else 0
+
+    try:
+        posts = [_parse_request(item) for item in request.items]
+        predictions = await executors.run_predict(predictor.predict_batch, posts)
+        return BatchPredictionResponse(results=[
+            _build_response(post, prediction)
+            for post, prediction in zip(posts, predictions)
+        ])
+    except ExecutorSaturated as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _user_record(request: UserInsightsRequest) -> dict:
+    return {
+        "session_duration_minutes": request.sessionDurationMinutes,
+        "pages_visited": request.pagesVisited,
+        "click_through_rate": request.clickThroughRate,
+        "historical_likes": request.historicalLikes,
+        "historical_comments": request.historicalComments,
+        "days_since_last_login": request.daysSinceLastLogin,
+        "device_type": request.deviceType
+    }
+
+
+def _user_response(request: UserInsightsRequest, insights: dict) -> UserInsightsResponse:
+    return UserInsightsResponse(
+        userId=request.userId,
+        cluster=insights["cluster"],
+        engagementTier=insights["engagement_tier"],
+        tierProbabilities=insights["tier_probabilities"],
+        churnProbability=insights["churn_probability"],
+        components=insights["components"]
+    )
+
+
+async def _user_insights(items: List[UserInsightsRequest]) -> List[UserInsightsResponse]:
+    await executors.run_predict(user_insights.ensure_loaded)
+    if not user_insights.is_ready():
+        raise HTTPException(status_code=503, detail="User insights models not loaded")
+    try:
+        insights = await executors.run_predict(
+            user_insights.predict_batch, [_user_record(item) for item in items]
         )
-        
-        return PredictionResponse(
-            score=prediction["score"],
-            engagementLevel=prediction["engagement_level"],
-            feedback=prediction["feedback"],
-            tips=recommendations["tips"],
-            predictedReach=prediction["predicted_reach"],
-            predictedLikes=prediction["predicted_likes"],
-            predictedComments=prediction["predicted_comments"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [_user_response(item, result) for item, result in zip(items, insights)]
+
+
+@app.post("/user-insights", response_model=UserInsightsResponse)
+async def user_insights_single(request: UserInsightsRequest):
+    """
+    Behavioral segment, engagement tier and churn probability for one user
+    """
+    try:
+        return (await _user_insights([request]))[0]
+    except HTTPException:
+        raise
+    except ExecutorSaturated as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/user-insights/batch", response_model=BatchUserInsightsResponse)
+async def user_insights_batch(request: BatchUserInsightsRequest):
+    """
+    User insights for many users in one call; the scaler/PCA projection
+    runs once for the whole batch. Results keep the request order.
+    """
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.items)} items (max {MAX_BATCH_SIZE})"
         )
+
+    try:
+        return BatchUserInsightsResponse(results=await _user_insights(request.items))
+    except HTTPException:
+        raise
+    except ExecutorSaturated as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/analyze-media")
-async def analyze_media(file: UploadFile = File(...)):
+_reload_lock = asyncio.Lock()
+
+
+async def _run_reload(reload, version: Optional[str] = None) -> dict:
+    """Load and warm a model version on a worker thread; one reload at a time."""
+    async with _reload_lock:
+        return await asyncio.get_running_loop().run_in_executor(None, reload, version)
+
+
+@app.post("/admin/reload")
+async def reload_models(request: Optional[ReloadRequest] = None,
+                        x_admin_token: Optional[str] = Header(None)):
+    """
+    Switch to a model registry version (default: the active one).
+
+    Requests keep being served by the current ensemble while the new one
+    loads and warms up; the switch itself is a single reference swap.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled: ML_ADMIN_TOKEN is not set")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    try:
+        return await _run_reload(predictor.reload, request.version if request else None)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _multipart_body(field: str, multiple: bool = False) -> dict:
+    """OpenAPI request body for endpoints that parse multipart uploads themselves."""
+    schema = {"type": "string", "format": "binary"}
+    if multiple:
+        schema = {"type": "array", "items": schema}
+    return {"requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object", "required": [field], "properties": {field: schema}
+        }}}
+    }}
+
+
+async def _probe_media(media: StreamedMedia) -> Optional[dict]:
+    """Header/container probe of a partial upload, on the I/O threads"""
+    return await executors.run_io(media_analyzer.probe_stream, media.file, media.media_type)
+
+
+async def _analyze_streamed(media: StreamedMedia) -> dict:
+    """Metrics for an upload whose header/container probe didn't succeed."""
+    if media.media_type is None:
+        return media_analyzer.unsupported_media()
+    if _media_type_label(media.media_type) == "video":
+        # Container seeks and frame reads on the I/O threads, MJPEG decoding in the process pool
+        key, analysis, keyframes = await executors.run_io(
+            media_analyzer.read_video_stream, media.file, media.media_type
+        )
+        if keyframes is not None:
+            analysis = await executors.run_media(
+                media_analyzer.measure_keyframes, analysis, *keyframes
+            )
+        return media_analyzer.remember(key, analysis)
+    contents = await executors.run_io(media.read_all)
+    key = media_analyzer.cache_key(contents, len(contents), media.media_type)
+    cached = media_analyzer.lookup(key)
+    if cached is not None:
+        return cached
+    analysis = await executors.run_media(media_analyzer.analyze, contents, media.media_type)
+    return media_analyzer.remember(key, analysis)
+
+
+@app.post("/analyze-media", openapi_extra=_multipart_body("file"))
+async def analyze_media(request: Request):
     """
     Analyze uploaded media file for quality metrics
+
+    The upload is streamed (at most ML_MEDIA_MAX_BYTES) and reading stops
+    once the image header or container metadata has been parsed.
     """
+    media = None
     try:
-        contents = await file.read()
-        analysis = media_analyzer.analyze(contents, file.content_type)
+        media, analysis = await read_media_upload(
+            request.headers.get("content-type"), request.stream(), _probe_media
+        )
+        with MEDIA_ANALYSIS_SECONDS.time(_media_type_label(media.media_type)):
+            if analysis is None:
+                analysis = await _analyze_streamed(media)
         return analysis
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorSaturated as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if media is not None:
+            media.close()
+
+
+@app.post("/analyze-media/batch", openapi_extra=_multipart_body("files", multiple=True))
+async def analyze_media_batch(request: Request):
+    """
+    Analyze several uploaded files (repeated "files" fields) in one call.
+
+    Files that need decoding are analyzed concurrently on the media process
+    pool. Results keep the upload order; a file that fails gets an "error"
+    entry without failing the rest of the batch.
+    """
+    files: List[StreamedMedia] = []
+    try:
+        files = await read_media_batch(
+            request.headers.get("content-type"), request.stream(), _probe_media
+        )
+
+        async def analyze_one(media: StreamedMedia) -> dict:
+            if media.error is not None:
+                return {"error": media.error}
+            if media.metrics is not None:
+                return media.metrics
+            with MEDIA_ANALYSIS_SECONDS.time(_media_type_label(media.media_type)):
+                return await _analyze_streamed(media)
+
+        outcomes = await asyncio.gather(
+            *[analyze_one(media) for media in files], return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, ExecutorSaturated):
+                raise outcome
+        results = [
+            {"filename": media.filename,
+             **(outcome if isinstance(outcome, dict) else {"error": str(outcome)})}
+            for media, outcome in zip(files, outcomes)
+        ]
+        return {"results": results}
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorSaturated as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for media in files:
+            media.close()
 
 
 if __name__ == "__main__":
+    # Development server; production runs serve.py (multi-worker, preloaded models)
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
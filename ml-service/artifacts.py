@@ -0,0 +1,125 @@
+"""
+EngagePredict - Memory-Mapped Model Artifacts
+Stores the compiled ensemble as plain .npy arrays plus a JSON manifest.
+
+Unlike the pickles, the arrays (KNN fit data, RF node arrays, scaler
+mean/scale, LR coefficients) are opened with np.load(mmap_mode="r"), so
+startup does no unpickling and every uvicorn worker on a host shares the
+same pages through the OS page cache.
+
+Usage (after train_models.py):
+    python artifacts.py
+"""
+
+import json
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from compiled_ensemble import ARRAY_FIELDS, CompiledEnsemble
+
+
+ARRAYS_DIRNAME = "arrays"
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def export_arrays(
+    ensemble: CompiledEnsemble, directory: str, classes, max_abs_error: Optional[float] = None,
+    extra: Optional[Dict] = None
+) -> str:
+    """
+    Write a compiled ensemble to `directory` as .npy files + manifest.
+    `extra` is merged into the manifest (e.g. version bookkeeping).
+
+    The directory is written next to its final location and renamed into
+    place, so readers never see a half-written artifact set.
+    """
+    arrays, meta = ensemble.to_arrays()
+    staging = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "classes": [str(c) for c in classes],
+        "meta": meta,
+        "max_abs_error": max_abs_error,
+        **(extra or {})
+    }
+    with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return directory
+
+
+def has_arrays(directory: str) -> bool:
+    return os.path.isfile(os.path.join(directory, MANIFEST_NAME))
+
+
+def load_arrays(directory: str, weights: Dict[str, float], mmap: bool = True):
+    """
+    Open an exported artifact set.
+
+    Returns (CompiledEnsemble, manifest). Arrays are memory-mapped
+    read-only unless `mmap` is False.
+    """
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported artifact format {manifest.get('format_version')} "
+            f"(expected {FORMAT_VERSION})"
+        )
+
+    mmap_mode = "r" if mmap else None
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in ARRAY_FIELDS
+    }
+    return CompiledEnsemble.from_arrays(arrays, manifest["meta"], weights), manifest
+
+
+def export_from_pickles() -> str:
+    """Compile the pickled models, verify against sklearn and export arrays."""
+    from inference import COMPILED_TOLERANCE, EngagementPredictor
+
+    predictor = EngagementPredictor(compiled=False, use_arrays=False)
+    if not predictor.is_ready():
+        raise RuntimeError("Pickled models not available. Run 'python train_models.py' first.")
+
+    ensemble = CompiledEnsemble(
+        predictor.scaler, predictor.lr_model, predictor.rf_model,
+        predictor.knn_model, predictor.weights
+    )
+    error = ensemble.max_abs_error(lambda features: predictor._sklearn_ensemble_proba(features)[3])
+    if error > COMPILED_TOLERANCE:
+        raise RuntimeError(f"Compiled ensemble deviates from sklearn by {error:.2e}")
+
+    directory = os.path.join(predictor.models_dir, ARRAYS_DIRNAME)
+    export_arrays(ensemble, directory, predictor.label_encoder.classes_, error)
+    print(f"[SAVED] {ARRAYS_DIRNAME}/ (max deviation {error:.2e})")
+    return directory
+
+
+if __name__ == "__main__":
+    try:
+        directory = export_from_pickles()
+    except RuntimeError as e:
+        raise SystemExit(f"[ERROR] {e}")
+
+    # Services serve the active registry version once one exists
+    from model_registry import ModelRegistry
+    registry = ModelRegistry(os.path.dirname(directory))
+    if registry.exists():
+        print(f"[SAVED] registry version {registry.publish_from(registry.models_dir, {'source': 'artifacts'})}")
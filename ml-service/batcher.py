@@ -0,0 +1,131 @@
+"""
+EngagePredict - Micro-Batching Request Coalescer
+Gathers single /predict requests that arrive within a short window and
+scores them as one matrix through EngagementPredictor.predict_batch.
+
+Callers still await a single result; each one gets its own future back.
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+
+class BatcherSettings:
+    """Batching window, read from the environment."""
+
+    def __init__(self):
+        self.enabled = os.getenv("ML_MICRO_BATCHING", "1") == "1"
+        self.max_batch_size = int(os.getenv("ML_BATCH_MAX_SIZE", "64"))
+        self.max_wait_ms = float(os.getenv("ML_BATCH_WINDOW_MS", "2"))
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item calls into batch calls.
+
+    `process_batch` takes a list of items and returns a list of results in
+    the same order. `runner` decides where it runs (e.g. a thread pool).
+    A batch is flushed once it holds `max_batch_size` items or the first
+    item has waited `max_wait_ms`.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        runner: Callable[..., Awaitable[List[Any]]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0
+    ):
+        self.process_batch = process_batch
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    @property
+    def running(self) -> bool:
+        return self._collector is not None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._collector is None:
+            return
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        self._collector = None
+
+        # Let batches that were already dispatched finish
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        # Anything still queued never made it into a batch (the collector
+        # dispatched the one it was gathering when it was cancelled)
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result."""
+        if self._collector is None:
+            raise RuntimeError("Batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            try:
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            finally:
+                # Also on cancellation (stop), so gathered items are not lost
+                self._start_dispatch(batch)
+
+    def _start_dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Dispatch without blocking collection of the next batch."""
+        task = asyncio.create_task(self._dispatch(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        try:
+            results = await self.runner(self.process_batch, items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch of {len(items)} items returned {len(results)} results")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
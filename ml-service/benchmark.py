@@ -0,0 +1,499 @@
+"""
+EngagePredict - Benchmark Suite
+Reproducible micro-benchmarks and an in-process load test for the ML service.
+
+Usage:
+    python benchmark.py micro                      # hot-path micro-benchmarks
+    python benchmark.py load --concurrency 1 8 32  # FastAPI load test sweep
+    python benchmark.py scale --workers 1 2 4 8      # multi-worker throughput per core
+    python benchmark.py all
+    python benchmark.py compare old.json new.json  # diff two result files
+
+Results are written as JSON (default: benchmark_results/<timestamp>-<commit>.json)
+so runs from different commits can be compared.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results")
+
+PLATFORMS = ["instagram", "tiktok", "youtube", "twitter", "facebook"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+CAPTION_WORDS = [
+    "new", "post", "check", "this", "out", "summer", "vibes", "like", "share",
+    "follow", "for", "more", "today", "our", "team", "launch", "😀", "🔥", "link", "bio"
+]
+MEDIA_PROFILES = [
+    None,
+    {"type": "image", "resolution": "1080p", "orientation": "Portrait", "qualityScore": "High"},
+    {"type": "image", "resolution": "720p", "orientation": "Landscape", "qualityScore": "Medium"},
+    {"type": "video", "resolution": "4K", "orientation": "Landscape", "qualityScore": "High"},
+    {"type": "image", "resolution": "SD", "orientation": "Square", "qualityScore": "Low"},
+]
+
+
+# ─── Synthetic inputs ───────────────────────────────────────────
+
+def synthetic_posts(n: int, seed: int = 42) -> List[Dict]:
+    """Deterministic posts in the keyword format of EngagementPredictor.predict."""
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(n):
+        caption = " ".join(rng.choices(CAPTION_WORDS, k=rng.randint(3, 80)))
+        hashtags = " ".join(f"#tag{rng.randint(0, 500)}" for _ in range(rng.randint(0, 20)))
+        posts.append({
+            "caption": caption,
+            "hashtags": hashtags,
+            "platform": rng.choice(PLATFORMS),
+            "posting_time": f"{rng.randint(0, 23)}:{rng.choice(['00', '15', '30', '45'])}",
+            "day_of_week": rng.choice(DAYS),
+            "media_info": rng.choice(MEDIA_PROFILES)
+        })
+    return posts
+
+
+def to_request_payload(post: Dict) -> Dict:
+    """Convert predictor keyword arguments to a /predict JSON body."""
+    return {
+        "caption": post["caption"],
+        "hashtags": post["hashtags"],
+        "platform": post["platform"],
+        "postingTime": post["posting_time"],
+        "dayOfWeek": post["day_of_week"],
+        "mediaInfo": post["media_info"]
+    }
+
+
+def synthetic_images(seed: int = 42) -> Dict[str, bytes]:
+    """Encoded test images of increasing size."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    images = {}
+    for label, (width, height), fmt in [
+        ("jpeg_640x480", (640, 480), "JPEG"),
+        ("png_1080x1920", (1080, 1920), "PNG"),
+        ("jpeg_3840x2160", (3840, 2160), "JPEG"),
+    ]:
+        pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, fmt)
+        images[label] = buf.getvalue()
+    return images
+
+
+# ─── Measurement helpers ────────────────────────────────────────
+
+def percentile(samples: List[float], pct: float) -> float:
+    return float(np.percentile(samples, pct)) if samples else 0.0
+
+
+def summarize(samples_s: List[float]) -> Dict:
+    """Latency summary in microseconds."""
+    us = [s * 1e6 for s in samples_s]
+    return {
+        "n": len(us),
+        "min_us": round(min(us), 2),
+        "mean_us": round(statistics.fmean(us), 2),
+        "p50_us": round(percentile(us, 50), 2),
+        "p95_us": round(percentile(us, 95), 2),
+        "p99_us": round(percentile(us, 99), 2),
+        "ops_per_s": round(len(us) / (sum(us) / 1e6), 1) if sum(us) else 0.0
+    }
+
+
+def time_calls(fn: Callable, args_list: List, warmup: int = 20) -> Dict:
+    """Time fn(*args) once per entry of args_list after a short warmup."""
+    for args in args_list[:warmup]:
+        fn(*args)
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+# ─── Micro-benchmarks ───────────────────────────────────────────
+
+def run_micro(iterations: int, batch_size: int, seed: int) -> Dict:
+    from contextlib import redirect_stdout
+
+    from inference import EngagementPredictor
+    from media_analyzer import MediaAnalyzer
+    from media_cache import MediaCache
+    from recommendation_engine import RecommendationEngine
+
+    with redirect_stdout(io.StringIO()):
+        predictor = EngagementPredictor()
+    recommender = RecommendationEngine()
+    # Uncached, so repeated images measure the analysis itself
+    analyzer = MediaAnalyzer(cache=MediaCache(max_size=0))
+
+    posts = synthetic_posts(iterations, seed)
+    parsed = [predictor.parse_post(**post) for post in posts]
+    results = {}
+
+    print(f"[MICRO] {iterations} iterations, model_loaded={predictor.is_ready()}")
+
+    results["parse_post"] = time_calls(lambda p: predictor.parse_post(**p), [(p,) for p in posts])
+    results["extract_features"] = time_calls(predictor._extract_features, [(p,) for p in parsed])
+
+    # Disable the prediction cache so every call reaches the models
+    cache_size = predictor.cache.max_size
+    predictor.cache.max_size = 0
+    try:
+        results["predict"] = time_calls(lambda p: predictor.predict(**p), [(p,) for p in posts])
+        batches = [
+            (posts[i:i + batch_size],)
+            for i in range(0, max(len(posts) - batch_size + 1, 1), batch_size)
+        ]
+        batch = time_calls(predictor.predict_batch, batches, warmup=2)
+        batch["batch_size"] = batch_size
+        batch["rows_per_s"] = round(batch["ops_per_s"] * batch_size, 1)
+        results["predict_batch"] = batch
+    finally:
+        predictor.cache.max_size = cache_size
+
+    results["recommendations"] = time_calls(
+        lambda p: recommender.generate(
+            score=random.randint(0, 100), platform=p.platform, media_info=p.media_info,
+            caption_length=p.caption_length, hashtag_count=p.hashtag_word_count
+        ),
+        [(p,) for p in parsed]
+    )
+
+    try:
+        images = synthetic_images(seed)
+    except ImportError:
+        images = {}
+        print("[WARN] Pillow not installed, skipping MediaAnalyzer benchmarks")
+    content_types = {"jpeg": "image/jpeg", "png": "image/png"}
+    for label, data in images.items():
+        content_type = content_types[label.split("_")[0]]
+        rounds = max(5, iterations // 50)
+        results[f"media_analyze_{label}"] = time_calls(
+            analyzer.analyze, [(data, content_type)] * rounds, warmup=2
+        )
+
+    for name, stats in results.items():
+        print(f"   {name:<32} p50 {stats['p50_us']:>12.1f} µs   p99 {stats['p99_us']:>12.1f} µs")
+    return results
+
+
+# ─── Load test ──────────────────────────────────────────────────
+
+async def _drive(client, payloads: List[Dict], concurrency: int, requests: int):
+    """Send `requests` /predict calls over `concurrency` connections; latencies in ms."""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            payload = payloads[i % len(payloads)]
+            start = time.perf_counter()
+            response = await client.post("/predict", json=payload)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, statuses
+
+
+def _level_stats(ms: List[float], statuses: Dict[str, int], elapsed: float) -> Dict:
+    return {
+        "requests": len(ms),
+        "status_codes": statuses,
+        "throughput_rps": round(len(ms) / elapsed, 1),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0
+    }
+
+
+async def _load_level(client, payloads: List[Dict], concurrency: int, requests: int) -> Dict:
+    start = time.perf_counter()
+    ms, statuses = await _drive(client, payloads, concurrency, requests)
+    return {"concurrency": concurrency, **_level_stats(ms, statuses, time.perf_counter() - start)}
+
+
+async def _run_load(concurrency_levels: List[int], requests: int, seed: int) -> List[Dict]:
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("[ERROR] The load test needs httpx: pip install httpx")
+
+    import app as service
+
+    payloads = [to_request_payload(post) for post in synthetic_posts(1000, seed)]
+    levels = []
+    async with service.lifespan(service.app):
+        service.predictor.ensure_loaded()
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Warm up code paths and caches
+            await _load_level(client, payloads, 4, 50)
+            service.predictor.cache.clear()
+            for concurrency in concurrency_levels:
+                result = await _load_level(client, payloads, concurrency, requests)
+                levels.append(result)
+                print(f"   c={concurrency:<4} {result['throughput_rps']:>9.1f} req/s   "
+                      f"p50 {result['p50_ms']:.2f} ms   p95 {result['p95_ms']:.2f} ms   "
+                      f"p99 {result['p99_ms']:.2f} ms")
+    return levels
+
+
+def run_load(concurrency_levels: List[int], requests: int, seed: int) -> List[Dict]:
+    print(f"[LOAD] {requests} requests per level, concurrency {concurrency_levels}")
+    return asyncio.run(_run_load(concurrency_levels, requests, seed))
+
+
+# ─── Multi-worker scaling ───────────────────────────────────────
+
+SERVE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+
+
+def _pin_to(cpus: Optional[List[int]]) -> Optional[Callable]:
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return None
+    return lambda: os.sched_setaffinity(0, cpus)
+
+
+def _http_client(url: str, payloads: List[Dict], concurrency: int,
+                 cpus: Optional[List[int]]):
+    """Load-generator process: send every payload to a running server."""
+    import httpx
+
+    pin = _pin_to(cpus)
+    if pin:
+        pin()
+
+    async def drive():
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            return await _drive(client, payloads, concurrency, len(payloads))
+
+    return asyncio.run(drive())
+
+
+def _wait_ready(url: str, server: subprocess.Popen, timeout: float = 120.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"[ERROR] serve.py exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).json().get("model_loaded"):
+                return
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"[ERROR] serve.py was not ready after {timeout:.0f}s")
+
+
+def run_scale(worker_counts: List[int], clients: int, concurrency: int,
+              requests: int, seed: int, port: int) -> List[Dict]:
+    """
+    Throughput of serve.py at each worker count.
+
+    The server is confined to the first `workers` CPUs (one pinned worker
+    per CPU) and the load generators to the remaining CPUs when there are
+    any, so requests/s per core is not skewed by client overhead. Every
+    request carries a distinct post so the prediction cache never hits.
+    """
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        raise SystemExit("[ERROR] The scaling benchmark needs httpx: pip install httpx")
+    from concurrent.futures import ProcessPoolExecutor
+    from serve import available_cpus
+
+    cpus = available_cpus() or list(range(os.cpu_count() or 1))
+    url = f"http://127.0.0.1:{port}"
+    payloads = [to_request_payload(post) for post in synthetic_posts(requests, seed)]
+    warmup = [to_request_payload(post) for post in synthetic_posts(50 * clients, seed + 1)]
+    per_client = max(1, concurrency // clients)
+    print(f"[SCALE] {requests} requests per level, {clients} clients x {per_client} connections, "
+          f"workers {worker_counts}")
+
+    levels = []
+    for workers in worker_counts:
+        server_cpus = cpus[:workers]
+        client_cpus = cpus[workers:] or None
+        server = subprocess.Popen(
+            [sys.executable, SERVE_SCRIPT, "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--pin-cpus"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            preexec_fn=_pin_to(server_cpus)
+        )
+        try:
+            _wait_ready(url, server)
+            with ProcessPoolExecutor(max_workers=clients) as pool:
+                def run_clients(batch: List[Dict]):
+                    return list(pool.map(
+                        _http_client, [url] * clients,
+                        [batch[i::clients] for i in range(clients)],
+                        [per_client] * clients, [client_cpus] * clients
+                    ))
+
+                run_clients(warmup)
+                start = time.perf_counter()
+                outcomes = run_clients(payloads)
+                elapsed = time.perf_counter() - start
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+        ms = [latency for latencies, _ in outcomes for latency in latencies]
+        statuses: Dict[str, int] = {}
+        for _, counts in outcomes:
+            for code, n in counts.items():
+                statuses[code] = statuses.get(code, 0) + n
+        result = {"workers": workers, "cpus": len(server_cpus),
+                  **_level_stats(ms, statuses, elapsed)}
+        result["rps_per_core"] = round(result["throughput_rps"] / result["cpus"], 1)
+        baseline = levels[0]["rps_per_core"] if levels else result["rps_per_core"]
+        result["scaling_efficiency"] = round(result["rps_per_core"] / baseline, 3) if baseline else 0.0
+        levels.append(result)
+        print(f"   workers={workers:<3} {result['throughput_rps']:>9.1f} req/s   "
+              f"{result['rps_per_core']:>8.1f} req/s/core   "
+              f"efficiency {result['scaling_efficiency']:.2f}   p99 {result['p99_ms']:.2f} ms")
+    return levels
+
+
+# ─── Results ────────────────────────────────────────────────────
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict:
+    settings = {key: value for key, value in os.environ.items() if key.startswith("ML_")}
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "settings": settings
+    }
+
+
+def write_results(results: Dict, output: Optional[str]) -> str:
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit'] or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[SAVED] {output}")
+    return output
+
+
+def compare(old_path: str, new_path: str):
+    """Print relative p50/throughput change between two result files."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{'benchmark':<34} {'old':>12} {'new':>12} {'change':>9}")
+    for name, stats in new.get("micro", {}).items():
+        if name in old.get("micro", {}):
+            before, after = old["micro"][name]["p50_us"], stats["p50_us"]
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"{name + ' p50 µs':<34} {before:>12.1f} {after:>12.1f} {change:>+8.1f}%")
+
+    old_levels = {level["concurrency"]: level for level in old.get("load", [])}
+    for level in new.get("load", []):
+        before = old_levels.get(level["concurrency"])
+        if before:
+            label = f"load c={level['concurrency']} req/s"
+            change = ((level["throughput_rps"] - before["throughput_rps"])
+                      / before["throughput_rps"] * 100) if before["throughput_rps"] else 0.0
+            print(f"{label:<34} {before['throughput_rps']:>12.1f} "
+                  f"{level['throughput_rps']:>12.1f} {change:>+8.1f}%")
+
+    old_scale = {level["workers"]: level for level in old.get("scale", [])}
+    for level in new.get("scale", []):
+        before = old_scale.get(level["workers"])
+        if before:
+            label = f"scale workers={level['workers']} req/s/core"
+            change = ((level["rps_per_core"] - before["rps_per_core"])
+                      / before["rps_per_core"] * 100) if before["rps_per_core"] else 0.0
+            print(f"{label:<34} {before['rps_per_core']:>12.1f} "
+                  f"{level['rps_per_core']:>12.1f} {change:>+8.1f}%")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="EngagePredict ML service benchmarks")
+    parser.add_argument("mode", choices=["micro", "load", "scale", "all", "compare"])
+    parser.add_argument("files", nargs="*", help="Result files for 'compare'")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="Worker counts for 'scale'")
+    parser.add_argument("--clients", type=int, default=2,
+                        help="Load-generator processes for 'scale'")
+    parser.add_argument("--scale-concurrency", type=int, default=64,
+                        help="Total open connections for 'scale'")
+    parser.add_argument("--port", type=int, default=8765, help="serve.py port for 'scale'")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Result file path")
+    args = parser.parse_args(argv)
+
+    if args.mode == "compare":
+        if len(args.files) != 2:
+            parser.error("compare needs exactly two result files")
+        compare(*args.files)
+        return
+
+    # Keep sampled prediction logs out of the measurements
+    os.environ.setdefault("ML_PREDICTION_LOG_SAMPLE_RATE", "0")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": environment(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("mode", "files", "output")}
+    }
+    if args.mode in ("micro", "all"):
+        results["micro"] = run_micro(args.iterations, args.batch_size, args.seed)
+    if args.mode in ("load", "all"):
+        results["load"] = run_load(args.concurrency, args.requests, args.seed)
+    if args.mode == "scale":
+        results["scale"] = run_scale(args.workers, args.clients, args.scale_concurrency,
+                                     args.requests, args.seed, args.port)
+
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
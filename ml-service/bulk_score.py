@@ -0,0 +1,264 @@
+"""
+EngagePredict - Offline Bulk Scoring
+Scores a large file of posts without going through the HTTP API.
+
+Usage:
+    python bulk_score.py posts.csv scores.csv
+    python bulk_score.py posts.jsonl scores.jsonl --chunk-size 50000 --workers 8
+    python bulk_score.py posts.parquet scores.csv --keep id campaign
+
+Input is CSV, JSONL or Parquet (Parquet needs pyarrow) with the /predict
+field names (caption, hashtags, platform, postingTime, dayOfWeek and a
+mediaInfo object or flat resolution/orientation/qualityScore columns);
+snake_case names work too. The file is read in chunks, each chunk is scored
+by EngagementPredictor.score_frame in a process pool, and results are
+appended to the output (CSV or JSONL) in input order, so memory stays
+bounded by a few chunks per worker.
+
+After every chunk written, a checkpoint (<output>.checkpoint) records how
+far the output got. Re-running the same command resumes from there;
+--restart starts over.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+OUTPUT_FORMATS = ("csv", "jsonl")
+# Columns copied to the output by default, when present
+DEFAULT_KEEP = ["id"]
+# Chunks queued per worker; bounds memory while keeping workers busy
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+
+def file_format(path: str, override: Optional[str] = None) -> str:
+    if override:
+        return override
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise SystemExit(f"Can't tell the format of {path}; pass --input-format/--output-format")
+    return FORMATS[ext]
+
+
+# ─── Input ──────────────────────────────────────────────────────
+
+def read_chunks(path: str, fmt: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """DataFrames of at most `chunk_size` rows, in file order."""
+    if fmt == "csv":
+        # Keep text as-is ("NA" is a caption, not a missing value); only
+        # empty cells are missing, so an empty resolution means no media
+        yield from pd.read_csv(
+            path, chunksize=chunk_size, dtype=str,
+            keep_default_na=False, na_values=[""]
+        )
+    elif fmt == "jsonl":
+        yield from pd.read_json(
+            path, lines=True, chunksize=chunk_size,
+            dtype=False, convert_dates=False
+        )
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading Parquet needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported input format: {fmt}")
+
+
+# ─── Workers ────────────────────────────────────────────────────
+
+_predictor = None
+
+
+def _init_worker():
+    """Load the models once per process."""
+    global _predictor
+    # Keep sampled prediction logs out of the output streams
+    os.environ.setdefault("ML_PREDICTION_LOG_SAMPLE_RATE", "0")
+    try:
+        # One BLAS thread per process; the pool provides the parallelism
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+    from inference import EngagementPredictor
+    _predictor = EngagementPredictor(lazy=True)
+    _predictor.ensure_loaded()
+
+
+def score_chunk(chunk: pd.DataFrame, keep: List[str], fmt: str, header: bool) -> str:
+    """Score one chunk and render its output rows (rendering stays in the worker)."""
+    scores, levels = _predictor.score_frame(chunk)
+    out = chunk[[name for name in keep if name in chunk.columns]].copy()
+    out["score"] = scores
+    out["engagement_level"] = levels
+    if fmt == "csv":
+        return out.to_csv(index=False, header=header)
+    if out.empty:
+        return ""
+    return out.to_json(orient="records", lines=True, force_ascii=False) + "\n"
+
+
+# ─── Checkpoints ────────────────────────────────────────────────
+
+def _input_fingerprint(path: str, chunk_size: int) -> Dict:
+    stat = os.stat(path)
+    return {
+        "input": os.path.abspath(path),
+        "input_size": stat.st_size,
+        "input_mtime_ns": stat.st_mtime_ns,
+        "chunk_size": chunk_size
+    }
+
+
+def load_checkpoint(path: str, fingerprint: Dict) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    stale = {k for k, v in fingerprint.items() if checkpoint.get(k) != v}
+    if stale:
+        raise SystemExit(
+            f"Checkpoint {path} was made for a different run ({', '.join(sorted(stale))} "
+            "changed); use --restart to start over"
+        )
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ─── Driver ─────────────────────────────────────────────────────
+
+class Progress:
+    def __init__(self, rows_done: int):
+        self.start = time.perf_counter()
+        self.rows_at_start = rows_done
+        self.rows = rows_done
+
+    def update(self, chunk_index: int, rows: int):
+        self.rows += rows
+        print(
+            f"chunk {chunk_index}: {self.rows:,} rows scored "
+            f"({self.rows_per_second():,.0f} rows/s)",
+            file=sys.stderr, flush=True
+        )
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def rows_per_second(self) -> float:
+        return (self.rows - self.rows_at_start) / max(self.elapsed(), 1e-9)
+
+
+def run(args) -> Dict:
+    in_fmt = file_format(args.input, args.input_format)
+    out_fmt = file_format(args.output, args.output_format)
+    if out_fmt not in OUTPUT_FORMATS:
+        raise SystemExit(f"Output must be one of: {', '.join(OUTPUT_FORMATS)}")
+
+    checkpoint_path = args.output + ".checkpoint"
+    fingerprint = _input_fingerprint(args.input, args.chunk_size)
+    checkpoint = None if args.restart else load_checkpoint(checkpoint_path, fingerprint)
+    if checkpoint and checkpoint.get("complete"):
+        print(f"{args.output} is already complete ({checkpoint['rows_done']:,} rows)", file=sys.stderr)
+        return checkpoint
+    if checkpoint is None:
+        checkpoint = dict(fingerprint, chunks_done=0, rows_done=0, output_bytes=0, complete=False)
+    else:
+        print(f"Resuming after {checkpoint['rows_done']:,} rows", file=sys.stderr)
+
+    workers = args.workers or os.cpu_count() or 1
+    progress = Progress(checkpoint["rows_done"])
+    chunks = read_chunks(args.input, in_fmt, args.chunk_size)
+
+    with open(args.output, "a+b") as out:
+        # Drop anything written after the last checkpoint (e.g. a killed run)
+        out.truncate(checkpoint["output_bytes"])
+        out.seek(0, os.SEEK_END)
+
+        def write(index: int, text: str, rows: int):
+            out.write(text.encode("utf-8"))
+            out.flush()
+            os.fsync(out.fileno())
+            checkpoint.update(
+                chunks_done=index + 1,
+                rows_done=checkpoint["rows_done"] + rows,
+                output_bytes=out.tell()
+            )
+            save_checkpoint(checkpoint_path, checkpoint)
+            progress.update(index, rows)
+
+        def pending_chunks():
+            for index, chunk in enumerate(chunks):
+                if index >= checkpoint["chunks_done"]:
+                    yield index, chunk
+
+        if workers == 1:
+            _init_worker()
+            for index, chunk in pending_chunks():
+                write(index, score_chunk(chunk, args.keep, out_fmt, index == 0), len(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                in_flight = []
+                for index, chunk in pending_chunks():
+                    future = pool.submit(score_chunk, chunk, args.keep, out_fmt, index == 0)
+                    in_flight.append((index, len(chunk), future))
+                    # Results are written in input order
+                    while len(in_flight) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                        done_index, rows, done = in_flight.pop(0)
+                        write(done_index, done.result(), rows)
+                for done_index, rows, done in in_flight:
+                    write(done_index, done.result(), rows)
+
+    checkpoint["complete"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    summary = {
+        "rows": checkpoint["rows_done"],
+        "rows_this_run": progress.rows - progress.rows_at_start,
+        "seconds": round(progress.elapsed(), 2),
+        "rows_per_second": round(progress.rows_per_second(), 1),
+        "workers": workers
+    }
+    print(json.dumps(summary), file=sys.stderr)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Score a file of posts offline")
+    parser.add_argument("input", help="CSV, JSONL or Parquet file of posts")
+    parser.add_argument("output", help="CSV or JSONL file to write scores to")
+    parser.add_argument("--input-format", choices=sorted(set(FORMATS.values())))
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=0, help="Processes (default: all cores)")
+    parser.add_argument("--keep", nargs="*", default=DEFAULT_KEEP,
+                        help="Input columns copied to the output (default: id)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+EngagePredict - Compiled Ensemble
+Pure-NumPy re-implementation of the fitted scaler + LR/RF/KNN ensemble.
+
+sklearn's predict_proba spends most of a single-row call on input
+validation. The compiled engine extracts the fitted parameters once at
+load time and evaluates them directly:
+- StandardScaler  -> (x - mean) / scale
+- LogisticRegression -> coefficient matrix product + softmax
+- RandomForest    -> all trees flattened into contiguous node arrays
+- KNN             -> neighbour search over a float32 training matrix, brute
+                     force by default or a persisted index (knn_index.py)
+
+Measured on one Xeon vCPU with the default training run (100 trees of
+depth 12, 6400 KNN rows): ~13.6 ms per single-row sklearn call vs ~0.3 ms
+compiled (RF ~0.15 ms, KNN ~0.13 ms, LR ~0.02 ms), and ~70 µs per row in
+batches of 64. The single-row floor is NumPy call overhead (a handful of
+array ops per tree level, one scan of the KNN rows), not arithmetic, so
+it is amortized by batching (/predict/batch, micro-batching) rather than
+reaching tens of µs per call.
+"""
+
+import numpy as np
+from typing import Dict, Tuple
+
+from knn_index import BruteForceIndex
+from metrics import STAGE_SECONDS
+
+# Compiled state, split into NumPy arrays (mmap-able) and scalar metadata
+ARRAY_FIELDS = (
+    "mean", "scale",
+    "lr_coef_t", "lr_intercept",
+    "rf_left", "rf_right", "rf_feature", "rf_threshold", "rf_value", "rf_roots",
+    "knn_fit_x", "knn_fit_sq", "knn_y"
+)
+META_FIELDS = (
+    "lr_binary", "lr_ovr", "rf_max_depth",
+    "knn_k", "knn_distance_weighted", "knn_n_classes"
+)
+
+
+class CompiledEnsemble:
+    """
+    Drop-in replacement for the sklearn ensemble used by EngagementPredictor.
+
+    `predict_proba` returns the same (lr, rf, knn, ensemble) probability
+    matrices as `EngagementPredictor._ensemble_proba`.
+    """
+
+    def __init__(self, scaler, lr_model, rf_model, knn_model, weights: Dict[str, float]):
+        self.weights = (
+            weights["logistic_regression"],
+            weights["random_forest"],
+            weights["knn"]
+        )
+        self._compile_scaler(scaler)
+        self._compile_logistic_regression(lr_model)
+        self._compile_random_forest(rf_model)
+        self._compile_knn(knn_model)
+        self.knn_index = BruteForceIndex(self.knn_fit_x, self.knn_fit_sq)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict, weights: Dict[str, float]):
+        """Rebuild a compiled ensemble from `to_arrays` output (arrays may be memory-mapped)."""
+        ensemble = cls.__new__(cls)
+        ensemble.weights = (
+            weights["logistic_regression"],
+            weights["random_forest"],
+            weights["knn"]
+        )
+        for name in ARRAY_FIELDS:
+            setattr(ensemble, name, arrays[name])
+        for name in META_FIELDS:
+            setattr(ensemble, name, meta[name])
+        ensemble.knn_index = BruteForceIndex(ensemble.knn_fit_x, ensemble.knn_fit_sq)
+        return ensemble
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        arrays = {name: getattr(self, name) for name in ARRAY_FIELDS}
+        meta = {name: getattr(self, name) for name in META_FIELDS}
+        # Plain Python types so the metadata is JSON-serializable
+        meta = {name: value.item() if isinstance(value, np.generic) else value
+                for name, value in meta.items()}
+        return arrays, meta
+
+    # ─── Compilation ────────────────────────────────────────────
+
+    def _compile_scaler(self, scaler):
+        n_features = scaler.n_features_in_
+        self.mean = np.zeros(n_features)
+        self.scale = np.ones(n_features)
+        if scaler.with_mean:
+            self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        if scaler.with_std:
+            self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+    def _compile_logistic_regression(self, lr_model):
+        self.lr_coef_t = np.ascontiguousarray(lr_model.coef_.T, dtype=np.float64)
+        self.lr_intercept = np.asarray(lr_model.intercept_, dtype=np.float64)
+        self.lr_binary = self.lr_coef_t.shape[1] == 1
+        # sklearn < 1.5 could be fitted one-vs-rest; newer versions are always multinomial
+        self.lr_ovr = getattr(lr_model, "multi_class", "auto") == "ovr"
+
+    def _compile_random_forest(self, rf_model):
+        n_classes = len(rf_model.classes_)
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in rf_model.estimators_:
+            tree = estimator.tree_
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            is_leaf = left == -1
+
+            # Leaves point at themselves so traversal can run a fixed number of steps
+            node_ids = np.arange(tree.node_count, dtype=np.int64)
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+            thresholds.append(tree.threshold.astype(np.float64))
+
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            values.append(value / totals)
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        self.rf_left = np.concatenate(lefts)
+        self.rf_right = np.concatenate(rights)
+        self.rf_feature = np.concatenate(features)
+        self.rf_threshold = np.concatenate(thresholds)
+        self.rf_value = np.concatenate(values)
+        self.rf_roots = np.asarray(roots, dtype=np.int64)
+        self.rf_max_depth = max_depth
+
+    def _compile_knn(self, knn_model):
+        if knn_model.effective_metric_ != "euclidean":
+            raise ValueError(
+                f"Compiled KNN only supports euclidean distance, got {knn_model.effective_metric_}"
+            )
+        if callable(knn_model.weights):
+            raise ValueError("Compiled KNN does not support callable weights")
+
+        self.knn_fit_x = np.ascontiguousarray(knn_model._fit_X, dtype=np.float32)
+        self.knn_fit_sq = np.einsum("ij,ij->i", self.knn_fit_x, self.knn_fit_x)
+        self.knn_y = np.asarray(knn_model._y, dtype=np.int64)
+        self.knn_k = knn_model.n_neighbors
+        self.knn_distance_weighted = knn_model.weights == "distance"
+        self.knn_n_classes = len(knn_model.classes_)
+
+    # ─── Inference ──────────────────────────────────────────────
+
+    def predict_proba(
+        self, features: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Score an N×14 raw feature matrix with the compiled ensemble."""
+        with STAGE_SECONDS.time("scaling"):
+            features_scaled = (np.asarray(features, dtype=np.float64) - self.mean) / self.scale
+
+        with STAGE_SECONDS.time("logistic_regression"):
+            lr_proba = self._lr_proba(features_scaled)
+        with STAGE_SECONDS.time("random_forest"):
+            rf_proba = self._rf_proba(features_scaled)
+        with STAGE_SECONDS.time("knn"):
+            knn_proba = self._knn_proba(features_scaled)
+
+        lr_w, rf_w, knn_w = self.weights
+        ensemble_proba = lr_w * lr_proba + rf_w * rf_proba + knn_w * knn_proba
+
+        return lr_proba, rf_proba, knn_proba, ensemble_proba
+
+    def _lr_proba(self, x: np.ndarray) -> np.ndarray:
+        logits = x @ self.lr_coef_t + self.lr_intercept
+
+        if self.lr_binary:
+            positive = 1.0 / (1.0 + np.exp(-logits[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+
+        if self.lr_ovr:
+            proba = 1.0 / (1.0 + np.exp(-logits))
+            return proba / proba.sum(axis=1, keepdims=True)
+
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        return logits / logits.sum(axis=1, keepdims=True)
+
+    def _rf_proba(self, x: np.ndarray) -> np.ndarray:
+        # sklearn trees compare float32-cast inputs against float64 thresholds
+        x = x.astype(np.float32)
+        n_rows, n_features = x.shape
+        flat = x.ravel()
+        # Per-row offsets into the flattened rows (a single row needs none)
+        offsets = np.arange(n_rows) * n_features if n_rows > 1 else None
+
+        nodes = np.repeat(self.rf_roots[:, np.newaxis], n_rows, axis=1)
+        # ndarray.take on flat arrays skips the fancy-indexing machinery
+        for _ in range(self.rf_max_depth):
+            feature = self.rf_feature.take(nodes)
+            if offsets is not None:
+                feature += offsets
+            go_left = flat.take(feature) <= self.rf_threshold.take(nodes)
+            nodes = np.where(go_left, self.rf_left.take(nodes), self.rf_right.take(nodes))
+
+        return self.rf_value.take(nodes, axis=0).mean(axis=0)
+
+    def _knn_proba(self, x: np.ndarray) -> np.ndarray:
+        sq_dist, neighbours = self.knn_index.search(x.astype(np.float32), self.knn_k)
+        dist = np.sqrt(sq_dist, dtype=np.float64)
+        labels = self.knn_y.take(neighbours)
+        n_rows, n_classes = x.shape[0], self.knn_n_classes
+
+        if not self.knn_distance_weighted:
+            weights = np.ones_like(dist)
+        elif dist.all():
+            weights = 1.0 / dist
+        else:
+            # Matches sklearn: exact matches take all the weight
+            exact = dist == 0.0
+            with np.errstate(divide="ignore"):
+                weights = 1.0 / dist
+            exact_rows = exact.any(axis=1)
+            weights[exact_rows] = exact[exact_rows]
+
+        # Weighted votes per (row, class) in one bincount instead of np.add.at
+        codes = labels + (np.arange(n_rows) * n_classes)[:, np.newaxis]
+        proba = np.bincount(
+            codes.ravel(), weights.ravel(), minlength=n_rows * n_classes
+        ).reshape(n_rows, n_classes)
+        proba /= proba.sum(axis=1, keepdims=True)
+        return proba
+
+    # ─── Verification ───────────────────────────────────────────
+
+    def max_abs_error(self, reference_proba_fn, n_samples: int = 64, seed: int = 0) -> float:
+        """
+        Compare the compiled ensemble against sklearn on perturbed training rows.
+
+        `reference_proba_fn` maps a raw N×14 feature matrix to the sklearn
+        ensemble probabilities.
+        """
+        rng = np.random.default_rng(seed)
+        idx = rng.choice(self.knn_fit_x.shape[0], size=min(n_samples, self.knn_fit_x.shape[0]),
+                         replace=False)
+        scaled = self.knn_fit_x[idx].astype(np.float64)
+        scaled += rng.normal(0.0, 0.05, size=scaled.shape)
+        raw = scaled * self.scale + self.mean
+
+        compiled = self.predict_proba(raw)[3]
+        reference = reference_proba_fn(raw)
+        return float(np.max(np.abs(compiled - reference)))
@@ -0,0 +1,166 @@
+"""
+EngagePredict - Executor Layer
+Runs blocking CPU work off the asyncio event loop.
+
+- sklearn / NumPy inference runs on a thread pool (NumPy releases the GIL)
+- PIL media decoding runs on a process pool so a large upload cannot stall
+  other requests on the same uvicorn worker
+
+Each pool has a bounded queue depth; once it is full new work is rejected
+with ExecutorSaturated instead of piling up and inflating tail latency.
+A process pool broken by a dying worker (OOM kill, crash in a native
+decoder) is replaced and the call retried once.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+
+class ExecutorSaturated(Exception):
+    """Raised when an executor already has `max_pending` calls in flight."""
+
+    def __init__(self, name: str, max_pending: int):
+        super().__init__(f"{name} executor is saturated ({max_pending} pending calls)")
+        self.name = name
+        self.max_pending = max_pending
+
+
+class ExecutorSettings:
+    """Concurrency limits, read from the environment."""
+
+    def __init__(self):
+        self.predict_threads = int(os.getenv("ML_PREDICT_THREADS", "4"))
+        self.media_processes = int(os.getenv("ML_MEDIA_PROCESSES", "2"))
+        self.max_pending_predictions = int(os.getenv("ML_MAX_PENDING_PREDICTIONS", "256"))
+        self.max_pending_media = int(os.getenv("ML_MAX_PENDING_MEDIA", "32"))
+
+
+class BoundedExecutor:
+    """
+    Async wrapper around a concurrent.futures executor with a queue limit.
+
+    `max_pending` counts calls that are running or waiting for a worker.
+    `rebuild` creates a replacement for a broken process pool.
+    """
+
+    def __init__(self, name: str, executor: Executor, max_pending: int,
+                 rebuild: Optional[Callable[[], Executor]] = None):
+        self.name = name
+        self.executor = executor
+        self.max_pending = max_pending
+        self.rebuild = rebuild
+        self.pending = 0
+        self.rebuilds = 0
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        if self.pending >= self.max_pending:
+            raise ExecutorSaturated(self.name, self.max_pending)
+
+        self.pending += 1
+        try:
+            call = functools.partial(fn, *args, **kwargs)
+            executor = self.executor
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, call)
+            except BrokenProcessPool:
+                if self.rebuild is None:
+                    raise
+                self._replace(executor)
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        except BrokenProcessPool:
+            # Broke again (the input itself may kill workers): fresh pool for the next call
+            self._replace(self.executor)
+            raise
+        finally:
+            self.pending -= 1
+
+    def _replace(self, broken: Executor):
+        """Swap in a new pool, once per broken pool however many calls saw it fail."""
+        if self.rebuild is None or self.executor is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.rebuild()
+        self.rebuilds += 1
+        print(f"[WARN] {self.name} process pool was broken by a dying worker; restarted it")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ServiceExecutors:
+    """Thread pool for model inference plus process pool for media decoding."""
+
+    def __init__(self, settings: Optional[ExecutorSettings] = None):
+        self.settings = settings or ExecutorSettings()
+        self.predict: Optional[BoundedExecutor] = None
+        self.media: Optional[BoundedExecutor] = None
+
+    def start(self):
+        settings = self.settings
+
+        # Fork media workers before any inference threads exist
+        if settings.media_processes > 0:
+            context = None
+            if "fork" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("fork")
+            process_pool = ProcessPoolExecutor(
+                max_workers=settings.media_processes, mp_context=context
+            )
+            process_pool.submit(os.getpid).result()
+        else:
+            process_pool = None
+
+        def rebuild_process_pool() -> Executor:
+            # Threads exist by now, so replacements are spawned rather than forked
+            return ProcessPoolExecutor(
+                max_workers=settings.media_processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+        thread_pool = ThreadPoolExecutor(
+            max_workers=settings.predict_threads, thread_name_prefix="predict"
+        )
+        self.predict = BoundedExecutor(
+            "predict", thread_pool, settings.max_pending_predictions
+        )
+        # Without a process pool, media decoding shares the inference threads
+        self.media = BoundedExecutor(
+            "media", process_pool or thread_pool, settings.max_pending_media,
+            rebuild=rebuild_process_pool if process_pool else None
+        )
+
+        print(f"[OK] Executors started: {settings.predict_threads} predict threads, "
+              f"{settings.media_processes} media processes")
+
+    async def run_predict(self, fn: Callable, *args, **kwargs):
+        """Run model inference on the thread pool (inline if not started)."""
+        if self.predict is None:
+            return fn(*args, **kwargs)
+        return await self.predict.run(fn, *args, **kwargs)
+
+    async def run_io(self, fn: Callable, *args, **kwargs):
+        """Run short blocking file I/O (e.g. container parsing) on the thread pool."""
+        return await self.run_predict(fn, *args, **kwargs)
+
+    async def run_media(self, fn: Callable, *args, **kwargs):
+        """Run media decoding on the process pool (inline if not started)."""
+        if self.media is None:
+            return fn(*args, **kwargs)
+        return await self.media.run(fn, *args, **kwargs)
+
+    def shutdown(self):
+        for executor in {id(e.executor): e for e in (self.media, self.predict) if e}.values():
+            executor.shutdown()
+        self.predict = None
+        self.media = None
+
+    def stats(self) -> dict:
+        return {
+            name: {"pending": e.pending, "max_pending": e.max_pending, "rebuilds": e.rebuilds}
+            for name, e in (("predict", self.predict), ("media", self.media)) if e
+        }
@@ -0,0 +1,197 @@
+"""
+EngagePredict - Perceptual Image Quality
+Sharpness, exposure and noise estimates computed on a small grayscale
+thumbnail, so a blurry or badly exposed 4K photo no longer scores "High"
+from its resolution alone.
+
+All kernels are NumPy slicing expressions (no Python loops over pixels).
+JPEGs are decoded straight to thumbnail scale with PIL's draft mode; other
+formats have no reduced-scale decoder in PIL, so they are decoded in full
+and shrunk with Image.reduce before any per-pixel conversion. Images
+whose predicted decode time alone exceeds the budget are skipped.
+"""
+
+import math
+import time
+from io import BytesIO
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# Longest side of the analysis thumbnail
+THUMBNAIL_SIDE = 512
+# Decode throughput, used to skip images whose decode alone would blow the
+# budget (decoding can't be interrupted once started). Set below what one
+# Xeon vCPU measured: a draft-mode JPEG decode costs its entropy-coded size
+# plus the pixels it outputs at draft scale (~50-75 KB/ms + ~450k px/ms);
+# PNG (20-40k px/ms) and WebP (65-115k px/ms) decode every source pixel.
+JPEG_DECODE_BYTES_PER_MS = 50 * 1024
+DRAFT_PIXELS_PER_MS = 300_000
+DECODE_PIXELS_PER_MS = {"PNG": 20_000, "WEBP": 60_000}
+DEFAULT_DECODE_PIXELS_PER_MS = 25_000
+
+# Laplacian variance (on the thumbnail) treated as fully sharp
+SHARP_LAPLACIAN_VAR = 150.0
+# Score ceiling for an image with no measurable sharpness, rising linearly
+# to 1 at SHARP_LAPLACIAN_VAR: blur (e.g. a 4K photo with an 8 px Gaussian
+# blur, variance ~6 at thumbnail scale) makes an image Low however well
+# exposed and clean it is
+BLURRED_SCORE_CEILING = 0.35
+# Pixels at or beyond these levels count as clipped shadows / highlights
+SHADOW_LEVEL = 4
+HIGHLIGHT_LEVEL = 251
+# Clipped fraction treated as fully over/under-exposed
+MAX_CLIPPED_FRACTION = 0.25
+# Noise sigma (grey levels): clean at or below, fully noisy at or above
+NOISE_SIGMA_CLEAN = 2.0
+NOISE_SIGMA_NOISY = 20.0
+
+COMPONENT_WEIGHTS = {"sharpness": 0.5, "exposure": 0.3, "noise": 0.2}
+
+
+def estimate_decode_ms(image: "Image.Image", file_size: int) -> float:
+    """
+    Predicted decode time of an opened image. Call after draft() (as
+    load_thumbnail does), so `image.size` is the scale JPEGs decode at.
+    """
+    width, height = image.size
+    if image.format == "JPEG":
+        return file_size / JPEG_DECODE_BYTES_PER_MS + width * height / DRAFT_PIXELS_PER_MS
+    rate = DECODE_PIXELS_PER_MS.get(image.format, DEFAULT_DECODE_PIXELS_PER_MS)
+    return width * height / rate
+
+
+def load_thumbnail(image: "Image.Image", max_side: int = THUMBNAIL_SIDE) -> np.ndarray:
+    """Grayscale uint8 array with the longest side near `max_side`."""
+    # JPEG: let libjpeg decode at 1/2, 1/4 or 1/8 scale (no-op for other formats)
+    image.draft("L", (max_side, max_side))
+    if image.mode in ("1", "P", "I;16"):
+        # Modes Image.reduce doesn't support
+        image = image.convert("L")
+    factor = max(image.size) // max_side
+    if factor > 1:
+        image = image.reduce(factor)
+    return np.asarray(image.convert("L"), dtype=np.uint8)
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian; low values mean blur."""
+    g = gray.astype(np.float32)
+    lap = (g[1:-1, :-2] + g[1:-1, 2:] + g[:-2, 1:-1] + g[2:, 1:-1]) - 4.0 * g[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def exposure_stats(gray: np.ndarray) -> Dict[str, float]:
+    """Mean brightness and the fraction of clipped shadows/highlights."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    return {
+        "brightness": float(np.dot(hist, np.arange(256)) / total),
+        "shadowClipping": float(hist[:SHADOW_LEVEL + 1].sum() / total),
+        "highlightClipping": float(hist[HIGHLIGHT_LEVEL:].sum() / total),
+    }
+
+
+def noise_sigma(gray: np.ndarray) -> float:
+    """
+    Immerkaer's fast noise estimate: mean absolute response of a kernel
+    that cancels smooth image structure and leaves noise.
+    """
+    g = gray.astype(np.float32)
+    response = (
+        g[:-2, :-2] - 2 * g[:-2, 1:-1] + g[:-2, 2:]
+        - 2 * g[1:-1, :-2] + 4 * g[1:-1, 1:-1] - 2 * g[1:-1, 2:]
+        + g[2:, :-2] - 2 * g[2:, 1:-1] + g[2:, 2:]
+    )
+    return float(math.sqrt(math.pi / 2) * np.abs(response).mean() / 6.0)
+
+
+def _component_scores(measures: Dict) -> Dict[str, float]:
+    scores = {}
+    if "sharpness" in measures:
+        scores["sharpness"] = min(measures["sharpness"] / SHARP_LAPLACIAN_VAR, 1.0)
+    if "brightness" in measures:
+        clipped = measures["shadowClipping"] + measures["highlightClipping"]
+        clip_penalty = min(clipped / MAX_CLIPPED_FRACTION, 1.0)
+        # Mean brightness far from mid-grey
+        level_penalty = max(abs(measures["brightness"] - 128.0) / 128.0 - 0.3, 0.0) / 0.7
+        scores["exposure"] = max(1.0 - max(clip_penalty, level_penalty), 0.0)
+    if "noise" in measures:
+        excess = (measures["noise"] - NOISE_SIGMA_CLEAN) / (NOISE_SIGMA_NOISY - NOISE_SIGMA_CLEAN)
+        scores["noise"] = 1.0 - min(max(excess, 0.0), 1.0)
+    return scores
+
+
+def quality_label(score: int) -> str:
+    if score >= 70:
+        return "High"
+    if score >= 40:
+        return "Medium"
+    return "Low"
+
+
+def measure_image(gray: np.ndarray, deadline: Optional[float] = None) -> Dict:
+    """
+    Quality measures and a 0-100 score for a grayscale thumbnail.
+
+    Each measure is skipped once `deadline` (time.perf_counter()) has
+    passed; the score then covers only what was computed and the result is
+    marked partial.
+    """
+    measures: Dict = {}
+    steps = (
+        lambda: {"sharpness": laplacian_variance(gray)},
+        lambda: exposure_stats(gray),
+        lambda: {"noise": noise_sigma(gray)},
+    )
+    partial = False
+    for step in steps:
+        if deadline is not None and time.perf_counter() > deadline:
+            partial = True
+            break
+        measures.update(step())
+
+    result = {key: round(value, 4) for key, value in measures.items()}
+    scores = _component_scores(measures)
+    if scores:
+        weight = sum(COMPONENT_WEIGHTS[name] for name in scores)
+        score = sum(COMPONENT_WEIGHTS[name] * value for name, value in scores.items()) / weight
+        if "sharpness" in scores:
+            score = min(score, BLURRED_SCORE_CEILING + (1 - BLURRED_SCORE_CEILING) * scores["sharpness"])
+        result["score"] = int(round(score * 100))
+        result["label"] = quality_label(result["score"])
+    result["partial"] = partial
+    return result
+
+
+def analyze_quality(file_bytes: bytes, budget_ms: float) -> Optional[Dict]:
+    """
+    Perceptual quality of an encoded image within `budget_ms`, or None if
+    the image can't be decoded (or PIL isn't installed).
+    """
+    if not PIL_AVAILABLE:
+        return None
+
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000.0
+    try:
+        image = Image.open(BytesIO(file_bytes))
+        image.draft("L", (THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+        if estimate_decode_ms(image, len(file_bytes)) > budget_ms:
+            return {"partial": True, "reason": "decode over budget"}
+        gray = load_thumbnail(image)
+    except Exception:
+        return None
+    if min(gray.shape) < 3:
+        return {"partial": True, "reason": "image too small"}
+
+    result = measure_image(gray, deadline)
+    result["elapsedMs"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
@@ -7,9 +7,52 @@ for social media engagement prediction.
 import numpy as np
 import pickle
 import os
-import re
 import random
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from artifacts import ARRAYS_DIRNAME, has_arrays, load_arrays
+from compiled_ensemble import CompiledEnsemble
+from knn_index import INDEX_DIRNAME, has_index, load_index
+from model_registry import ModelRegistry
+from metrics import PREDICTIONS_TOTAL, STAGE_SECONDS, log_prediction
+from parsed_post import CTA_PATTERN, DAY_INDEX, EMOJI_PATTERN, HASHTAG_PATTERN, ParsedPost, PlatformTables
+from prediction_cache import PredictionCache, feature_key
+
+
+# Max allowed |compiled - sklearn| ensemble probability before compiled mode is disabled
+COMPILED_TOLERANCE = 1e-3
+
+# mediaInfo labels -> model feature values
+RESOLUTION_SCORES = {"SD": 0, "480p": 1, "720p": 2, "1080p": 3, "4K": 4}
+QUALITY_SCORES = {"Low": 0, "Medium": 1, "High": 2}
+
+# Scored by a freshly loaded model version before it is switched in
+WARMUP_POSTS = [
+    {"caption": "New drop is live! Link in bio 🔥", "hashtags": "#new #launch #style",
+     "platform": platform, "posting_time": time_of_day, "day_of_week": day,
+     "media_info": media}
+    for platform, time_of_day, day, media in [
+        ("instagram", "19:00", "Wednesday",
+         {"resolution": "1080p", "orientation": "Portrait", "qualityScore": "High"}),
+        ("tiktok", "21:30", "Friday",
+         {"resolution": "720p", "orientation": "Portrait", "qualityScore": "Medium"}),
+        ("youtube", "15:00", "Saturday",
+         {"resolution": "4K", "orientation": "Landscape", "qualityScore": "High"}),
+        ("twitter", "08:15", "Monday", None),
+        ("facebook", "13:45", "Thursday",
+         {"resolution": "SD", "orientation": "Square", "qualityScore": "Low"}),
+    ]
+]
+
+
+def _per_unique(values, fn, dtype) -> np.ndarray:
+    """fn applied to each distinct entry of `values`, broadcast back to every row."""
+    import pandas as pd
+
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    return np.array([fn(value) for value in uniques], dtype=dtype)[codes]
 
 
 class EngagementPredictor:
@@ -22,10 +65,45 @@ class EngagementPredictor:
     Final prediction uses weighted voting from all 3 models.
     """
 
-    def __init__(self):
-        self.models_dir = os.path.join(os.path.dirname(__file__), "models")
+    def __init__(
+        self,
+        compiled: Optional[bool] = None,
+        use_arrays: Optional[bool] = None,
+        lazy: bool = False,
+        models_dir: Optional[str] = None
+    ):
+        self.models_dir = models_dir or os.path.join(os.path.dirname(__file__), "models")
         self.model_loaded = False
 
+        # Prefer memory-mapped .npy artifacts (see artifacts.py) over pickles
+        if use_arrays is None:
+            use_arrays = os.getenv("ML_MMAP_ARTIFACTS", "1") == "1"
+        self.use_arrays = use_arrays
+
+        # Load bookkeeping, reported on /health
+        self._load_lock = threading.Lock()
+        self.load_state = "pending"
+        self.load_source = None
+        self.load_seconds = None
+        # Registry version being served (see model_registry.py), None for unversioned artifacts
+        self.model_version = None
+        self.registry = ModelRegistry(self.models_dir)
+
+        # Optional pure-NumPy inference engine (see compiled_ensemble.py)
+        if compiled is None:
+            compiled = os.getenv("ML_COMPILED_ENSEMBLE", "0") == "1"
+        self.compiled_requested = compiled
+        self.compiled_ensemble = None
+
+        # Serve compiled KNN from models/knn_index/ when present (see knn_index.py)
+        self.use_knn_index = os.getenv("ML_KNN_INDEX", "1") == "1"
+
+        # Ensemble results keyed on the model version and quantized feature vector
+        self.cache = PredictionCache(
+            max_size=int(os.getenv("ML_PREDICTION_CACHE_SIZE", "4096")),
+            ttl_seconds=float(os.getenv("ML_PREDICTION_CACHE_TTL", "3600"))
+        )
+
         # Model weights for ensemble (tuned based on accuracy)
         self.weights = {
             "logistic_regression": 0.30,
@@ -76,12 +154,50 @@ class EngagementPredictor:
             "instagram": 0, "tiktok": 1, "youtube": 2,
             "twitter": 3, "facebook": 4
         }
-
-        # Load trained models
-        self._load_models()
+        # Interned platform indices and peak-hour/best-day tables
+        self.tables = PlatformTables(self.platform_config)
+
+        # Load trained models (deferred to first use when lazy)
+        if not lazy:
+            self.ensure_loaded()
+
+    def ensure_loaded(self):
+        """Load models once; concurrent callers wait for the first load."""
+        if self.load_state == "loaded":
+            return
+
+        with self._load_lock:
+            if self.load_state == "loaded":
+                return
+            self.load_state = "loading"
+            start = time.perf_counter()
+            self._load_models()
+            self.load_seconds = round(time.perf_counter() - start, 4)
+            self.load_state = "loaded"
+
+    def load_stats(self) -> Dict:
+        return {
+            "state": self.load_state,
+            "source": self.load_source,
+            "load_seconds": self.load_seconds,
+            "version": self.model_version,
+            "compiled": self.compiled_ensemble is not None,
+            "knn_index": self.compiled_ensemble.knn_index.kind if self.compiled_ensemble else None
+        }
 
     def _load_models(self):
         """Load all 3 trained ML models from disk."""
+        # The active registry version wins over the working copy in models/
+        version = self.registry.active_version() if self.use_arrays else None
+        base_dir = self.registry.version_dir(version) if version else self.models_dir
+        arrays_dir = os.path.join(base_dir, ARRAYS_DIRNAME)
+        if self.use_arrays and has_arrays(arrays_dir):
+            try:
+                self._load_arrays(base_dir, version)
+                return
+            except Exception as e:
+                print(f"[WARN] Could not load model arrays, falling back to pickles: {e}")
+
         try:
             with open(os.path.join(self.models_dir, "logistic_regression.pkl"), "rb") as f:
                 self.lr_model = pickle.load(f)
@@ -97,10 +213,12 @@ class EngagementPredictor:
 
             with open(os.path.join(self.models_dir, "label_encoder.pkl"), "rb") as f:
                 self.label_encoder = pickle.load(f)
+            self.classes = np.asarray(self.label_encoder.classes_)
 
             self.model_loaded = True
+            self.load_source = "pickle"
             print("[OK] All 3 ML models loaded successfully")
-            print(f"   Models: Logistic Regression, Random Forest, KNN")
+            print("   Models: Logistic Regression, Random Forest, KNN")
             print(f"   Classes: {list(self.label_encoder.classes_)}")
 
         except FileNotFoundError as e:
@@ -112,10 +230,123 @@ class EngagementPredictor:
             print(f"[ERROR] Error loading models: {e}")
             self.model_loaded = False
 
+        if self.model_loaded and self.compiled_requested:
+            self._compile_ensemble()
+
+    def _load_arrays(self, base_dir: str, version: Optional[str] = None):
+        """
+        Serve the compiled ensemble straight from memory-mapped arrays.
+        No pickles are read, so sklearn is never imported on this path.
+        """
+        compiled, manifest = load_arrays(os.path.join(base_dir, ARRAYS_DIRNAME), self.weights)
+        self._attach_knn_index(compiled, base_dir)
+
+        self.classes = np.asarray(manifest["classes"])
+        self.compiled_ensemble = compiled
+        self.model_version = version
+        self.model_loaded = True
+        self.load_source = "registry" if version else "mmap"
+        print("[OK] All 3 ML models loaded from memory-mapped arrays"
+              + (f" (version {version})" if version else ""))
+        print(f"   Classes: {manifest['classes']}")
+
+    def reload(self, version: Optional[str] = None) -> Dict:
+        """
+        Switch to a registry version (default: the active one) without downtime.
+
+        The new ensemble is loaded and warmed in the calling thread while
+        requests keep using the current one, then swapped in with a single
+        reference assignment. Versions must keep the same class order.
+        """
+        with self._load_lock:
+            version = version or self.registry.active_version()
+            if version is None:
+                raise ValueError("Model registry has no active version")
+            if version not in self.registry.read()["versions"]:
+                raise KeyError(f"Unknown model version: {version}")
+            if version == self.model_version and self.load_state == "loaded":
+                return {"version": version, "changed": False}
+
+            start = time.perf_counter()
+            base_dir = self.registry.version_dir(version)
+            compiled, manifest = load_arrays(
+                os.path.join(base_dir, ARRAYS_DIRNAME), self.weights, mmap=self.use_arrays
+            )
+            classes = np.asarray(manifest["classes"])
+            if self.model_loaded and list(classes) != list(self.classes):
+                raise ValueError(
+                    f"Version {version} has classes {list(classes)}, serving {list(self.classes)}; "
+                    "a class change needs a restart"
+                )
+            self._attach_knn_index(compiled, base_dir)
+            self._warm(compiled)
+
+            previous = self.model_version
+            self.classes = classes
+            self.compiled_ensemble = compiled
+            self.model_version = version
+            self.model_loaded = True
+            self.load_source = "registry"
+            self.load_seconds = round(time.perf_counter() - start, 4)
+            self.load_state = "loaded"
+            # Entries are keyed on the previous version and can no longer be hit;
+            # a request still scoring with it may add one more after this
+            self.cache.clear()
+
+        print(f"[OK] Switched to model version {version} (was {previous}, {self.load_seconds}s)")
+        return {"version": version, "previous": previous, "changed": True,
+                "load_seconds": self.load_seconds}
+
+    def _warm(self, compiled: CompiledEnsemble):
+        """Score WARMUP_POSTS on a new ensemble; rejects it if the output is not finite."""
+        features = self._feature_matrix([self.parse_post(**post) for post in WARMUP_POSTS])
+        proba = compiled.predict_proba(features)[3]
+        if not np.all(np.isfinite(proba)):
+            raise ValueError("Warm-up predictions are not finite")
+
+    def _compile_ensemble(self):
+        """Build the pure-NumPy ensemble and verify it against sklearn."""
+        try:
+            compiled = CompiledEnsemble(
+                self.scaler, self.lr_model, self.rf_model, self.knn_model, self.weights
+            )
+            error = compiled.max_abs_error(
+                lambda features: self._sklearn_ensemble_proba(features)[3]
+            )
+        except Exception as e:
+            print(f"[WARN] Compiled ensemble unavailable, using sklearn: {e}")
+            return
+
+        if error > COMPILED_TOLERANCE:
+            print(f"[WARN] Compiled ensemble deviates from sklearn by {error:.2e}, using sklearn")
+            return
+
+        self._attach_knn_index(compiled, self.models_dir)
+        self.compiled_ensemble = compiled
+        print(f"[OK] Compiled ensemble enabled (max deviation {error:.2e})")
+
+    def _attach_knn_index(self, compiled: CompiledEnsemble, base_dir: str):
+        """
+        Swap the compiled KNN's brute-force search for the persisted index.
+        Runs after verification, so an approximate index never fails the
+        sklearn comparison; the sklearn path keeps its own KNN search.
+        """
+        directory = os.path.join(base_dir, INDEX_DIRNAME)
+        if not self.use_knn_index or not has_index(directory):
+            return
+        try:
+            index = load_index(directory, compiled.knn_fit_x, mmap=self.use_arrays)
+        except Exception as e:
+            print(f"[WARN] Could not load KNN index, using brute force: {e}")
+            return
+
+        compiled.knn_index = index
+        print(f"[OK] KNN index: {index.kind} {index.params()}")
+
     def is_ready(self) -> bool:
         return self.model_loaded
 
-    def _extract_features(
+    def parse_post(
         self,
         caption: str,
         hashtags: str,
@@ -123,60 +354,40 @@ class EngagementPredictor:
         posting_time: str,
         day_of_week: str,
         media_info: Optional[Dict] = None
-    ) -> np.ndarray:
+    ) -> ParsedPost:
+        """
+        Parse request fields once for features, feedback and recommendations.
+        """
+        return ParsedPost(
+            caption, hashtags, platform, posting_time, day_of_week, media_info, self.tables
+        )
+
+    def _extract_features(self, post: ParsedPost) -> np.ndarray:
         """
         Extract the 14 features expected by the trained models.
         """
-        config = self.platform_config.get(platform, self.platform_config["instagram"])
+        config = post.config
 
         # Basic text features
-        caption_length = len(caption)
-        hashtag_matches = re.findall(r'#\w+', hashtags)
-        hashtag_count = len(hashtag_matches)
+        caption_length = post.caption_length
+        hashtag_count = post.hashtag_count
 
         # Time features
-        try:
-            hour = int(posting_time.split(':')[0])
-        except (ValueError, IndexError):
-            hour = 12
+        hour = post.hour
 
-        is_peak = 1 if hour in config["peak_hours"] else 0
-        is_best_day = 1 if day_of_week in config["best_days"] else 0
+        is_peak = 1 if post.is_peak else 0
+        is_best_day = 1 if post.is_best_day else 0
 
         # Media features
-        resolution_score = 3  # default: 1080p
-        orientation_match = 1
-        media_quality = 2     # default: High
-
-        if media_info:
-            # Resolution mapping
-            res = media_info.get("resolution", "1080p")
-            res_map = {"SD": 0, "480p": 1, "720p": 2, "1080p": 3, "4K": 4}
-            resolution_score = res_map.get(res, 3)
-
-            # Orientation match
-            orientation = media_info.get("orientation", "")
-            preferred = config["preferred_orientation"]
-            if preferred == "Any":
-                orientation_match = 1
-            else:
-                orientation_match = 1 if orientation == preferred else 0
+        resolution_score, orientation_match, media_quality = self._media_features(post)
 
-            # Quality mapping
-            quality = media_info.get("qualityScore", "High")
-            quality_map = {"Low": 0, "Medium": 1, "High": 2}
-            media_quality = quality_map.get(quality, 2)
-
-        # Platform encoding
-        platform_encoded = self.platform_map.get(platform, 0)
+        # Platform encoding (unknown platforms share instagram's index 0)
+        platform_encoded = post.platform_index
 
         # Additional text features
         has_location = 0  # Not always provided
-        has_cta = 1 if any(
-            word in caption.lower()
-            for word in ["comment", "share", "like", "follow", "click", "link", "tag", "save", "check"]
-        ) else 0
-        has_emoji = 1 if re.search(r'[\U0001F600-\U0001F9FF]', caption) else 0
+        has_cta = post.has_cta
+        has_emoji = post.has_emoji
 
         # Ratios
         _, hash_max = config["optimal_hashtag_count"]
@@ -193,26 +404,182 @@ class EngagementPredictor:
 
         return features
 
-    def _generate_feedback(
-        self,
-        caption: str,
-        hashtags: str,
-        platform: str,
-        posting_time: str,
-        day_of_week: str,
-        media_info: Optional[Dict]
-    ) -> List[Dict]:
+    @staticmethod
+    def _media_features(post: ParsedPost):
+        """(resolution_score, orientation_match, media_quality) for a post."""
+        media_info = post.media_info
+        if not media_info:
+            # defaults: 1080p, matching orientation, High quality
+            return 3, 1, 2
+
+        resolution_score = RESOLUTION_SCORES.get(media_info.get("resolution", "1080p"), 3)
+
+        preferred = post.config["preferred_orientation"]
+        if preferred == "Any":
+            orientation_match = 1
+        else:
+            orientation_match = 1 if media_info.get("orientation", "") == preferred else 0
+
+        media_quality = QUALITY_SCORES.get(media_info.get("qualityScore", "High"), 2)
+        return resolution_score, orientation_match, media_quality
+
+    def extract_features_batch(self, frame) -> np.ndarray:
+        """
+        Vectorized _extract_features over a table of posts.
+
+        `frame` is a pandas DataFrame, or anything with to_pandas() such as
+        a pyarrow Table, with the /predict field names: caption, hashtags,
+        platform, postingTime, dayOfWeek and either a mediaInfo column of
+        dicts or flat resolution/orientation/qualityScore columns
+        (mediaInfo.resolution etc. from json_normalize also work).
+        snake_case names are accepted too. Returns an N×14 matrix equal to
+        stacking _extract_features rows.
+        """
+        # pandas is only needed offline; keep it off the service import path
+        import pandas as pd
+
+        if not isinstance(frame, pd.DataFrame) and hasattr(frame, "to_pandas"):
+            frame = frame.to_pandas()
+        n = len(frame)
+        tables = self.tables
+
+        caption = self._text_column(frame, "caption")
+        hashtags = self._text_column(frame, "hashtags")
+        platform = self._text_column(frame, "platform")
+        posting_time = self._text_column(frame, "postingTime", "posting_time")
+        day_of_week = self._text_column(frame, "dayOfWeek", "day_of_week")
+
+        # Low-cardinality columns are resolved once per distinct value
+        platform_index = _per_unique(platform, tables.platform_index, np.intp)
+        hour = _per_unique(posting_time, ParsedPost.parse_hour, np.int64)
+        day_index = _per_unique(day_of_week, lambda day: DAY_INDEX.get(day, -1), np.intp)
+
+        caption_length = caption.str.len().to_numpy(float)
+        hashtag_count = hashtags.str.count(HASHTAG_PATTERN.pattern).to_numpy(float)
+
+        in_day = (hour >= 0) & (hour < 24)
+        is_peak = in_day & tables.peak_hours[platform_index, np.where(in_day, hour, 0)]
+        is_best_day = (day_index >= 0) & tables.best_days[platform_index, np.maximum(day_index, 0)]
+
+        resolution, orientation, quality, has_media = self._media_columns(frame)
+        resolution_score = np.where(
+            has_media, _per_unique(resolution, lambda r: RESOLUTION_SCORES.get(r, 3), float), 3
+        )
+        preferred = tables.preferred_orientation[platform_index]
+        orientation_match = np.where(
+            has_media & (preferred != "Any"), orientation == preferred, 1
+        )
+        media_quality = np.where(
+            has_media, _per_unique(quality, lambda q: QUALITY_SCORES.get(q, 2), float), 2
+        )
+
+        features = np.empty((n, 14))
+        features[:, 0] = caption_length
+        features[:, 1] = hashtag_count
+        features[:, 2] = hour
+        features[:, 3] = is_peak
+        features[:, 4] = is_best_day
+        features[:, 5] = resolution_score
+        features[:, 6] = orientation_match
+        features[:, 7] = media_quality
+        features[:, 8] = platform_index
+        features[:, 9] = 0  # has_location
+        features[:, 10] = caption.str.lower().str.contains(CTA_PATTERN.pattern).to_numpy(float)
+        features[:, 11] = caption.str.contains(EMOJI_PATTERN.pattern).to_numpy(float)
+        features[:, 12] = hashtag_count / tables.max_hashtags[platform_index]
+        features[:, 13] = caption_length / tables.max_caption[platform_index]
+        return features
+
+    @staticmethod
+    def _text_column(frame, *names: str):
+        """
+        First of `names` present in frame as an object Series of str (""
+        for missing values). Object dtype keeps the .str methods on Python's
+        re, matching ParsedPost: pandas 3 would otherwise run them on pyarrow
+        strings with RE2, which rejects EMOJI_PATTERN's \\U escapes and
+        whose \\w is ASCII-only.
+        """
+        import pandas as pd
+
+        for name in names:
+            if name in frame.columns:
+                return frame[name].fillna("").astype(str).astype(object)
+        return pd.Series([""] * len(frame), index=frame.index, dtype=object)
+
+    @staticmethod
+    def _media_columns(frame):
+        """
+        (resolution, orientation, qualityScore, has_media) object arrays from
+        a mediaInfo column of dicts or from flat columns. has_media marks rows
+        whose mediaInfo is a non-empty dict (the `if media_info:` of
+        _media_features); with flat columns, rows where any of them is set.
+        """
+        import pandas as pd
+
+        fields = ("resolution", "orientation", "qualityScore")
+        flat = [
+            next((c for c in (key, f"mediaInfo.{key}") if c in frame.columns), None)
+            for key in fields
+        ]
+        dict_column = next((c for c in ("mediaInfo", "media_info") if c in frame.columns), None)
+
+        if any(flat) or dict_column is None:
+            columns = [
+                frame[name].astype(object).where(frame[name].notna(), None).to_numpy()
+                if name else np.full(len(frame), None, dtype=object)
+                for name in flat
+            ]
+            has_media = np.logical_or.reduce([pd.notna(column) for column in columns])
+        else:
+            media = [value if isinstance(value, dict) else {} for value in frame[dict_column]]
+            columns = []
+            for key in fields:
+                column = np.empty(len(media), dtype=object)
+                column[:] = [value.get(key) for value in media]
+                columns.append(column)
+            has_media = np.fromiter(map(bool, media), dtype=bool, count=len(media))
+
+        resolution, orientation, quality = columns
+        return resolution, orientation, quality, has_media
+
+    def _feature_matrix(self, posts: List[ParsedPost]) -> np.ndarray:
+        """
+        N×14 feature matrix for many posts, column by column.
+
+        Identical to stacking _extract_features rows; the platform-dependent
+        columns come from array lookups on the interned platform indices.
+        """
+        n = len(posts)
+        platform_index = np.fromiter((p.platform_index for p in posts), dtype=np.intp, count=n)
+        caption_length = np.fromiter((p.caption_length for p in posts), dtype=float, count=n)
+        hashtag_count = np.fromiter((p.hashtag_count for p in posts), dtype=float, count=n)
+
+        features = np.empty((n, 14))
+        features[:, 0] = caption_length
+        features[:, 1] = hashtag_count
+        features[:, 2] = np.fromiter((p.hour for p in posts), dtype=float, count=n)
+        features[:, 3] = np.fromiter((p.is_peak for p in posts), dtype=float, count=n)
+        features[:, 4] = np.fromiter((p.is_best_day for p in posts), dtype=float, count=n)
+        features[:, 5:8] = [self._media_features(p) for p in posts]
+        features[:, 8] = platform_index
+        features[:, 9] = 0  # has_location
+        features[:, 10] = np.fromiter((p.has_cta for p in posts), dtype=float, count=n)
+        features[:, 11] = np.fromiter((p.has_emoji for p in posts), dtype=float, count=n)
+        features[:, 12] = hashtag_count / self.tables.max_hashtags[platform_index]
+        features[:, 13] = caption_length / self.tables.max_caption[platform_index]
+        return features
+
+    def _generate_feedback(self, post: ParsedPost) -> List[Dict]:
         """Generate human-readable feedback based on content analysis."""
         feedback = []
-        config = self.platform_config.get(platform, self.platform_config["instagram"])
+        config = post.config
+        platform = post.platform
+        media_info = post.media_info
+        day_of_week = post.day_of_week
 
-        caption_length = len(caption)
-        hashtag_count = len(re.findall(r'#\w+', hashtags))
-
-        try:
-            hour = int(posting_time.split(':')[0])
-        except (ValueError, IndexError):
-            hour = 12
+        caption_length = post.caption_length
+        hashtag_count = post.hashtag_count
+        hour = post.hour
 
         # Media quality feedback
         if media_info:
@@ -296,8 +663,7 @@ class EngagementPredictor:
             })
 
         # Time feedback
-        is_peak = hour in config["peak_hours"]
-        if is_peak:
+        if post.is_peak:
             feedback.append({
                 "type": "success",
                 "text": "Great posting time for maximum engagement",
@@ -311,7 +677,7 @@ class EngagementPredictor:
             })
 
         # Day feedback
-        if day_of_week in config["best_days"]:
+        if post.is_best_day:
             feedback.append({
                 "type": "success",
                 "text": f"{day_of_week} is a high-engagement day for {platform}",
@@ -337,83 +703,224 @@ class EngagementPredictor:
         - Random Forest (40% weight)  
         - KNN (30% weight)
         """
+        return self.predict_post(
+            self.parse_post(caption, hashtags, platform, posting_time, day_of_week, media_info)
+        )
+
+    def predict_post(self, post: ParsedPost) -> Dict:
+        """Predict engagement for an already parsed post."""
+        self.ensure_loaded()
 
         # Extract features
-        features = self._extract_features(
-            caption, hashtags, platform, posting_time, day_of_week, media_info
-        )
+        with STAGE_SECONDS.time("feature_extraction"):
+            features = self._extract_features(post)
 
-        if self.model_loaded:
-            # Scale features
-            features_scaled = self.scaler.transform(features)
+        cache_key = self._cache_key(features) if self.model_loaded else None
+        cached = self.cache.get(cache_key) if cache_key is not None else None
 
-            # ─── Get predictions from all 3 models ──────────────
-            
-            # Logistic Regression - probability predictions
-            lr_proba = self.lr_model.predict_proba(features_scaled)[0]
-            
-            # Random Forest - probability predictions
-            rf_proba = self.rf_model.predict_proba(features_scaled)[0]
-            
-            # KNN - probability predictions
-            knn_proba = self.knn_model.predict_proba(features_scaled)[0]
-
-            # ─── Weighted Ensemble ──────────────────────────────
-            ensemble_proba = (
-                self.weights["logistic_regression"] * lr_proba +
-                self.weights["random_forest"] * rf_proba +
-                self.weights["knn"] * knn_proba
-            )
+        if cached is not None:
+            # Cache hit: skip the scaler and all 3 models
+            score, engagement_level = cached
+            path = "cache"
+            log_prediction({"event": "prediction", "path": path, "platform": post.platform,
+                            "level": engagement_level, "score": score})
+
+        elif self.model_loaded:
+            lr_proba, rf_proba, knn_proba, ensemble_proba = self._ensemble_proba(features)
+            lr_proba, rf_proba, knn_proba = lr_proba[0], rf_proba[0], knn_proba[0]
+            ensemble_proba = ensemble_proba[0]
 
             # Get predicted class
             predicted_class_idx = np.argmax(ensemble_proba)
-            engagement_level = self.label_encoder.inverse_transform([predicted_class_idx])[0]
-            confidence = float(ensemble_proba[predicted_class_idx])
-
-            # Convert class probabilities to a score (0-100)
-            # Map: Low=0-49, Medium=50-74, High=75-100
-            class_names = list(self.label_encoder.classes_)
-            low_idx = class_names.index("Low")
-            med_idx = class_names.index("Medium")
-            high_idx = class_names.index("High")
-
-            score = (
-                ensemble_proba[low_idx] * 25 +
-                ensemble_proba[med_idx] * 62 +
-                ensemble_proba[high_idx] * 95
-            )
-            score = int(max(0, min(100, score)))
-
-            # Individual model predictions for transparency
-            lr_class = self.label_encoder.inverse_transform([np.argmax(lr_proba)])[0]
-            rf_class = self.label_encoder.inverse_transform([np.argmax(rf_proba)])[0]
-            knn_class = self.label_encoder.inverse_transform([np.argmax(knn_proba)])[0]
-
-            print(f"\n[PREDICTION] Details:")
-            print(f"   Logistic Regression -> {lr_class} (conf: {max(lr_proba):.2f})")
-            print(f"   Random Forest       -> {rf_class} (conf: {max(rf_proba):.2f})")
-            print(f"   KNN                 -> {knn_class} (conf: {max(knn_proba):.2f})")
-            print(f"   Ensemble Result     -> {engagement_level} (score: {score})")
+            engagement_level = str(self.classes[predicted_class_idx])
+            score = int(self._proba_to_scores(ensemble_proba[np.newaxis, :])[0])
+
+            path = "model"
+            self.cache.put(cache_key, (score, engagement_level))
+
+            # Individual model predictions for transparency (sampled)
+            log_prediction({
+                "event": "prediction",
+                "path": path,
+                "platform": post.platform,
+                "level": engagement_level,
+                "score": score,
+                "models": {
+                    name: {"class": self.classes[np.argmax(proba)],
+                           "conf": round(float(max(proba)), 2)}
+                    for name, proba in (("logistic_regression", lr_proba),
+                                        ("random_forest", rf_proba),
+                                        ("knn", knn_proba))
+                }
+            })
 
         else:
             # Fallback: rule-based scoring if models not loaded
-            print("[WARN] Using fallback rule-based scoring (models not loaded)")
-            score = self._fallback_score(
-                caption, hashtags, platform, posting_time, day_of_week, media_info
-            )
-            if score >= 75:
-                engagement_level = "High"
-            elif score >= 50:
-                engagement_level = "Medium"
-            else:
-                engagement_level = "Low"
+            score = self._fallback_score(post)
+            engagement_level = self._level_from_score(score)
+            path = "fallback"
+            log_prediction({"event": "prediction", "path": path, "platform": post.platform,
+                            "level": engagement_level, "score": score})
+
+        PREDICTIONS_TOTAL.inc(self._platform_label(post), path)
 
         # Generate feedback
-        feedback = self._generate_feedback(
-            caption, hashtags, platform, posting_time, day_of_week, media_info
+        with STAGE_SECONDS.time("feedback"):
+            feedback = self._generate_feedback(post)
+
+        return self._build_result(score, engagement_level, feedback)
+
+    def predict_batch(self, posts: List[Union[Dict, ParsedPost]]) -> List[Dict]:
+        """
+        Predict engagement for many posts in one pass.
+
+        Each post is a ParsedPost or a dict with the keyword arguments of `predict`.
+        Features are stacked into a single N×14 matrix so the scaler and
+        each of the 3 models run once for the whole batch, and the
+        weighted ensemble is combined with NumPy for all rows.
+        """
+        if not posts:
+            return []
+        self.ensure_loaded()
+
+        posts = [
+            post if isinstance(post, ParsedPost) else self.parse_post(**post)
+            for post in posts
+        ]
+        with STAGE_SECONDS.time("feature_extraction"):
+            features = self._feature_matrix(posts)
+
+        if self.model_loaded:
+            keys = [self._cache_key(row) for row in features]
+            cached = [self.cache.get(key) for key in keys]
+            scores = [hit[0] if hit else 0 for hit in cached]
+            levels = [hit[1] if hit else "" for hit in cached]
+
+            # Only rows that missed the cache go through the models
+            misses = [i for i, hit in enumerate(cached) if hit is None]
+            if misses:
+                _, _, _, ensemble_proba = self._ensemble_proba(features[misses])
+                class_idx = np.argmax(ensemble_proba, axis=1)
+                miss_levels = self.classes[class_idx]
+                miss_scores = self._proba_to_scores(ensemble_proba)
+                for i, score, level in zip(misses, miss_scores, miss_levels):
+                    scores[i], levels[i] = int(score), str(level)
+                    self.cache.put(keys[i], (scores[i], levels[i]))
+            missed = set(misses)
+            paths = ["model" if i in missed else "cache" for i in range(len(posts))]
+        else:
+            scores = [self._fallback_score(post) for post in posts]
+            levels = [self._level_from_score(score) for score in scores]
+            paths = ["fallback"] * len(posts)
+
+        for post, path in zip(posts, paths):
+            PREDICTIONS_TOTAL.inc(self._platform_label(post), path)
+        log_prediction({"event": "batch", "size": len(posts),
+                        "model_rows": paths.count("model"), "fallback": not self.model_loaded})
+
+        with STAGE_SECONDS.time("feedback"):
+            feedback = [self._generate_feedback(post) for post in posts]
+
+        return [
+            self._build_result(int(score), str(level), post_feedback)
+            for score, level, post_feedback in zip(scores, levels, feedback)
+        ]
+
+    def score_frame(self, frame):
+        """
+        (scores, engagement levels) arrays for a table of posts, as accepted
+        by extract_features_batch.
+
+        For offline scoring: runs the same feature pipeline and ensemble as
+        predict, but skips the prediction cache, metrics and feedback.
+        Requires trained models (there is no vectorized fallback).
+        """
+        self.ensure_loaded()
+        if not self.model_loaded:
+            raise RuntimeError("Models not loaded; run 'python train_models.py' first")
+
+        features = self.extract_features_batch(frame)
+        if len(features) == 0:
+            return np.empty(0, dtype=int), np.empty(0, dtype=object)
+        _, _, _, ensemble_proba = self._ensemble_proba(features)
+        levels = self.classes[np.argmax(ensemble_proba, axis=1)]
+        return self._proba_to_scores(ensemble_proba), levels
+
+    def _platform_label(self, post: ParsedPost) -> str:
+        """Bounded platform label for metrics."""
+        return post.platform if post.platform in self.tables.index else "other"
+
+    def _cache_key(self, features: np.ndarray) -> Tuple:
+        """
+        Prediction cache key for one feature row.
+
+        The version is read before the ensemble is, and reload() swaps the
+        ensemble before the version, so a result is never stored under a
+        newer version than the one that computed it.
+        """
+        return self.model_version, feature_key(features)
+
+    def _ensemble_proba(self, features: np.ndarray):
+        """
+        Run the scaler and all 3 models over an N×14 feature matrix.
+
+        Returns the per-model N×3 probability matrices followed by the
+        weighted ensemble probabilities.
+        """
+        if self.compiled_ensemble is not None:
+            return self.compiled_ensemble.predict_proba(features)
+        return self._sklearn_ensemble_proba(features)
+
+    def _sklearn_ensemble_proba(self, features: np.ndarray):
+        # Scale features
+        with STAGE_SECONDS.time("scaling"):
+            features_scaled = self.scaler.transform(features)
+
+        # ─── Get predictions from all 3 models ──────────────
+        with STAGE_SECONDS.time("logistic_regression"):
+            lr_proba = self.lr_model.predict_proba(features_scaled)
+        with STAGE_SECONDS.time("random_forest"):
+            rf_proba = self.rf_model.predict_proba(features_scaled)
+        with STAGE_SECONDS.time("knn"):
+            knn_proba = self.knn_model.predict_proba(features_scaled)
+
+        # ─── Weighted Ensemble ──────────────────────────────
+        ensemble_proba = (
+            self.weights["logistic_regression"] * lr_proba +
+            self.weights["random_forest"] * rf_proba +
+            self.weights["knn"] * knn_proba
         )
 
-        # Predicted metrics based on score
+        return lr_proba, rf_proba, knn_proba, ensemble_proba
+
+    def _proba_to_scores(self, ensemble_proba: np.ndarray) -> np.ndarray:
+        """
+        Convert N×3 class probabilities to integer scores (0-100).
+        Map: Low=0-49, Medium=50-74, High=75-100
+        """
+        class_names = list(self.classes)
+        low_idx = class_names.index("Low")
+        med_idx = class_names.index("Medium")
+        high_idx = class_names.index("High")
+
+        scores = (
+            ensemble_proba[:, low_idx] * 25 +
+            ensemble_proba[:, med_idx] * 62 +
+            ensemble_proba[:, high_idx] * 95
+        )
+        return np.clip(scores, 0, 100).astype(int)
+
+    @staticmethod
+    def _level_from_score(score: int) -> str:
+        if score >= 75:
+            return "High"
+        elif score >= 50:
+            return "Medium"
+        return "Low"
+
+    @staticmethod
+    def _build_result(score: int, engagement_level: str, feedback: List[Dict]) -> Dict:
+        """Attach predicted reach/likes/comments to a scored prediction."""
         base_multiplier = score / 50
         predicted_reach = int(500 * base_multiplier + random.randint(100, 500))
         predicted_likes = int(50 * base_multiplier + random.randint(10, 50))
@@ -428,20 +935,14 @@ class EngagementPredictor:
             "predicted_comments": predicted_comments
         }
 
-    def _fallback_score(
-        self, caption, hashtags, platform, posting_time, day_of_week, media_info
-    ) -> int:
+    def _fallback_score(self, post: ParsedPost) -> int:
         """Fallback rule-based scoring when ML models are unavailable."""
         score = 50
-        config = self.platform_config.get(platform, self.platform_config["instagram"])
-
-        caption_length = len(caption)
-        hashtag_count = len(re.findall(r'#\w+', hashtags))
+        config = post.config
+        media_info = post.media_info
 
-        try:
-            hour = int(posting_time.split(':')[0])
-        except:
-            hour = 12
+        caption_length = post.caption_length
+        hashtag_count = post.hashtag_count
 
         # Media
         if media_info:
@@ -473,9 +974,9 @@ class EngagementPredictor:
             score -= 5
 
         # Time
-        if hour in config["peak_hours"]:
+        if post.is_peak:
             score += 10
-        if day_of_week in config["best_days"]:
+        if post.is_best_day:
             score += 5
 
         return max(0, min(100, score))
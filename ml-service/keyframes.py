@@ -0,0 +1,117 @@
+"""
+EngagePredict - Keyframe Sampling
+Aggregate perceptual quality over a few evenly spaced frames of animated
+GIF/WebP images and motion-JPEG (MJPEG in MOV/MP4) videos.
+
+Every frame is measured with the image_quality kernels on a thumbnail.
+Sampling stops before a frame that would overrun the millisecond budget
+(predicted from the previous frame's cost); the result then covers only
+the frames sampled so far and says how many that was.
+"""
+
+import time
+from io import BytesIO
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+from image_quality import load_thumbnail, measure_image, quality_label
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# MP4/QuickTime sample entry fourccs whose samples are plain JPEG images
+MJPEG_CODECS = {"jpeg", "mjpa", "mjpb", "AVDJ", "dmb1"}
+
+# Per-frame measures averaged into the aggregate
+AVERAGED_MEASURES = ("sharpness", "brightness", "shadowClipping", "highlightClipping", "noise")
+
+
+def evenly_spaced(total: int, count: int) -> List[int]:
+    """`count` frame indices spread over [0, total), always including frame 0."""
+    if total <= count:
+        return list(range(total))
+    return sorted({int(i * total / count) for i in range(count)})
+
+
+def aggregate(frames: Sequence[Dict], frames_total: int, partial: bool, started: float) -> Dict:
+    """Mean of the per-frame measures, plus the worst frame's score."""
+    result: Dict = {"framesSampled": len(frames), "framesTotal": frames_total}
+    if frames:
+        for name in AVERAGED_MEASURES:
+            values = [frame[name] for frame in frames if name in frame]
+            if values:
+                result[name] = round(sum(values) / len(values), 4)
+        scores = [frame["score"] for frame in frames if "score" in frame]
+        if scores:
+            result["score"] = int(round(sum(scores) / len(scores)))
+            result["minScore"] = min(scores)
+            result["label"] = quality_label(result["score"])
+    result["partial"] = partial
+    result["elapsedMs"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def _sample_frames(indices: Sequence[int], measure_frame, budget_ms: float):
+    """
+    Run measure_frame(index) over `indices` within the budget.
+    Returns (frame measures, partial). The first frame is always measured.
+    """
+    deadline = time.perf_counter() + budget_ms / 1000.0
+    frames: List[Dict] = []
+    last_cost = 0.0
+    for index in indices:
+        start = time.perf_counter()
+        if frames and start + last_cost > deadline:
+            return frames, True
+        measures = measure_frame(index)
+        if measures is not None:
+            frames.append(measures)
+        last_cost = time.perf_counter() - start
+    return frames, False
+
+
+def sample_animated(image: "Image.Image", count: int, budget_ms: float) -> Dict:
+    """Sample an animated image (already opened with PIL, n_frames > 1)."""
+    started = time.perf_counter()
+    frames_total = getattr(image, "n_frames", 1)
+
+    def measure_frame(index: int) -> Dict:
+        # Seeking forward decodes the frames in between (GIF deltas)
+        image.seek(index)
+        return measure_image(load_thumbnail(image.copy()))
+
+    frames, partial = _sample_frames(evenly_spaced(frames_total, count), measure_frame, budget_ms)
+    return aggregate(frames, frames_total, partial, started)
+
+
+def read_mjpeg_frames(
+    stream: BinaryIO, samples: Sequence[Tuple[int, int]], count: int
+) -> List[bytes]:
+    """JPEG bytes of `count` evenly spaced frames, given their (offset, size) in the container."""
+    frames = []
+    for index in evenly_spaced(len(samples), count):
+        offset, size = samples[index]
+        stream.seek(offset)
+        frames.append(stream.read(size))
+    return frames
+
+
+def sample_jpeg_frames(frames: Sequence[bytes], frames_total: int, budget_ms: float) -> Optional[Dict]:
+    """Measure already-read JPEG frames (CPU only, so it can run in a worker process)."""
+    if not PIL_AVAILABLE or not frames:
+        return None
+
+    started = time.perf_counter()
+
+    def measure_frame(index: int) -> Optional[Dict]:
+        try:
+            return measure_image(load_thumbnail(Image.open(BytesIO(frames[index]))))
+        except Exception:
+            return None
+
+    measured, partial = _sample_frames(range(len(frames)), measure_frame, budget_ms)
+    return aggregate(measured, frames_total, partial, started)
+
@@ -0,0 +1,501 @@
+"""
+EngagePredict - KNN Neighbour Indexes
+Pluggable neighbour search for the compiled KNN ensemble member.
+
+- brute   : exact, one distance block against the whole training matrix
+- kd_tree : exact, sklearn KDTree (good for the 14 scaled features)
+- ball_tree: exact, sklearn BallTree
+- ivf     : approximate; k-means coarse lists over 8-bit quantized vectors,
+            the best candidates re-ranked on the float32 training rows
+
+Every index answers search(x, k) -> (squared distances, training row ids),
+both N×k, so CompiledEnsemble can swap them freely. A built index lives in
+models/knn_index/ next to the other model files; the service picks it up
+when ML_KNN_INDEX=1 (the default) and it matches the loaded training rows.
+
+Usage (after train_models.py):
+    python knn_index.py build --kind ivf --nprobe 8
+    python knn_index.py evaluate              # recall and latency vs exact KNN
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+INDEX_DIRNAME = "knn_index"
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+KINDS = ("brute", "kd_tree", "ball_tree", "ivf")
+
+# Rows per distance block (bounds the N×n_train distance matrix)
+CHUNK_ROWS = 256
+# Training rows sampled for IVF k-means
+IVF_TRAIN_SAMPLE = 100_000
+
+
+def _sq_distances(x: np.ndarray, y: np.ndarray, y_sq: np.ndarray) -> np.ndarray:
+    sq_dist = (
+        np.einsum("ij,ij->i", x, x)[:, np.newaxis]
+        - 2.0 * (x @ y.T)
+        + y_sq[np.newaxis, :]
+    )
+    return np.maximum(sq_dist, 0.0, out=sq_dist)
+
+
+def _top_k(sq_dist: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k smallest entries per row (unordered)."""
+    if sq_dist.shape[1] <= k:
+        return np.broadcast_to(np.arange(sq_dist.shape[1]), sq_dist.shape).copy()
+    return np.argpartition(sq_dist, k - 1, axis=1)[:, :k]
+
+
+def fit_fingerprint(fit_x: np.ndarray) -> str:
+    """Cheap identity check for a training matrix (strided rows + shape)."""
+    stride = max(1, fit_x.shape[0] // 4096)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(fit_x.shape).encode())
+    digest.update(np.ascontiguousarray(fit_x[::stride], dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+# ─── Indexes ────────────────────────────────────────────────────
+
+class BruteForceIndex:
+    """Exact search: distances to every training row, in row blocks."""
+
+    kind = "brute"
+
+    def __init__(self, fit_x: np.ndarray, fit_sq: Optional[np.ndarray] = None):
+        self.fit_x = fit_x
+        self.fit_sq = fit_sq if fit_sq is not None else np.einsum("ij,ij->i", fit_x, fit_x)
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.asarray(x, dtype=np.float32)
+        k = min(k, self.fit_x.shape[0])
+        sq = np.empty((x.shape[0], k), dtype=np.float32)
+        ids = np.empty((x.shape[0], k), dtype=np.int64)
+
+        for start in range(0, x.shape[0], CHUNK_ROWS):
+            block = x[start:start + CHUNK_ROWS]
+            # |y|² - 2x·y ranks rows like the full distance without the |x|² pass
+            partial = block @ self.fit_x.T
+            partial *= -2.0
+            partial += self.fit_sq
+            neighbours = _top_k(partial, k)
+            # Distances of the k winners from the difference itself: the expanded
+            # form cancels badly in float32 and would miss exact matches
+            diff = self.fit_x.take(neighbours, axis=0) - block[:, np.newaxis, :]
+            end = start + block.shape[0]
+            sq[start:end] = np.einsum("ijk,ijk->ij", diff, diff)
+            ids[start:end] = neighbours
+        return sq, ids
+
+    def params(self) -> Dict:
+        return {}
+
+
+class TreeIndex:
+    """Exact search through a sklearn KDTree or BallTree."""
+
+    def __init__(self, kind: str, tree, leaf_size: int):
+        self.kind = kind
+        self.tree = tree
+        # Not readable back from the tree in recent scikit-learn versions
+        self.leaf_size = leaf_size
+
+    @classmethod
+    def build(cls, fit_x: np.ndarray, kind: str = "kd_tree", leaf_size: int = 40) -> "TreeIndex":
+        from sklearn.neighbors import BallTree, KDTree
+
+        tree_cls = KDTree if kind == "kd_tree" else BallTree
+        return cls(kind, tree_cls(np.asarray(fit_x, dtype=np.float64), leaf_size=leaf_size), leaf_size)
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.tree.data.shape[0])
+        dist, ids = self.tree.query(np.asarray(x, dtype=np.float64), k=k)
+        return (dist ** 2).astype(np.float32), ids.astype(np.int64)
+
+    def params(self) -> Dict:
+        return {"leaf_size": int(self.leaf_size)}
+
+
+class IVFIndex:
+    """
+    Approximate search over an inverted file of 8-bit quantized vectors.
+
+    Training rows are clustered into `nlist` k-means lists and stored list
+    by list as uint8 codes. A query scans the `nprobe` nearest lists on the
+    codes, keeps the best k × `rerank` candidates and re-ranks those on the
+    float32 training rows, so the returned distances are exact.
+    """
+
+    kind = "ivf"
+    ARRAY_FIELDS = ("centroids", "offsets", "ids", "codes", "lo", "step")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], fit_x: np.ndarray,
+                 nprobe: int, rerank: int):
+        for name in self.ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+        self.centroids_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.fit_x = fit_x
+        self.nprobe = min(nprobe, self.centroids.shape[0])
+        self.rerank = rerank
+        self._exact = None
+
+    @classmethod
+    def build(cls, fit_x: np.ndarray, nlist: Optional[int] = None, nprobe: int = 8,
+              rerank: int = 4, iterations: int = 10, seed: int = 0) -> "IVFIndex":
+        fit_x = np.ascontiguousarray(fit_x, dtype=np.float32)
+        n = fit_x.shape[0]
+        nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+
+        # Lloyd's k-means on a sample of the training rows
+        sample = fit_x[rng.choice(n, size=min(n, max(IVF_TRAIN_SAMPLE, nlist)), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = cls._assign(sample, centroids)
+            counts = np.bincount(assign, minlength=nlist)
+            filled = counts > 0
+            for dim in range(sample.shape[1]):
+                sums = np.bincount(assign, weights=sample[:, dim], minlength=nlist)
+                centroids[filled, dim] = sums[filled] / counts[filled]
+
+        assign = cls._assign(fit_x, centroids)
+        ids = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+
+        # Per-dimension 8-bit scalar quantization
+        lo = fit_x.min(axis=0)
+        step = (fit_x.max(axis=0) - lo) / 255.0
+        step[step == 0] = 1.0
+        codes = np.rint((fit_x[ids] - lo) / step).astype(np.uint8)
+
+        arrays = {
+            "centroids": centroids, "offsets": offsets.astype(np.int64), "ids": ids,
+            "codes": codes, "lo": lo.astype(np.float32), "step": step.astype(np.float32)
+        }
+        return cls(arrays, fit_x, nprobe, rerank)
+
+    @staticmethod
+    def _assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        centroids_sq = np.einsum("ij,ij->i", centroids, centroids)
+        assign = np.empty(x.shape[0], dtype=np.int64)
+        for start in range(0, x.shape[0], CHUNK_ROWS * 16):
+            block = x[start:start + CHUNK_ROWS * 16]
+            assign[start:start + block.shape[0]] = np.argmin(
+                _sq_distances(block, centroids, centroids_sq), axis=1
+            )
+        return assign
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.asarray(x, dtype=np.float32)
+        n = x.shape[0]
+        k = min(k, self.fit_x.shape[0])
+        width = min(k * self.rerank, self.fit_x.shape[0])
+        if n == 0:
+            return np.empty((0, k), dtype=np.float32), np.empty((0, k), dtype=np.int64)
+
+        probes = _top_k(_sq_distances(x, self.centroids, self.centroids_sq), self.nprobe)
+        best_sq = np.full((n, width), np.inf, dtype=np.float32)
+        best_ids = np.full((n, width), -1, dtype=np.int64)
+
+        # Group (query, list) pairs by list so each list's codes are decoded once
+        flat = probes.ravel()
+        order = np.argsort(flat, kind="stable")
+        lists = flat[order]
+        queries = order // probes.shape[1]
+        bounds = np.flatnonzero(np.diff(lists)) + 1
+        for rows, lst in zip(np.split(queries, bounds), lists[np.r_[0, bounds]]):
+            start, end = self.offsets[lst], self.offsets[lst + 1]
+            if start == end:
+                continue
+            members = self.codes[start:end].astype(np.float32) * self.step + self.lo
+            sq_dist = _sq_distances(x[rows], members, np.einsum("ij,ij->i", members, members))
+
+            cand_sq = np.hstack([best_sq[rows], sq_dist])
+            cand_ids = np.hstack([
+                best_ids[rows], np.broadcast_to(self.ids[start:end], sq_dist.shape)
+            ])
+            keep = _top_k(cand_sq, width)
+            best_sq[rows] = np.take_along_axis(cand_sq, keep, axis=1)
+            best_ids[rows] = np.take_along_axis(cand_ids, keep, axis=1)
+
+        # Exact re-rank of the candidates on the float32 training rows
+        found = best_ids >= 0
+        diff = self.fit_x[np.maximum(best_ids, 0)] - x[:, np.newaxis, :]
+        exact_sq = np.einsum("ijk,ijk->ij", diff, diff)
+        exact_sq[~found] = np.inf
+        keep = _top_k(exact_sq, k)
+        sq = np.take_along_axis(exact_sq, keep, axis=1)
+        ids = np.take_along_axis(best_ids, keep, axis=1)
+
+        # Probed lists held fewer than k rows: answer those queries exactly
+        short = ~np.isfinite(sq).all(axis=1)
+        if short.any():
+            if self._exact is None:
+                self._exact = BruteForceIndex(self.fit_x)
+            sq[short], ids[short] = self._exact.search(x[short], k)
+        return sq, ids
+
+    def params(self) -> Dict:
+        return {"nlist": int(self.centroids.shape[0]), "nprobe": int(self.nprobe),
+                "rerank": int(self.rerank)}
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.ARRAY_FIELDS}
+
+    def appended(self, rows: np.ndarray, fit_x: np.ndarray) -> "IVFIndex":
+        """
+        The index with `rows` added as training rows fit_x[-len(rows):].
+        New rows join their nearest existing list (no k-means retrain);
+        values outside the quantizer range are clipped, which the exact
+        re-rank absorbs.
+        """
+        rows = np.asarray(rows, dtype=np.float32)
+        nlist = self.centroids.shape[0]
+        first_id = fit_x.shape[0] - rows.shape[0]
+
+        assign = np.concatenate([
+            np.repeat(np.arange(nlist), np.diff(self.offsets)),
+            self._assign(rows, np.asarray(self.centroids))
+        ])
+        ids = np.concatenate([self.ids, np.arange(first_id, fit_x.shape[0], dtype=np.int64)])
+        codes = np.concatenate([
+            self.codes, np.clip(np.rint((rows - self.lo) / self.step), 0, 255).astype(np.uint8)
+        ])
+
+        order = np.argsort(assign, kind="stable")
+        arrays = self._arrays()
+        arrays["ids"] = ids[order]
+        arrays["codes"] = codes[order]
+        arrays["offsets"] = np.concatenate(
+            [[0], np.cumsum(np.bincount(assign, minlength=nlist))]
+        ).astype(np.int64)
+        return IVFIndex(arrays, fit_x, self.nprobe, self.rerank)
+
+
+def build_index(kind: str, fit_x: np.ndarray, **params):
+    if kind == "brute":
+        return BruteForceIndex(np.ascontiguousarray(fit_x, dtype=np.float32))
+    if kind in ("kd_tree", "ball_tree"):
+        return TreeIndex.build(fit_x, kind, **params)
+    if kind == "ivf":
+        return IVFIndex.build(fit_x, **params)
+    raise ValueError(f"Unknown KNN index kind: {kind} (expected one of {', '.join(KINDS)})")
+
+
+# ─── Persistence ────────────────────────────────────────────────
+
+def has_index(directory: str) -> bool:
+    return os.path.isfile(os.path.join(directory, MANIFEST_NAME))
+
+
+def save_index(index, directory: str, fit_x: np.ndarray, report: Optional[Dict] = None) -> str:
+    """Write an index next to the model files; renamed into place like the arrays."""
+    staging = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    if isinstance(index, IVFIndex):
+        for name in IVFIndex.ARRAY_FIELDS:
+            np.save(os.path.join(staging, f"{name}.npy"), getattr(index, name))
+    elif isinstance(index, TreeIndex):
+        with open(os.path.join(staging, "tree.pkl"), "wb") as f:
+            pickle.dump(index.tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "kind": index.kind,
+        "params": index.params(),
+        "n_train": int(fit_x.shape[0]),
+        "fit_fingerprint": fit_fingerprint(fit_x),
+        "report": report
+    }
+    with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return directory
+
+
+def load_index(directory: str, fit_x: np.ndarray, mmap: bool = True):
+    """
+    Open a saved index for the KNN training rows `fit_x`.
+
+    Raises ValueError when the index was built for different training rows.
+    """
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported KNN index format {manifest.get('format_version')} "
+            f"(expected {FORMAT_VERSION})"
+        )
+    if (manifest["n_train"] != fit_x.shape[0]
+            or manifest["fit_fingerprint"] != fit_fingerprint(fit_x)):
+        raise ValueError("KNN index was built for different training data; rebuild it")
+
+    kind, params = manifest["kind"], manifest["params"]
+    if kind == "brute":
+        return BruteForceIndex(fit_x)
+    if kind in ("kd_tree", "ball_tree"):
+        with open(os.path.join(directory, "tree.pkl"), "rb") as f:
+            return TreeIndex(kind, pickle.load(f), params["leaf_size"])
+    if kind == "ivf":
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in IVFIndex.ARRAY_FIELDS
+        }
+        return IVFIndex(arrays, fit_x, params["nprobe"], params["rerank"])
+    raise ValueError(f"Unknown KNN index kind: {kind}")
+
+
+# ─── Evaluation ─────────────────────────────────────────────────
+
+def sample_queries(fit_x: np.ndarray, n: int, noise: float = 0.25, seed: int = 0) -> np.ndarray:
+    """Perturbed training rows, in the scaled feature space."""
+    rng = np.random.default_rng(seed)
+    idx = rng.choice(fit_x.shape[0], size=min(n, fit_x.shape[0]), replace=False)
+    queries = fit_x[idx].astype(np.float32)
+    queries += rng.normal(0.0, noise, size=queries.shape).astype(np.float32)
+    return queries
+
+
+def evaluate_index(index, exact, queries: np.ndarray, k: int, latency_queries: int = 200) -> Dict:
+    """Recall@k of `index` against `exact`, with single-query and batch latency."""
+    _, exact_ids = exact.search(queries, k)
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    batch_seconds = time.perf_counter() - start
+
+    hits = (ids[:, :, np.newaxis] == exact_ids[:, np.newaxis, :]).any(axis=2)
+
+    latencies = []
+    for row in queries[:latency_queries]:
+        start = time.perf_counter()
+        index.search(row[np.newaxis, :], k)
+        latencies.append(time.perf_counter() - start)
+    latencies_us = np.asarray(latencies) * 1e6
+
+    return {
+        "kind": index.kind,
+        "params": index.params(),
+        "k": k,
+        "queries": int(queries.shape[0]),
+        "recall_at_k": round(float(hits.mean()), 5),
+        "single_p50_us": round(float(np.percentile(latencies_us, 50)), 2),
+        "single_p99_us": round(float(np.percentile(latencies_us, 99)), 2),
+        "batch_rows_per_s": round(queries.shape[0] / max(batch_seconds, 1e-9), 1)
+    }
+
+
+def _print_report(report: Dict):
+    print(
+        f"   {report['kind']:<10} recall@{report['k']} {report['recall_at_k']:.4f}   "
+        f"p50 {report['single_p50_us']:>10.1f} µs   p99 {report['single_p99_us']:>10.1f} µs   "
+        f"{report['batch_rows_per_s']:>12,.0f} rows/s"
+    )
+
+
+def _models_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+def _load_ensemble(base_dir: str):
+    """Compiled ensemble from `base_dir`/arrays (models/ or a registry version)."""
+    from artifacts import ARRAYS_DIRNAME, has_arrays, load_arrays
+
+    arrays_dir = os.path.join(base_dir, ARRAYS_DIRNAME)
+    if not has_arrays(arrays_dir):
+        raise SystemExit(f"No model arrays in {arrays_dir}. Run 'python train_models.py' first.")
+    # Weights don't affect neighbour search
+    weights = {"logistic_regression": 1.0, "random_forest": 1.0, "knn": 1.0}
+    return load_arrays(arrays_dir, weights, mmap=False)[0]
+
+
+def build_and_save(kind: str, base_dir: str, n_queries: int = 2000, **params) -> Dict:
+    """Build an index over the KNN rows in `base_dir`, measure it and save it there."""
+    ensemble = _load_ensemble(base_dir)
+    fit_x = ensemble.knn_fit_x
+
+    start = time.perf_counter()
+    index = build_index(kind, fit_x, **params)
+    build_seconds = time.perf_counter() - start
+
+    report = evaluate_index(
+        index, BruteForceIndex(fit_x, ensemble.knn_fit_sq),
+        sample_queries(fit_x, n_queries), ensemble.knn_k
+    )
+    report["build_seconds"] = round(build_seconds, 2)
+    save_index(index, os.path.join(base_dir, INDEX_DIRNAME), fit_x, report)
+    print(f"[SAVED] {INDEX_DIRNAME}/ ({kind}, built in {build_seconds:.1f}s)")
+    _print_report(report)
+    return report
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or evaluate the KNN neighbour index")
+    parser.add_argument("mode", choices=["build", "evaluate"])
+    parser.add_argument("--kind", choices=KINDS, default="ivf", help="Index to build")
+    parser.add_argument("--nlist", type=int, help="IVF lists (default: sqrt(n_train))")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF lists scanned per query")
+    parser.add_argument("--rerank", type=int, default=4, help="IVF candidates re-ranked, × k")
+    parser.add_argument("--leaf-size", type=int, default=40, help="KD/ball tree leaf size")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    def params_for(kind: str) -> Dict:
+        if kind == "ivf":
+            return {"nlist": args.nlist, "nprobe": args.nprobe, "rerank": args.rerank}
+        if kind in ("kd_tree", "ball_tree"):
+            return {"leaf_size": args.leaf_size}
+        return {}
+
+    from model_registry import ModelRegistry, artifacts_base_dir
+
+    models_dir = _models_dir()
+    registry = ModelRegistry(models_dir)
+    if args.mode == "build":
+        active_dir = registry.active_dir()
+        if active_dir is None:
+            build_and_save(args.kind, models_dir, args.queries, **params_for(args.kind))
+            return
+
+        # Serving reads the registry: publish the active arrays with the new index
+        def write(staging: str):
+            from artifacts import ARRAYS_DIRNAME
+            shutil.copytree(os.path.join(active_dir, ARRAYS_DIRNAME),
+                            os.path.join(staging, ARRAYS_DIRNAME))
+            build_and_save(args.kind, staging, args.queries, **params_for(args.kind))
+
+        version = registry.publish(write, {"source": f"knn_index {args.kind}"})
+        print(f"[SAVED] version {version}")
+        return
+
+    ensemble = _load_ensemble(artifacts_base_dir(models_dir))
+    fit_x = ensemble.knn_fit_x
+    exact = BruteForceIndex(fit_x, ensemble.knn_fit_sq)
+    queries = sample_queries(fit_x, args.queries)
+    print(f"[KNN] {fit_x.shape[0]} training rows, k={ensemble.knn_k}, {len(queries)} queries")
+    for kind in KINDS:
+        _print_report(evaluate_index(
+            build_index(kind, fit_x, **params_for(kind)), exact, queries, ensemble.knn_k
+        ))
+
+
+if __name__ == "__main__":
+    main()
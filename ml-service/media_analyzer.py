@@ -1,5 +1,11 @@
-from typing import Dict, Optional
+from typing import BinaryIO, Dict, List, Optional, Tuple
 from io import BytesIO
+import os
+
+from image_quality import analyze_quality
+from keyframes import MJPEG_CODECS, read_mjpeg_frames, sample_animated, sample_jpeg_frames
+from media_cache import HASH_BYTES, MediaCache, content_key
+from media_probe import IMAGE_PROBE_BYTES, mp4_video_samples, probe_image_size, probe_video
 
 try:
     from PIL import Image
@@ -13,46 +19,256 @@ class MediaAnalyzer:
     Analyze media files for quality metrics like resolution, orientation, aspect ratio
     """
     
-    def __init__(self):
+    def __init__(self, cache: Optional[MediaCache] = None):
         self.supported_image_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
         self.supported_video_types = ["video/mp4", "video/quicktime", "video/webm"]
-    
+        # Results by content hash (ML_MEDIA_CACHE_SIZE / ML_MEDIA_CACHE_DB)
+        self.cache = cache if cache is not None else MediaCache.from_env()
+        # Perceptual quality (sharpness/exposure/noise) on a downscaled decode.
+        # Image uploads are read to the end (no header fast path) and decoded
+        # on the media pool, at most ML_IMAGE_QUALITY_BUDGET_MS per image;
+        # images predicted to exceed it keep resolution-only scores
+        self.image_quality = os.getenv("ML_IMAGE_QUALITY", "1") == "1"
+        self.quality_budget_ms = float(os.getenv("ML_IMAGE_QUALITY_BUDGET_MS", "100"))
+        # Optional: quality over N keyframes of animated GIF/WebP and MJPEG video
+        self.keyframe_samples = int(os.getenv("ML_KEYFRAME_SAMPLES", "0"))
+        self.keyframe_budget_ms = float(os.getenv("ML_KEYFRAME_BUDGET_MS", "250"))
+
+    @property
+    def decodes_images(self) -> bool:
+        """Whether image analysis needs the whole file (not just the header)"""
+        return self.image_quality or self.keyframe_samples > 0
+
+    def __getstate__(self):
+        # Copies sent to the media process pool don't carry the cache
+        # (it holds locks and a DB handle); the parent checks it instead
+        state = self.__dict__.copy()
+        del state["cache"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cache = MediaCache(max_size=0)
+
+    def cache_config(self) -> str:
+        """Fingerprint of the settings that change analysis results"""
+        quality = f"q{self.quality_budget_ms:g}" if self.image_quality else "q-"
+        keyframes = (f"k{self.keyframe_samples}/{self.keyframe_budget_ms:g}"
+                     if self.keyframe_samples > 0 else "k-")
+        return f"{quality}:{keyframes}"
+
+    def cache_key(self, header: bytes, size: int, content_type: str) -> Optional[str]:
+        if not self.cache.enabled:
+            return None
+        return content_key(header, size, content_type, self.cache_config())
+
+    def lookup(self, key: Optional[str]) -> Optional[Dict]:
+        """Cached metrics for a cache_key(), or None"""
+        if key is None:
+            return None
+        cached = self.cache.get(key)
+        return dict(cached) if cached is not None else None
+
+    def remember(self, key: Optional[str], metrics: Dict) -> Dict:
+        """Cache successful metrics under a cache_key(); returns them unchanged"""
+        if key is not None and "error" not in metrics:
+            self.cache.put(key, dict(metrics))
+        return metrics
+
     def analyze(self, file_bytes: bytes, content_type: str) -> Dict:
         """
         Analyze media file and return quality metrics
         """
+        key = self.cache_key(file_bytes, len(file_bytes), content_type)
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+        return self.remember(key, self._analyze_bytes(file_bytes, content_type))
+
+    def _analyze_bytes(self, file_bytes: bytes, content_type: str) -> Dict:
         if content_type in self.supported_image_types:
             return self._analyze_image(file_bytes)
         elif content_type in self.supported_video_types:
-            return self._analyze_video_fallback(file_bytes)
+            return self._analyze_video(BytesIO(file_bytes))
         else:
-            return {
-                "error": "Unsupported media type",
-                "supported_types": self.supported_image_types + self.supported_video_types
-            }
+            return self.unsupported_media()
+
+    def unsupported_media(self) -> Dict:
+        return {
+            "error": "Unsupported media type",
+            "supported_types": self.supported_image_types + self.supported_video_types
+        }
     
+    def analyze_stream(self, stream: BinaryIO, content_type: str) -> Dict:
+        """
+        Analyze a seekable file object without reading it fully into memory
+        (videos are parsed by seeking through container metadata)
+        """
+        if content_type in self.supported_video_types:
+            key, metrics, keyframes = self.read_video_stream(stream, content_type)
+            if keyframes is not None:
+                metrics = self.measure_keyframes(metrics, *keyframes)
+            return self.remember(key, metrics)
+
+        stream.seek(0)
+        header = stream.read(IMAGE_PROBE_BYTES)
+        analysis = self.analyze_header(header, content_type)
+        if analysis is not None:
+            return analysis
+        return self.analyze(header + stream.read(), content_type)
+
+    def read_video_stream(
+        self, stream: BinaryIO, content_type: str
+    ) -> Tuple[Optional[str], Dict, Optional[Tuple[List[bytes], int]]]:
+        """
+        (cache key, metrics, keyframes) for a seekable video, using only
+        seeks and reads. keyframes is (JPEG frame bytes, total frames) when
+        MJPEG frames are to be measured with measure_keyframes, which does
+        the decoding and can run in the media process pool. A cached result
+        comes back with no key and no keyframes.
+        """
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        key = self.cache_key(stream.read(HASH_BYTES), size, content_type)
+        cached = self.lookup(key)
+        if cached is not None:
+            return None, cached, None
+        metrics, keyframes = self._read_video(stream)
+        return key, metrics, keyframes
+
+    def measure_keyframes(self, metrics: Dict, frames: List[bytes], frames_total: int) -> Dict:
+        """Cap a video's metrics by the quality of its sampled keyframes"""
+        quality = sample_jpeg_frames(frames, frames_total, self.keyframe_budget_ms)
+        if quality is not None:
+            self._cap_quality(metrics, quality)
+        return metrics
+
+    def probe_stream(self, stream: BinaryIO, content_type: str) -> Optional[Dict]:
+        """
+        Metrics from the part of a file received so far, or None if more
+        bytes are needed (or the metadata can't be parsed)
+        """
+        if content_type in self.supported_image_types:
+            if self.decodes_images:
+                return None
+            stream.seek(0)
+            return self._probe_image(stream.read(IMAGE_PROBE_BYTES))
+        if content_type in self.supported_video_types:
+            probed = probe_video(stream)
+            if probed is None or self._samples_video(probed):
+                return None
+            return self._video_metrics(probed)
+        return None
+
+    def analyze_header(self, header: bytes, content_type: str) -> Optional[Dict]:
+        """
+        Fast path: metrics from the first bytes of an image file.
+        Returns None when the header can't be parsed (caller falls back to analyze).
+        """
+        if content_type not in self.supported_image_types or self.decodes_images:
+            return None
+        return self._probe_image(header)
+
+    def _probe_image(self, header: bytes) -> Optional[Dict]:
+        probed = probe_image_size(header[:IMAGE_PROBE_BYTES])
+        if probed is None:
+            return None
+        _, width, height = probed
+        if width <= 0 or height <= 0:
+            return None
+        return self._generate_metrics(width, height, "image")
+
     def _analyze_image(self, file_bytes: bytes) -> Dict:
         """
-        Analyze image file using PIL
+        Analyze image file from its header, using PIL only as a fallback
         """
-        if not PIL_AVAILABLE:
-            return self._fallback_analysis()
-        
-        try:
-            image = Image.open(BytesIO(file_bytes))
-            width, height = image.size
-            
-            return self._generate_metrics(width, height, "image")
-        except Exception as e:
-            return {
-                "error": f"Failed to analyze image: {str(e)}",
-                "type": "image"
-            }
+        metrics = self._probe_image(file_bytes)
+        if metrics is None:
+            if not PIL_AVAILABLE:
+                return self._fallback_analysis()
+
+            try:
+                image = Image.open(BytesIO(file_bytes))
+                width, height = image.size
+
+                metrics = self._generate_metrics(width, height, "image")
+            except Exception as e:
+                return {
+                    "error": f"Failed to analyze image: {str(e)}",
+                    "type": "image"
+                }
+
+        if self.decodes_images:
+            self._apply_quality(metrics, file_bytes)
+        return metrics
+
+    def _apply_quality(self, metrics: Dict, file_bytes: bytes):
+        """
+        Add perceptual quality measures (keyframes for animated images)
+        """
+        quality = None
+        if self.keyframe_samples > 0 and PIL_AVAILABLE:
+            try:
+                image = Image.open(BytesIO(file_bytes))
+                if getattr(image, "n_frames", 1) > 1:
+                    quality = sample_animated(
+                        image, self.keyframe_samples, self.keyframe_budget_ms
+                    )
+            except Exception:
+                quality = None
+        if quality is None and self.image_quality:
+            quality = analyze_quality(file_bytes, self.quality_budget_ms)
+        if quality is not None:
+            self._cap_quality(metrics, quality)
+
+    def _cap_quality(self, metrics: Dict, quality: Dict):
+        """
+        Attach quality measures and cap qualityScore by them
+        (a blurry 4K photo is no longer "High")
+        """
+        metrics["quality"] = quality
+        if "label" in quality:
+            ranks = ["Low", "Medium", "High"]
+            metrics["qualityScore"] = ranks[min(
+                ranks.index(metrics["qualityScore"]), ranks.index(quality["label"])
+            )]
     
-    def _analyze_video_fallback(self, file_bytes: bytes) -> Dict:
+    def _analyze_video(self, stream: BinaryIO) -> Dict:
+        """
+        Analyze video from MP4/QuickTime or WebM container metadata
+        """
+        metrics, keyframes = self._read_video(stream)
+        if keyframes is not None:
+            metrics = self.measure_keyframes(metrics, *keyframes)
+        return metrics
+
+    def _read_video(self, stream: BinaryIO) -> Tuple[Dict, Optional[Tuple[List[bytes], int]]]:
+        """Container metrics plus the MJPEG keyframes to measure, if sampled"""
+        probed = probe_video(stream)
+        if probed is None:
+            return self._analyze_video_fallback(), None
+        metrics = self._video_metrics(probed)
+        if not self._samples_video(probed):
+            return metrics, None
+        samples = mp4_video_samples(stream) or []
+        if not samples:
+            return metrics, None
+        return metrics, (read_mjpeg_frames(stream, samples, self.keyframe_samples), len(samples))
+
+    def _samples_video(self, probed: Dict) -> bool:
+        # Only motion-JPEG frames can be decoded without a video codec
+        return self.keyframe_samples > 0 and probed.get("codec") in MJPEG_CODECS
+
+    def _video_metrics(self, probed: Dict) -> Dict:
+        metrics = self._generate_metrics(probed["width"], probed["height"], "video")
+        if probed["duration"] is not None:
+            metrics["duration"] = int(round(probed["duration"]))
+        return metrics
+
+    def _analyze_video_fallback(self) -> Dict:
         """
-        Fallback video analysis without OpenCV dependency
-        For production, would use opencv-python or ffprobe
+        Default values when the container can't be parsed
         """
         # Return reasonable defaults for video
         return {
@@ -63,7 +279,7 @@ class MediaAnalyzer:
             "aspectRatio": "16:9",
             "resolution": "1080p",
             "qualityScore": "High",
-            "note": "Video analyzed with default values. Install opencv-python for accurate analysis."
+            "note": "Video container could not be parsed; analyzed with default values."
         }
     
     def _generate_metrics(self, width: int, height: int, media_type: str) -> Dict:
@@ -0,0 +1,121 @@
+"""
+EngagePredict - Media Analysis Cache
+Remembers MediaAnalyzer results by content hash, so re-running a
+prediction on the same asset (e.g. from History) skips decoding.
+
+Keys are BLAKE2b over the key version, the analyzer settings that change
+the result, the content type, file size and the first HASH_BYTES of the
+file. Entries live in an in-memory LRU; with a database path configured,
+evicted entries spill to SQLite and are promoted back on a hit. Each
+process opens its own connection on first use, so the file can be shared
+by every worker on a host, including workers forked by serve.py.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from prediction_cache import PredictionCache
+
+
+# Bytes of the file that go into the key (the whole image header for
+# JPEG/PNG/GIF/WebP, or the ftyp/moov/EBML head of a video)
+HASH_BYTES = 64 * 1024
+# Bump when the metrics layout changes, so spilled entries are not reused
+KEY_VERSION = 2
+
+
+def content_key(header: bytes, size: int, content_type: str, config: str = "") -> str:
+    """Cache key; `config` fingerprints the analyzer settings behind the result."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{KEY_VERSION}:{config}:{content_type}:{size}:".encode())
+    digest.update(header[:HASH_BYTES])
+    return digest.hexdigest()
+
+
+class MediaCache(PredictionCache):
+    """
+    LRU of analysis results with an optional SQLite spill store.
+
+    `max_size=0` disables the cache (and the spill store with it).
+    """
+
+    def __init__(self, max_size: int = 1024, db_path: Optional[str] = None):
+        super().__init__(max_size=max_size, ttl_seconds=0)
+        self.db_path = db_path or None
+        self.disk_hits = 0
+        self.spilled = 0
+        self.spills = bool(self.db_path) and self.enabled
+        # Opened on first use by the process that uses it (see _connection)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._inherited = []
+        self._db_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "MediaCache":
+        return cls(
+            max_size=int(os.getenv("ML_MEDIA_CACHE_SIZE", "1024")),
+            db_path=os.getenv("ML_MEDIA_CACHE_DB") or None
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        This process's spill store connection; call with _db_lock held.
+
+        SQLite connections must not cross fork(), so a connection opened
+        before serve.py forked its workers is replaced in each child. The
+        inherited one is kept referenced but never used: closing it would
+        also touch the parent's locks and WAL.
+        """
+        if self._db is not None and self._db_pid == os.getpid():
+            return self._db
+        if self._db is not None:
+            self._inherited.append(self._db)
+        db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS media_metrics "
+            "(key TEXT PRIMARY KEY, metrics TEXT NOT NULL)"
+        )
+        db.commit()
+        self._db, self._db_pid = db, os.getpid()
+        return db
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = super().get(key)
+        if value is not None or not self.spills:
+            return value
+
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT metrics FROM media_metrics WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value = json.loads(row[0])
+        self.disk_hits += 1
+        super().put(key, value)
+        return value
+
+    def _on_evict(self, entries):
+        if not self.spills:
+            return
+        with self._db_lock:
+            db = self._connection()
+            db.executemany(
+                "INSERT OR REPLACE INTO media_metrics (key, metrics) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in entries]
+            )
+            db.commit()
+            self.spilled += len(entries)
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        del stats["ttl_seconds"], stats["expirations"]
+        stats["disk_hits"] = self.disk_hits
+        stats["spilled"] = self.spilled
+        return stats
@@ -0,0 +1,518 @@
+"""
+EngagePredict - Media Header Probing
+Reads image dimensions straight from file headers, without decoding:
+- JPEG: SOFn segment
+- PNG:  IHDR chunk
+- GIF:  logical screen descriptor
+- WebP: VP8 / VP8L / VP8X chunk
+
+Only the first few KB of a file are needed, so large uploads never have to
+be fully read or handed to PIL.
+
+Video containers (MP4/QuickTime `moov/trak/tkhd`, WebM/Matroska EBML track
+headers) are parsed by seeking through box/element headers, without
+decoding frames or needing ffmpeg.
+"""
+
+import os
+import struct
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Bytes read from the start of an upload before probing
+IMAGE_PROBE_BYTES = 64 * 1024
+
+# JPEG start-of-frame markers that carry dimensions (excludes DHT/JPG/DAC)
+JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8, 0xD9} | set(range(0xD0, 0xD8))
+
+
+def sniff_media_type(header: bytes) -> Optional[str]:
+    """
+    MIME type from a file's magic bytes (ignores what the client declared).
+    Needs at least the first 12 bytes.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp":
+        return "video/quicktime" if header[8:12] == b"qt  " else "video/mp4"
+    if header[4:8] in (b"moov", b"mdat", b"wide", b"free", b"skip"):
+        return "video/quicktime"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "video/webm"
+    return None
+
+
+def probe_image_size(header: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Return (format, width, height) parsed from the start of an image file,
+    or None if the format is unknown or `header` is too short.
+    """
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _probe_png(header)
+    if header.startswith(b"\xff\xd8"):
+        return _probe_jpeg(header)
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return _probe_gif(header)
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return _probe_webp(header)
+    return None
+
+
+def _probe_png(header: bytes) -> Optional[Tuple[str, int, int]]:
+    if len(header) < 24 or header[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", header[16:24])
+    return "png", width, height
+
+
+def _probe_gif(header: bytes) -> Optional[Tuple[str, int, int]]:
+    if len(header) < 10:
+        return None
+    width, height = struct.unpack("<HH", header[6:10])
+    return "gif", width, height
+
+
+def _probe_jpeg(header: bytes) -> Optional[Tuple[str, int, int]]:
+    pos = 2
+    size = len(header)
+    while pos + 4 <= size:
+        if header[pos] != 0xFF:
+            return None
+        marker = header[pos + 1]
+        # Fill bytes: any number of 0xFF before a marker
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            pos += 2
+            continue
+
+        (length,) = struct.unpack(">H", header[pos + 2:pos + 4])
+        if marker in JPEG_SOF_MARKERS:
+            if pos + 9 > size:
+                return None
+            height, width = struct.unpack(">HH", header[pos + 5:pos + 9])
+            return "jpeg", width, height
+        if marker == 0xDA:
+            # Start of scan before any frame header: malformed
+            return None
+        pos += 2 + length
+    return None
+
+
+def _probe_webp(header: bytes) -> Optional[Tuple[str, int, int]]:
+    if len(header) < 30:
+        return None
+    chunk = header[12:16]
+
+    if chunk == b"VP8X":
+        width = 1 + int.from_bytes(header[24:27], "little")
+        height = 1 + int.from_bytes(header[27:30], "little")
+        return "webp", width, height
+
+    if chunk == b"VP8 ":
+        if header[23:26] != b"\x9d\x01\x2a":
+            return None
+        width, height = struct.unpack("<HH", header[26:30])
+        return "webp", width & 0x3FFF, height & 0x3FFF
+
+    if chunk == b"VP8L":
+        if header[20] != 0x2F:
+            return None
+        bits = int.from_bytes(header[21:25], "little")
+        return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+
+    return None
+
+
+# ─── Video containers ───────────────────────────────────────────
+
+# Upper bound on a single box/element we are willing to read into memory
+MAX_METADATA_BYTES = 16 * 1024 * 1024
+
+# Matroska/WebM element IDs (marker bits included)
+EBML_HEADER = 0x1A45DFA3
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+MKV_TRACK_TYPE_VIDEO = 1
+
+
+def probe_video(stream: BinaryIO) -> Optional[Dict]:
+    """
+    Return {"format", "width", "height", "duration", "codec"} for an
+    MP4/QuickTime or WebM/Matroska stream, or None if it can't be parsed.
+
+    Only container metadata is read: the parser seeks past media data, so
+    memory use is independent of file size. `duration` is in seconds (or
+    None when the container doesn't declare one); `codec` is the MP4 sample
+    entry fourcc (e.g. "avc1", "jpeg") or the Matroska CodecID.
+    """
+    try:
+        stream.seek(0)
+        head = stream.read(12)
+        if len(head) < 8:
+            return None
+        if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+            return _probe_mp4(stream)
+        if int.from_bytes(head[:4], "big") == EBML_HEADER:
+            return _probe_matroska(stream)
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+    return None
+
+
+def _stream_size(stream: BinaryIO) -> int:
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+# ─── MP4 / QuickTime ────────────────────────────────────────────
+
+def _iter_boxes(stream: BinaryIO, start: int, end: int):
+    """Yield (type, payload_offset, payload_size) for boxes in [start, end)."""
+    pos = start
+    while pos + 8 <= end:
+        stream.seek(pos)
+        header = stream.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", stream.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            return
+        yield box_type, pos + header_size, size - header_size
+        pos += size
+
+
+def _probe_mp4(stream: BinaryIO) -> Optional[Dict]:
+    end = _stream_size(stream)
+    container = "mp4"
+    for box_type, offset, size in _iter_boxes(stream, 0, end):
+        if box_type == b"ftyp" and _read_box(stream, offset, min(size, 4)) == b"qt  ":
+            container = "mov"
+        elif box_type == b"moov":
+            if offset + size > end:
+                # moov not fully available yet (partial upload)
+                return None
+            return _parse_moov(stream, offset, size, container)
+    return None
+
+
+def _parse_moov(stream: BinaryIO, offset: int, size: int, container: str) -> Optional[Dict]:
+    duration = None
+    video = None
+
+    for box_type, child_offset, child_size in _iter_boxes(stream, offset, offset + size):
+        if box_type == b"mvhd":
+            duration = _parse_mvhd(stream, child_offset, child_size)
+        elif box_type == b"trak" and video is None:
+            track = _parse_trak(stream, child_offset, child_size)
+            if track is not None:
+                video = track
+
+    if video is None:
+        return None
+    return {
+        "format": container,
+        "width": video["width"],
+        "height": video["height"],
+        "duration": duration,
+        "codec": video["codec"]
+    }
+
+
+def mp4_video_samples(stream: BinaryIO) -> Optional[List[Tuple[int, int]]]:
+    """
+    (offset, size) of every sample (frame) of the first video track of an
+    MP4/QuickTime stream, from its stsz/stsc/stco tables; None if the
+    container can't be parsed.
+    """
+    try:
+        end = _stream_size(stream)
+        for box_type, offset, size in _iter_boxes(stream, 0, end):
+            if box_type != b"moov":
+                continue
+            for child_type, child_offset, child_size in _iter_boxes(stream, offset, offset + size):
+                if child_type != b"trak":
+                    continue
+                track = _parse_trak(stream, child_offset, child_size)
+                if track is not None and track["stbl"] is not None:
+                    return _sample_ranges(stream, *track["stbl"])
+            return None
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+    return None
+
+
+def _read_box(stream: BinaryIO, offset: int, size: int) -> bytes:
+    if size > MAX_METADATA_BYTES:
+        raise ValueError("Metadata box too large")
+    stream.seek(offset)
+    return stream.read(size)
+
+
+def _parse_mvhd(stream: BinaryIO, offset: int, size: int) -> Optional[float]:
+    data = _read_box(stream, offset, min(size, 32))
+    version = data[0]
+    if version == 1:
+        timescale, duration = struct.unpack(">IQ", data[20:32])
+    else:
+        timescale, duration = struct.unpack(">II", data[12:20])
+    return round(duration / timescale, 3) if timescale else None
+
+
+def _parse_trak(stream: BinaryIO, offset: int, size: int) -> Optional[Dict]:
+    """
+    Return {"width", "height", "codec", "stbl"} for a video track, else
+    None. Width/height are display dimensions; "stbl" is the (offset, size)
+    of the sample table box.
+    """
+    dimensions = None
+    is_video = None
+    codec = None
+    stbl = None
+
+    for box_type, child_offset, child_size in _iter_boxes(stream, offset, offset + size):
+        if box_type == b"tkhd":
+            dimensions = _parse_tkhd(stream, child_offset, child_size)
+        elif box_type == b"mdia":
+            for mdia_type, mdia_offset, mdia_size in _iter_boxes(
+                stream, child_offset, child_offset + child_size
+            ):
+                if mdia_type == b"hdlr":
+                    handler = _read_box(stream, mdia_offset, min(mdia_size, 12))[8:12]
+                    is_video = handler == b"vide"
+                elif mdia_type == b"minf":
+                    stbl = _find_box(stream, mdia_offset, mdia_offset + mdia_size, b"stbl")
+
+    if dimensions is None or is_video is False:
+        return None
+    width, height = dimensions
+    if width == 0 or height == 0:
+        return None
+    if stbl is not None:
+        stsd = _find_box(stream, stbl[0], stbl[0] + stbl[1], b"stsd")
+        if stsd is not None and stsd[1] >= 16:
+            # version/flags, entry count, then the first entry's size and format
+            codec = _read_box(stream, stsd[0] + 12, 4).decode("latin-1")
+    return {"width": width, "height": height, "codec": codec, "stbl": stbl}
+
+
+def _find_box(stream: BinaryIO, start: int, end: int, wanted: bytes) -> Optional[Tuple[int, int]]:
+    for box_type, offset, size in _iter_boxes(stream, start, end):
+        if box_type == wanted:
+            return offset, size
+    return None
+
+
+def _sample_ranges(stream: BinaryIO, offset: int, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Resolve sample (offset, size) pairs from a stbl box's stsz/stsc/stco/co64."""
+    tables = {}
+    for box_type, child_offset, child_size in _iter_boxes(stream, offset, offset + size):
+        if box_type in (b"stsz", b"stsc", b"stco", b"co64"):
+            tables[box_type] = _read_box(stream, child_offset, child_size)
+    chunk_table = tables.get(b"stco") or tables.get(b"co64")
+    if b"stsz" not in tables or b"stsc" not in tables or chunk_table is None:
+        return None
+
+    stsz = tables[b"stsz"]
+    fixed_size, sample_count = struct.unpack(">II", stsz[4:12])
+    if fixed_size:
+        sizes = np.full(sample_count, fixed_size, dtype=np.int64)
+    else:
+        sizes = np.frombuffer(stsz, dtype=">u4", count=sample_count, offset=12).astype(np.int64)
+
+    chunk_count = struct.unpack(">I", chunk_table[4:8])[0]
+    dtype = ">u8" if b"stco" not in tables else ">u4"
+    chunk_offsets = np.frombuffer(chunk_table, dtype=dtype, count=chunk_count, offset=8).astype(np.int64)
+
+    # stsc: runs of (first_chunk [1-based], samples_per_chunk, description)
+    stsc = tables[b"stsc"]
+    entry_count = struct.unpack(">I", stsc[4:8])[0]
+    entries = np.frombuffer(stsc, dtype=">u4", count=entry_count * 3, offset=8).reshape(-1, 3)
+    first_chunks = entries[:, 0].astype(np.int64) - 1
+    run_lengths = np.diff(np.append(first_chunks, chunk_count))
+    per_chunk = np.repeat(entries[:, 1].astype(np.int64), run_lengths)
+
+    # Samples are stored back to back inside each chunk
+    chunk_of_sample = np.repeat(np.arange(chunk_count), per_chunk)[:sample_count]
+    if len(chunk_of_sample) < sample_count:
+        return None
+    ends = np.cumsum(sizes)
+    chunk_start_sample = np.concatenate(([0], np.cumsum(per_chunk)[:-1]))
+    first_of_chunk = chunk_start_sample[chunk_of_sample]
+    within_chunk = ends - sizes - (ends[first_of_chunk] - sizes[first_of_chunk])
+    offsets = chunk_offsets[chunk_of_sample] + within_chunk
+    return list(zip(offsets.tolist(), sizes.tolist()))
+
+
+def _parse_tkhd(stream: BinaryIO, offset: int, size: int) -> Optional[Tuple[int, int]]:
+    data = _read_box(stream, offset, min(size, 96))
+    version = data[0]
+    # Version 1 uses 64-bit times, shifting the matrix and size by 12 bytes
+    matrix_end = 88 if version == 1 else 76
+    if len(data) < matrix_end + 8:
+        return None
+
+    matrix = struct.unpack(">9i", data[matrix_end - 36:matrix_end])
+    # Width/height are 16.16 fixed point
+    width = struct.unpack(">I", data[matrix_end:matrix_end + 4])[0] >> 16
+    height = struct.unpack(">I", data[matrix_end + 4:matrix_end + 8])[0] >> 16
+
+    # Phones store portrait video as landscape frames plus a 90°/270° rotation
+    a, b = matrix[0], matrix[1]
+    if a == 0 and b != 0:
+        width, height = height, width
+    return width, height
+
+
+# ─── WebM / Matroska ────────────────────────────────────────────
+
+def _read_vint(stream: BinaryIO, keep_marker: bool) -> Tuple[Optional[int], int]:
+    """Read an EBML variable-length integer. Returns (value, length); value None = unknown size."""
+    first = stream.read(1)
+    if not first:
+        raise ValueError("Unexpected end of stream")
+    first_byte = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first_byte & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("Invalid EBML variable-length integer")
+
+    rest = stream.read(length - 1)
+    if len(rest) < length - 1:
+        raise ValueError("Unexpected end of stream")
+    value = first_byte if keep_marker else first_byte & (mask - 1)
+    for byte in rest:
+        value = (value << 8) | byte
+
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+def _iter_elements(stream: BinaryIO, start: int, end: int):
+    """Yield (id, data_offset, data_size) for EBML elements in [start, end)."""
+    pos = start
+    while pos < end:
+        stream.seek(pos)
+        element_id, id_length = _read_vint(stream, keep_marker=True)
+        size, size_length = _read_vint(stream, keep_marker=False)
+        data_offset = pos + id_length + size_length
+        if size is None:
+            # Unknown size (live streams): extends to the end of the parent
+            size = end - data_offset
+        yield element_id, data_offset, size
+        pos = data_offset + size
+
+
+def _read_uint(stream: BinaryIO, offset: int, size: int) -> int:
+    return int.from_bytes(_read_box(stream, offset, size), "big")
+
+
+def _read_float(stream: BinaryIO, offset: int, size: int) -> Optional[float]:
+    data = _read_box(stream, offset, size)
+    if size == 4:
+        return struct.unpack(">f", data)[0]
+    if size == 8:
+        return struct.unpack(">d", data)[0]
+    return None
+
+
+def _probe_matroska(stream: BinaryIO) -> Optional[Dict]:
+    end = _stream_size(stream)
+    for element_id, offset, size in _iter_elements(stream, 0, end):
+        if element_id == MKV_SEGMENT:
+            return _parse_segment(stream, offset, min(offset + size, end))
+    return None
+
+
+def _parse_segment(stream: BinaryIO, start: int, end: int) -> Optional[Dict]:
+    timecode_scale = 1_000_000  # nanoseconds per tick (Matroska default)
+    raw_duration = None
+    dimensions = None
+
+    for element_id, offset, size in _iter_elements(stream, start, end):
+        if element_id == MKV_INFO:
+            for child_id, child_offset, child_size in _iter_elements(stream, offset, offset + size):
+                if child_id == MKV_TIMECODE_SCALE:
+                    timecode_scale = _read_uint(stream, child_offset, child_size)
+                elif child_id == MKV_DURATION:
+                    raw_duration = _read_float(stream, child_offset, child_size)
+        elif element_id == MKV_TRACKS:
+            dimensions = _parse_tracks(stream, offset, offset + size)
+        elif element_id == MKV_CLUSTER:
+            # Media data starts here; all metadata we need precedes it
+            break
+
+    if dimensions is None:
+        return None
+    duration = None
+    if raw_duration is not None:
+        duration = round(raw_duration * timecode_scale / 1e9, 3)
+    width, height, codec = dimensions
+    return {
+        "format": "webm", "width": width, "height": height,
+        "duration": duration, "codec": codec
+    }
+
+
+def _parse_tracks(stream: BinaryIO, start: int, end: int) -> Optional[Tuple[int, int, Optional[str]]]:
+    for element_id, offset, size in _iter_elements(stream, start, end):
+        if element_id != MKV_TRACK_ENTRY:
+            continue
+
+        track_type = None
+        width = height = None
+        codec = None
+        for child_id, child_offset, child_size in _iter_elements(stream, offset, offset + size):
+            if child_id == MKV_TRACK_TYPE:
+                track_type = _read_uint(stream, child_offset, child_size)
+            elif child_id == MKV_CODEC_ID:
+                codec = _read_box(stream, child_offset, child_size).decode("latin-1").rstrip("\x00")
+            elif child_id == MKV_VIDEO:
+                for video_id, video_offset, video_size in _iter_elements(
+                    stream, child_offset, child_offset + child_size
+                ):
+                    if video_id == MKV_PIXEL_WIDTH:
+                        width = _read_uint(stream, video_offset, video_size)
+                    elif video_id == MKV_PIXEL_HEIGHT:
+                        height = _read_uint(stream, video_offset, video_size)
+
+        if track_type == MKV_TRACK_TYPE_VIDEO and width and height:
+            return width, height, codec
+    return None
@@ -0,0 +1,291 @@
+"""
+EngagePredict - Streaming Media Uploads
+Reads a multipart/form-data upload chunk by chunk instead of buffering it.
+
+The "file" part is spooled to a SpooledTemporaryFile (in memory up to
+SPOOL_MEMORY_BYTES, then on disk) under a per-request byte budget. The
+format is sniffed from the magic bytes and the partial file is probed as it
+grows; once the metadata is parsed the rest of the body is discarded
+without being stored. Probes are awaited, so the caller can run them (they
+seek through a possibly disk-backed file) off the event loop.
+"""
+
+import os
+import tempfile
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from media_probe import IMAGE_PROBE_BYTES, sniff_media_type
+
+
+# Same limit as the backend's multer memoryStorage
+MEDIA_MAX_BYTES = int(os.getenv("ML_MEDIA_MAX_BYTES", str(50 * 1024 * 1024)))
+# Uploads larger than this spill from memory to a temp file
+SPOOL_MEMORY_BYTES = 1024 * 1024
+# /analyze-media/batch limits
+MEDIA_BATCH_MAX_FILES = int(os.getenv("ML_MEDIA_BATCH_MAX_FILES", "20"))
+MEDIA_BATCH_MAX_BYTES = int(os.getenv("ML_MEDIA_BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+# Bytes needed before the format can be sniffed
+SNIFF_BYTES = 16
+
+
+class UploadError(Exception):
+    """Malformed or incomplete multipart upload."""
+
+
+class UploadTooLarge(UploadError):
+    def __init__(self, max_bytes: int, message: Optional[str] = None):
+        super().__init__(message or f"Upload exceeds the {max_bytes} byte limit")
+        self.max_bytes = max_bytes
+
+
+class StreamedMedia:
+    """The file part of an upload, spooled as it arrives."""
+
+    def __init__(self, filename: Optional[str], declared_type: Optional[str],
+                 max_bytes: Optional[int] = None):
+        self.filename = filename
+        self.declared_type = declared_type
+        self.max_bytes = max_bytes
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+        self.size = 0
+        self.header = b""
+        self.media_type: Optional[str] = None
+        self.complete = False
+        self.metrics: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+    def write(self, data: bytes):
+        if self.error is not None:
+            return
+        if self.max_bytes is not None and self.size + len(data) > self.max_bytes:
+            self.error = f"File exceeds the {self.max_bytes} byte limit"
+            self.file.truncate(0)
+            return
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(data)
+        self.size += len(data)
+        if len(self.header) < SNIFF_BYTES:
+            self.header += data[:SNIFF_BYTES - len(self.header)]
+            self.media_type = sniff_media_type(self.header)
+
+    def read_all(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+
+class MultipartMediaReader:
+    """
+    Incremental multipart/form-data parser that keeps the parts of one file
+    field (the first `max_files` of them).
+
+    Other fields are skipped; bytes are counted against `max_bytes` from the
+    start of the body so a client cannot bypass the budget with extra parts.
+    Files over `max_file_bytes` are dropped and flagged with an error.
+    """
+
+    def __init__(self, content_type: Optional[str], field_name: str = "file",
+                 max_bytes: int = MEDIA_MAX_BYTES, max_files: int = 1,
+                 max_file_bytes: Optional[int] = None):
+        mime, params = parse_options_header(content_type or "")
+        boundary = params.get(b"boundary")
+        if mime != b"multipart/form-data" or not boundary:
+            raise UploadError("Expected a multipart/form-data body")
+
+        self.field_name = field_name
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.received = 0
+        self.files: List[StreamedMedia] = []
+        self.too_many_files = False
+        self.finished = False
+
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._target: Optional[StreamedMedia] = None
+
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_end": self._on_end,
+        })
+
+    @property
+    def media(self) -> Optional[StreamedMedia]:
+        return self.files[0] if self.files else None
+
+    def close(self):
+        for media in self.files:
+            media.close()
+
+    def feed(self, chunk: bytes):
+        self.received += len(chunk)
+        if self.received > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self._parser.write(chunk)
+
+    # ─── Parser callbacks ───────────────────────────────────────
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        if name != self.field_name:
+            return
+        if len(self.files) >= self.max_files:
+            self.too_many_files = True
+            return
+        filename = options.get(b"filename")
+        declared = self._headers.get(b"content-type")
+        self._target = StreamedMedia(
+            filename.decode("utf-8", "replace") if filename else None,
+            declared.decode("latin-1") if declared else None,
+            self.max_file_bytes
+        )
+        self.files.append(self._target)
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._target is not None:
+            self._target.write(data[start:end])
+
+    def _on_part_end(self):
+        if self._target is not None:
+            self._target.complete = True
+            self._target = None
+
+    def _on_end(self):
+        self.finished = True
+
+
+async def read_media_upload(
+    content_type: Optional[str],
+    chunks: AsyncIterator[bytes],
+    probe: Callable[[StreamedMedia], Awaitable[Optional[Dict]]],
+    max_bytes: int = MEDIA_MAX_BYTES
+):
+    """
+    Stream an upload until `probe` returns metrics or the file part ends.
+
+    `probe` is awaited with the partial file at IMAGE_PROBE_BYTES and then
+    each time the received size doubles, so a file is re-parsed only
+    O(log n) times. Returns (media, metrics); metrics is None when the
+    format is unknown (media.media_type is None) or the whole file was
+    received without the probe succeeding, in which case the caller runs a
+    full analysis on `media`.
+
+    Once metrics are found the remaining body is read and dropped (so the
+    client sees a normal response rather than a reset connection), still
+    subject to `max_bytes`.
+    """
+    reader = MultipartMediaReader(content_type, max_bytes=max_bytes)
+    next_probe = IMAGE_PROBE_BYTES
+    metrics = None
+    done = False
+
+    try:
+        async for chunk in chunks:
+            if done:
+                # Drain only
+                reader.received += len(chunk)
+                if reader.received > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                continue
+
+            reader.feed(chunk)
+            media = reader.media
+            if media is None or (media.size < SNIFF_BYTES and not media.complete):
+                continue
+            if media.media_type is None:
+                # Unknown magic bytes: nothing to probe for
+                done = True
+            elif media.complete or media.size >= next_probe:
+                metrics = await probe(media)
+                next_probe = media.size * 2
+                done = metrics is not None or media.complete
+            if metrics is not None or media.media_type is None:
+                # Free the spooled bytes now rather than after draining
+                media.file.truncate(0)
+    except BaseException:
+        reader.close()
+        raise
+
+    if reader.media is None:
+        raise UploadError("No 'file' field in upload")
+    if not done:
+        reader.media.close()
+        raise UploadError("Upload ended before the file was complete")
+    return reader.media, metrics
+
+
+async def read_media_batch(
+    content_type: Optional[str],
+    chunks: AsyncIterator[bytes],
+    probe: Callable[[StreamedMedia], Awaitable[Optional[Dict]]],
+    max_files: int = MEDIA_BATCH_MAX_FILES,
+    max_bytes: int = MEDIA_BATCH_MAX_BYTES
+) -> List[StreamedMedia]:
+    """
+    Stream a multi-file upload (repeated "files" fields), in request order.
+
+    Each file is probed once it is complete; files whose header/container
+    metadata parsed get `metrics` set and their spooled bytes freed, the
+    rest keep their bytes for a full analysis. Oversized files get `error`
+    set instead of failing the whole batch.
+    """
+    reader = MultipartMediaReader(
+        content_type, field_name="files", max_bytes=max_bytes,
+        max_files=max_files, max_file_bytes=MEDIA_MAX_BYTES
+    )
+    probed = 0
+
+    try:
+        async for chunk in chunks:
+            reader.feed(chunk)
+            if reader.too_many_files:
+                raise UploadTooLarge(max_bytes, f"Batch exceeds the {max_files} file limit")
+            # Files complete in request order
+            while probed < len(reader.files) and reader.files[probed].complete:
+                media = reader.files[probed]
+                if media.error is None and media.media_type is not None:
+                    media.metrics = await probe(media)
+                if media.metrics is not None or media.media_type is None:
+                    media.file.truncate(0)
+                probed += 1
+    except BaseException:
+        reader.close()
+        raise
+
+    if not reader.files:
+        reader.close()
+        raise UploadError("No 'files' fields in upload")
+    if probed < len(reader.files):
+        reader.close()
+        raise UploadError("Upload ended before all files were complete")
+    return reader.files
@@ -0,0 +1,204 @@
+"""
+EngagePredict - Service Metrics
+Minimal Prometheus-style counters and histograms, rendered in the text
+exposition format on /metrics.
+
+Also provides sampled, structured (JSON) prediction logging to replace
+per-request print() calls on the hot path.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+# Latency buckets in seconds (50µs .. 10s)
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, series):
+                    cumulative += bucket_count
+                    label_str = _format_labels(self.label_names, labels, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+                label_str = _format_labels(self.label_names, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{label_str} {int(series[-1])}")
+                label_str = _format_labels(self.label_names, labels)
+                lines.append(f"{self.name}_sum{label_str} {series[-2]}")
+                lines.append(f"{self.name}_count{label_str} {int(series[-1])}")
+        return lines
+
+
+class Gauge:
+    """Value computed at scrape time by a callback returning {labels: value}."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str],
+        collect: Callable[[], Dict[Tuple, float]]
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        # Re-registering (e.g. module reload) returns the existing metric
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str],
+              collect: Callable[[], Dict[Tuple, float]]) -> Gauge:
+        self._metrics[name] = Gauge(name, help_text, label_names, collect)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "engagepredict_stage_seconds",
+    "Latency of each prediction pipeline stage",
+    ["stage"]
+)
+PREDICTIONS_TOTAL = REGISTRY.counter(
+    "engagepredict_predictions_total",
+    "Posts scored, by platform and scoring path (model, cache, fallback)",
+    ["platform", "path"]
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "engagepredict_http_request_seconds",
+    "End-to-end HTTP request latency",
+    ["method", "route", "status"]
+)
+MEDIA_ANALYSIS_SECONDS = REGISTRY.histogram(
+    "engagepredict_media_analysis_seconds",
+    "Time spent analyzing uploaded media",
+    ["media_type"]
+)
+
+
+# ─── Sampled structured logging ─────────────────────────────────
+
+prediction_logger = logging.getLogger("engagepredict.predictions")
+if not prediction_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    prediction_logger.addHandler(_handler)
+    prediction_logger.setLevel(logging.INFO)
+    prediction_logger.propagate = False
+
+PREDICTION_LOG_SAMPLE_RATE = float(os.getenv("ML_PREDICTION_LOG_SAMPLE_RATE", "0.01"))
+
+
+def log_prediction(event: Dict):
+    """Emit one JSON log line for a sampled fraction of predictions."""
+    if PREDICTION_LOG_SAMPLE_RATE <= 0 or random.random() >= PREDICTION_LOG_SAMPLE_RATE:
+        return
+    prediction_logger.info(json.dumps(event, default=str))
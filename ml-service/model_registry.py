@@ -0,0 +1,239 @@
+"""
+EngagePredict - Model Registry
+Versioned artifact sets for zero-downtime model reloads.
+
+Layout (under ml-service/models/registry/):
+    registry.json                 {"active": <version>, "versions": {...}}
+    versions/<version>/arrays/    compiled ensemble (see artifacts.py)
+    versions/<version>/knn_index/ optional neighbour index (see knn_index.py)
+
+Running services switch versions without a restart: POST /admin/reload,
+or automatically when ML_MODEL_WATCH_SECONDS > 0 (RegistryWatcher).
+
+A version directory mirrors the arrays/ and knn_index/ layout of
+models/, so anything that reads artifacts from a base directory works
+on either. Versions are written to a staging directory and renamed into
+place, and registry.json is replaced atomically, so a reader sees either
+the old or the new active version, never a partial one.
+
+Usage:
+    python model_registry.py list
+    python model_registry.py publish            # snapshot models/arrays (+ knn_index)
+    python model_registry.py activate <version>
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import time
+from typing import Callable, Dict, Optional
+
+from artifacts import ARRAYS_DIRNAME, has_arrays
+from knn_index import INDEX_DIRNAME, has_index
+
+
+REGISTRY_DIRNAME = "registry"
+REGISTRY_FILE = "registry.json"
+VERSIONS_DIRNAME = "versions"
+
+
+class ModelRegistry:
+    """Versioned artifact directories plus a pointer to the active one."""
+
+    def __init__(self, models_dir: str, keep: Optional[int] = None):
+        self.root = os.path.join(models_dir, REGISTRY_DIRNAME)
+        self.models_dir = models_dir
+        # Versions kept after a publish (the active version is never pruned)
+        self.keep = keep if keep is not None else int(os.getenv("ML_MODEL_REGISTRY_KEEP", "5"))
+
+    @property
+    def registry_path(self) -> str:
+        return os.path.join(self.root, REGISTRY_FILE)
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.registry_path)
+
+    def read(self) -> Dict:
+        if not self.exists():
+            return {"active": None, "versions": {}}
+        with open(self.registry_path) as f:
+            return json.load(f)
+
+    def _write(self, registry: Dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.registry_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(registry, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.registry_path)
+
+    def active_version(self) -> Optional[str]:
+        return self.read().get("active")
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.root, VERSIONS_DIRNAME, version)
+
+    def active_dir(self) -> Optional[str]:
+        """Base directory of the active version, if any."""
+        version = self.active_version()
+        return self.version_dir(version) if version else None
+
+    def _new_version_id(self, registry: Dict) -> str:
+        base = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        version, suffix = base, 1
+        while version in registry["versions"] or os.path.exists(self.version_dir(version)):
+            version, suffix = f"{base}-{suffix}", suffix + 1
+        return version
+
+    # ─── Publishing ─────────────────────────────────────────────
+
+    def publish(self, write: Callable[[str], None], metadata: Optional[Dict] = None,
+                activate: bool = True) -> str:
+        """
+        Create a new version. `write(base_dir)` fills a staging directory
+        with arrays/ (required) and knn_index/ (optional).
+        """
+        registry = self.read()
+        version = self._new_version_id(registry)
+        final_dir = self.version_dir(version)
+        staging = f"{final_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        try:
+            write(staging)
+            if not has_arrays(os.path.join(staging, ARRAYS_DIRNAME)):
+                raise ValueError(f"Version {version} has no {ARRAYS_DIRNAME}/ artifacts")
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        os.replace(staging, final_dir)
+
+        registry["versions"][version] = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "parent": registry.get("active"),
+            **(metadata or {})
+        }
+        if activate:
+            registry["active"] = version
+        self._prune(registry)
+        self._write(registry)
+        return version
+
+    def publish_from(self, base_dir: str, metadata: Optional[Dict] = None,
+                     activate: bool = True) -> str:
+        """Snapshot arrays/ (and knn_index/) from `base_dir` as a new version."""
+        def copy(staging: str):
+            shutil.copytree(os.path.join(base_dir, ARRAYS_DIRNAME),
+                            os.path.join(staging, ARRAYS_DIRNAME))
+            if has_index(os.path.join(base_dir, INDEX_DIRNAME)):
+                shutil.copytree(os.path.join(base_dir, INDEX_DIRNAME),
+                                os.path.join(staging, INDEX_DIRNAME))
+
+        return self.publish(copy, metadata, activate)
+
+    def activate(self, version: str):
+        registry = self.read()
+        if version not in registry["versions"]:
+            raise KeyError(f"Unknown model version: {version}")
+        registry["active"] = version
+        self._write(registry)
+
+    def _prune(self, registry: Dict):
+        versions = sorted(registry["versions"], key=lambda v: registry["versions"][v]["created_at"])
+        excess = [v for v in versions[:-self.keep] if v != registry.get("active")] if self.keep > 0 else []
+        for version in excess:
+            # Workers still serving a pruned version keep their mappings (unlinked files stay valid)
+            shutil.rmtree(self.version_dir(version), ignore_errors=True)
+            del registry["versions"][version]
+
+
+class RegistryWatcher:
+    """
+    Polls registry.json and hot-reloads the predictor when the active
+    version changes. `runner` runs the blocking reload off the event loop.
+    A version that fails to load is not retried until it changes again.
+    """
+
+    def __init__(self, predictor, runner: Callable, interval_seconds: float):
+        self.predictor = predictor
+        self.runner = runner
+        self.interval = interval_seconds
+        self.failed_version: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                version = self.predictor.registry.active_version()
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Could not read model registry: {e}")
+                continue
+            if (version is None or version == self.predictor.model_version
+                    or version == self.failed_version
+                    or self.predictor.load_state != "loaded"):
+                continue
+            try:
+                await self.runner(self.predictor.reload, version)
+            except Exception as e:
+                self.failed_version = version
+                print(f"[WARN] Hot reload of model version {version} failed: {e}")
+
+
+def artifacts_base_dir(models_dir: str) -> str:
+    """Where serving artifacts live: the active registry version, else models/ itself."""
+    return ModelRegistry(models_dir).active_dir() or models_dir
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage versioned model artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    publish = sub.add_parser("publish", help="Snapshot models/arrays (and knn_index) as a version")
+    publish.add_argument("--no-activate", action="store_true")
+    activate = sub.add_parser("activate")
+    activate.add_argument("version")
+    args = parser.parse_args()
+
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+    registry = ModelRegistry(models_dir)
+
+    if args.command == "list":
+        state = registry.read()
+        for version, info in sorted(state["versions"].items()):
+            marker = "*" if version == state["active"] else " "
+            print(f"{marker} {version}  {info.get('source', '')}  parent={info.get('parent')}")
+    elif args.command == "publish":
+        if not has_arrays(os.path.join(models_dir, ARRAYS_DIRNAME)):
+            raise SystemExit("No models/arrays to publish. Run 'python train_models.py' first.")
+        version = registry.publish_from(models_dir, {"source": "snapshot"},
+                                        activate=not args.no_activate)
+        print(f"[SAVED] version {version}")
+    elif args.command == "activate":
+        try:
+            registry.activate(args.version)
+        except KeyError as e:
+            raise SystemExit(str(e))
+        print(f"[OK] active version {args.version}")
+
+
+if __name__ == "__main__":
+    main()
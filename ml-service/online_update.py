@@ -0,0 +1,355 @@
+"""
+EngagePredict - Incremental Model Updates
+Folds newly labelled predictions into the compiled ensemble without a
+full retrain, and publishes the result as a new artifact version.
+
+Usage:
+    python online_update.py feedback.jsonl
+    python online_update.py feedback.jsonl --batch-size 2048 --learning-rate 0.005
+    python online_update.py feedback.csv --label-field label --dry-run
+
+Input is the /predict request fields plus an observed label column
+(default actualEngagementLevel, one of the model classes), e.g. the
+Firestore `predictions` collection exported as JSONL with the measured
+engagement added. Rows without a known label are skipped.
+
+Per mini-batch:
+- the scaler mean/variance absorb the batch (running, like partial_fit)
+- the logistic regression member takes multinomial SGD steps
+- the rows are queued for the KNN member
+
+The random forest is not refit, and it and the KNN member stay in the
+scaled space they were trained in (new KNN rows are scaled the same way).
+The running scaler only conditions the LR's SGD steps; its coefficients
+are folded back into the ensemble's space, so the scaler update on its
+own leaves predictions unchanged (RF and KNN bit for bit). The running
+mean/variance are saved in the manifest for the next update. The result
+is published as a new model registry version (see model_registry.py),
+with its KNN index when the base version has one; the pickles keep the
+last full training run.
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from artifacts import ARRAYS_DIRNAME, export_arrays, has_arrays, load_arrays
+from compiled_ensemble import CompiledEnsemble
+from knn_index import (
+    INDEX_DIRNAME, BruteForceIndex, IVFIndex, TreeIndex, evaluate_index, has_index,
+    load_index, sample_queries, save_index
+)
+from model_registry import ModelRegistry
+
+
+DEFAULT_LABEL_FIELD = "actualEngagementLevel"
+
+
+def _nonzero_scale(var: np.ndarray) -> np.ndarray:
+    """StandardScaler's scale_: sqrt(var), with zero variance mapped to 1."""
+    scale = np.sqrt(var)
+    scale[scale == 0] = 1.0
+    return scale
+
+
+class OnlineUpdater:
+    """
+    Incremental updates on a CompiledEnsemble.
+
+    The ensemble's scaler (the base space) is never changed: RF thresholds
+    and KNN rows keep meaning what they meant at training time. Only the LR
+    coefficients follow the running scaler while batches stream in;
+    `finalize` folds them back into the base space.
+    """
+
+    def __init__(
+        self,
+        ensemble: CompiledEnsemble,
+        classes,
+        scaler_n_samples: int,
+        running_scaler: Optional[Dict] = None,
+        knn_index=None,
+        learning_rate: float = 0.01,
+        alpha: float = 1e-4,
+        epochs: int = 1,
+        append_knn: bool = True
+    ):
+        self.ensemble = ensemble
+        self.classes = [str(c) for c in classes]
+        self.class_index = {name: i for i, name in enumerate(self.classes)}
+        self.knn_index = knn_index
+        self.learning_rate = learning_rate
+        self.alpha = alpha
+        self.epochs = epochs
+        self.append_knn = append_knn
+
+        # Base space of the RF/KNN members
+        self.base_mean = np.array(ensemble.mean, dtype=np.float64)
+        self.base_scale = np.array(ensemble.scale, dtype=np.float64)
+
+        # Running scaler statistics ({"mean", "var"} saved by a previous update)
+        self.n_samples = int(scaler_n_samples)
+        if running_scaler:
+            self.mean = np.array(running_scaler["mean"], dtype=np.float64)
+            self.var = np.array(running_scaler["var"], dtype=np.float64)
+        else:
+            self.mean = self.base_mean.copy()
+            self.var = self.base_scale ** 2
+
+        self.lr_supported = not (ensemble.lr_binary or ensemble.lr_ovr)
+        # LR member re-expressed in the running space
+        a, c = self._base_to_running()
+        self.lr_coef_t = np.array(ensemble.lr_coef_t, dtype=np.float64) / a[:, np.newaxis]
+        self.lr_intercept = np.array(ensemble.lr_intercept, dtype=np.float64) - c @ self.lr_coef_t
+
+        self.pending_features: List[np.ndarray] = []
+        self.pending_labels: List[np.ndarray] = []
+        self.rows_seen = 0
+        self.rows_correct = 0
+        self.batches = 0
+
+    # ─── Mini-batches ───────────────────────────────────────────
+
+    def encode_labels(self, labels) -> np.ndarray:
+        """Class indices for `labels`; -1 where the label is missing or unknown."""
+        return np.array([self.class_index.get(str(label), -1) for label in labels], dtype=np.int64)
+
+    def partial_fit(self, features: np.ndarray, y: np.ndarray):
+        """Absorb one mini-batch of raw N×14 features with class indices `y`."""
+        if len(y) == 0:
+            return
+        features = np.asarray(features, dtype=np.float64)
+
+        # Prequential accuracy: score each batch before learning from it
+        predicted = np.argmax(self.predict_proba(features), axis=1)
+        self.rows_correct += int(np.sum(predicted == y))
+        self.rows_seen += len(y)
+        self.batches += 1
+
+        self._update_scaler(features)
+        if self.lr_supported:
+            scaled = (features - self.mean) / _nonzero_scale(self.var)
+            for _ in range(self.epochs):
+                self._sgd_step(scaled, y)
+        if self.append_knn:
+            self.pending_features.append(features)
+            self.pending_labels.append(y)
+
+    def _base_to_running(self):
+        """(a, c) with z_running = z_base * a + c, per feature."""
+        scale = _nonzero_scale(self.var)
+        return self.base_scale / scale, (self.base_mean - self.mean) / scale
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Ensemble probabilities with the updated LR member."""
+        ensemble = self.ensemble
+        scaled = (features - self.mean) / _nonzero_scale(self.var)
+        base_scaled = (features - self.base_mean) / self.base_scale
+
+        logits = scaled @ self.lr_coef_t + self.lr_intercept
+        if self.lr_supported:
+            logits -= logits.max(axis=1, keepdims=True)
+            lr_proba = np.exp(logits)
+            lr_proba /= lr_proba.sum(axis=1, keepdims=True)
+        else:
+            lr_proba = ensemble._lr_proba(base_scaled)
+
+        lr_w, rf_w, knn_w = ensemble.weights
+        return (
+            lr_w * lr_proba
+            + rf_w * ensemble._rf_proba(base_scaled)
+            + knn_w * ensemble._knn_proba(base_scaled)
+        )
+
+    def _update_scaler(self, features: np.ndarray):
+        """Chan et al. parallel mean/variance update, then re-express the LR member."""
+        batch_n = features.shape[0]
+        batch_mean = features.mean(axis=0)
+        batch_var = features.var(axis=0)
+
+        total = self.n_samples + batch_n
+        delta = batch_mean - self.mean
+        mean = self.mean + delta * batch_n / total
+        var = (
+            self.var * self.n_samples + batch_var * batch_n
+            + delta ** 2 * self.n_samples * batch_n / total
+        ) / total
+
+        # z_old = (z_new - c) / a for z_new = z_old * a + c
+        old_scale, new_scale = _nonzero_scale(self.var), _nonzero_scale(var)
+        a = old_scale / new_scale
+        c = (self.mean - mean) / new_scale
+        self.lr_intercept = self.lr_intercept - (c / a) @ self.lr_coef_t
+        self.lr_coef_t = self.lr_coef_t / a[:, np.newaxis]
+
+        self.n_samples, self.mean, self.var = total, mean, var
+
+    def _sgd_step(self, scaled: np.ndarray, y: np.ndarray):
+        """One multinomial logistic-loss SGD step with L2 penalty `alpha`."""
+        logits = scaled @ self.lr_coef_t + self.lr_intercept
+        logits -= logits.max(axis=1, keepdims=True)
+        proba = np.exp(logits)
+        proba /= proba.sum(axis=1, keepdims=True)
+        proba[np.arange(len(y)), y] -= 1.0
+
+        grad_coef = scaled.T @ proba / len(y) + self.alpha * self.lr_coef_t
+        grad_intercept = proba.mean(axis=0)
+        self.lr_coef_t -= self.learning_rate * grad_coef
+        self.lr_intercept -= self.learning_rate * grad_intercept
+
+    # ─── Finalize ───────────────────────────────────────────────
+
+    def finalize(self) -> CompiledEnsemble:
+        """Fold the LR member into the base space and append queued KNN rows."""
+        ensemble = self.ensemble
+        # logits = (z_base * a + c) @ W + b
+        a, c = self._base_to_running()
+        ensemble.lr_coef_t = np.ascontiguousarray(self.lr_coef_t * a[:, np.newaxis])
+        ensemble.lr_intercept = c @ self.lr_coef_t + self.lr_intercept
+
+        if not self.pending_features:
+            return ensemble
+        new_rows = ((np.vstack(self.pending_features) - self.base_mean) / self.base_scale).astype(np.float32)
+        fit_x = np.vstack([ensemble.knn_fit_x, new_rows])
+        ensemble.knn_fit_x = fit_x
+        ensemble.knn_fit_sq = np.einsum("ij,ij->i", fit_x, fit_x)
+        ensemble.knn_y = np.concatenate([np.asarray(ensemble.knn_y), *self.pending_labels])
+        self.pending_features, self.pending_labels = [], []
+
+        index = self.knn_index
+        if isinstance(index, IVFIndex):
+            index = index.appended(new_rows, fit_x)
+        elif isinstance(index, TreeIndex):
+            # sklearn trees don't support insertion; rebuild over the new rows
+            index = TreeIndex.build(fit_x, index.kind, index.params()["leaf_size"])
+        self.knn_index = index
+        ensemble.knn_index = index or BruteForceIndex(fit_x, ensemble.knn_fit_sq)
+        return ensemble
+
+    def running_scaler(self) -> Dict:
+        return {"mean": self.mean.tolist(), "var": self.var.tolist()}
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows_seen,
+            "prequential_accuracy": round(self.rows_correct / self.rows_seen, 4) if self.rows_seen else None,
+            "scaler_n_samples": self.n_samples,
+            "knn_rows": int(self.ensemble.knn_fit_x.shape[0]),
+            "lr_updated": self.lr_supported
+        }
+
+
+# ─── Driver ─────────────────────────────────────────────────────
+
+def publish(updater: OnlineUpdater, registry: ModelRegistry) -> str:
+    """Write the updated ensemble (and KNN index) as a new registry version."""
+    ensemble = updater.finalize()
+    stats = updater.stats()
+
+    def write(base_dir: str):
+        export_arrays(
+            ensemble, os.path.join(base_dir, ARRAYS_DIRNAME), updater.classes,
+            extra={"scaler_n_samples": stats["scaler_n_samples"],
+                   "running_scaler": updater.running_scaler(), "online_update": stats}
+        )
+        if updater.knn_index is not None:
+            fit_x = ensemble.knn_fit_x
+            report = evaluate_index(
+                updater.knn_index, BruteForceIndex(fit_x, ensemble.knn_fit_sq),
+                sample_queries(fit_x, 1000), ensemble.knn_k
+            )
+            save_index(updater.knn_index, os.path.join(base_dir, INDEX_DIRNAME), fit_x, report)
+
+    version = registry.publish(write, {"source": "online_update", "rows": stats["rows"]})
+    print(f"[SAVED] registry version {version}")
+    return version
+
+
+def run(args) -> Dict:
+    from bulk_score import file_format, read_chunks
+    from inference import EngagementPredictor
+
+    # Only the feature pipeline is needed; the artifacts are opened directly
+    predictor = EngagementPredictor(lazy=True)
+    registry = ModelRegistry(args.models_dir or predictor.models_dir)
+    # Start from the active version (or the working copy before the first publish)
+    base_dir = registry.active_dir() or registry.models_dir
+    arrays_dir = os.path.join(base_dir, ARRAYS_DIRNAME)
+    if not has_arrays(arrays_dir):
+        raise SystemExit(f"No model arrays in {arrays_dir}; run 'python train_models.py' first")
+
+    ensemble, manifest = load_arrays(arrays_dir, predictor.weights, mmap=False)
+    index_dir = os.path.join(base_dir, INDEX_DIRNAME)
+    knn_index = (
+        load_index(index_dir, ensemble.knn_fit_x, mmap=False) if has_index(index_dir) else None
+    )
+
+    updater = OnlineUpdater(
+        ensemble,
+        manifest["classes"],
+        # The base scaler was fitted on the same rows as the KNN member
+        manifest.get("scaler_n_samples") or ensemble.knn_fit_x.shape[0],
+        running_scaler=manifest.get("running_scaler"),
+        knn_index=knn_index,
+        learning_rate=args.learning_rate,
+        alpha=args.alpha,
+        epochs=args.epochs,
+        append_knn=not args.no_knn_append
+    )
+    if not updater.lr_supported:
+        print("[WARN] LR member is not multinomial; only the scaler and KNN are updated",
+              file=sys.stderr)
+
+    skipped = 0
+    for chunk in read_chunks(args.input, file_format(args.input, args.input_format), args.batch_size):
+        if args.label_field not in chunk.columns:
+            raise SystemExit(f"Input has no {args.label_field!r} column")
+        y = updater.encode_labels(chunk[args.label_field])
+        known = y >= 0
+        skipped += int(np.sum(~known))
+        if not known.any():
+            continue
+        features = predictor.extract_features_batch(chunk[known])
+        updater.partial_fit(features, y[known])
+        print(f"batch {updater.batches}: {updater.rows_seen:,} rows", file=sys.stderr, flush=True)
+
+    summary = dict(updater.stats(), skipped_rows=skipped)
+    if updater.rows_seen == 0:
+        print("[WARN] No labelled rows; nothing to publish", file=sys.stderr)
+    elif args.dry_run:
+        updater.finalize()
+        summary["knn_rows"] = int(updater.ensemble.knn_fit_x.shape[0])
+    else:
+        summary["version"] = publish(updater, registry)
+    print(json.dumps(summary), file=sys.stderr)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Incrementally update the ensemble from labelled posts")
+    parser.add_argument("input", help="CSV, JSONL or Parquet file of labelled posts")
+    parser.add_argument("--input-format", choices=["csv", "jsonl", "parquet"])
+    parser.add_argument("--label-field", default=DEFAULT_LABEL_FIELD)
+    parser.add_argument("--batch-size", type=int, default=1024, help="Rows per mini-batch")
+    parser.add_argument("--learning-rate", type=float, default=0.01)
+    parser.add_argument("--alpha", type=float, default=1e-4, help="L2 penalty for the LR member")
+    parser.add_argument("--epochs", type=int, default=1, help="SGD passes per mini-batch")
+    parser.add_argument("--no-knn-append", action="store_true",
+                        help="Don't add the new rows to the KNN member")
+    parser.add_argument("--models-dir", help="Default: ml-service/models")
+    parser.add_argument("--dry-run", action="store_true", help="Update in memory, don't publish")
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size must be positive")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+EngagePredict - Parsed Post
+Single-pass parse of a prediction request, shared by feature extraction,
+feedback, fallback scoring and recommendations.
+"""
+
+import re
+from typing import Dict, Optional
+
+import numpy as np
+
+
+# Precompiled patterns (previously recompiled/re-run by every consumer)
+HASHTAG_PATTERN = re.compile(r'#\w+')
+EMOJI_PATTERN = re.compile(r'[\U0001F600-\U0001F9FF]')
+CTA_PATTERN = re.compile(r'comment|share|like|follow|click|link|tag|save|check')
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+DAY_INDEX = {day: i for i, day in enumerate(DAYS)}
+
+
+class PlatformTables:
+    """
+    Lookup tables built once from EngagementPredictor.platform_config.
+
+    Platforms are interned to row indices (in config order, which matches
+    the model's platform encoding); peak hours and best days become
+    platforms×24 and platforms×7 boolean tables, so both single posts and
+    batches index arrays instead of scanning lists.
+    """
+
+    def __init__(self, platform_config: Dict[str, Dict], default: str = "instagram"):
+        self.names = tuple(platform_config)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.configs = [platform_config[name] for name in self.names]
+        self.default_index = self.index[default]
+
+        self.peak_hours = np.zeros((len(self.names), 24), dtype=bool)
+        self.best_days = np.zeros((len(self.names), len(DAYS)), dtype=bool)
+        for i, config in enumerate(self.configs):
+            self.peak_hours[i, config["peak_hours"]] = True
+            self.best_days[i, [DAY_INDEX[day] for day in config["best_days"]]] = True
+        # Per-platform maxima used by the ratio features
+        self.max_hashtags = np.array([c["optimal_hashtag_count"][1] for c in self.configs], dtype=float)
+        self.max_caption = np.array([c["optimal_caption_length"][1] for c in self.configs], dtype=float)
+        self.preferred_orientation = np.array([c["preferred_orientation"] for c in self.configs])
+
+    def platform_index(self, platform: str) -> int:
+        """Row for a platform; unknown platforms use the default's config."""
+        return self.index.get(platform, self.default_index)
+
+    def is_peak(self, platform_index: int, hour: int) -> bool:
+        return 0 <= hour < 24 and bool(self.peak_hours[platform_index, hour])
+
+    def is_best_day(self, platform_index: int, day_index: int) -> bool:
+        return day_index >= 0 and bool(self.best_days[platform_index, day_index])
+
+
+class ParsedPost:
+    """
+    Raw request fields plus everything derived from them, computed once.
+    """
+
+    __slots__ = (
+        "caption", "hashtags", "platform", "posting_time", "day_of_week",
+        "media_info", "config", "platform_index", "day_index", "caption_length",
+        "hashtag_count", "hashtag_word_count", "hour", "is_peak", "is_best_day",
+        "has_cta", "has_emoji"
+    )
+
+    def __init__(
+        self,
+        caption: str,
+        hashtags: str,
+        platform: str,
+        posting_time: str,
+        day_of_week: str,
+        media_info: Optional[Dict],
+        tables: PlatformTables
+    ):
+        self.caption = caption
+        self.hashtags = hashtags
+        self.platform = platform
+        self.posting_time = posting_time
+        self.day_of_week = day_of_week
+        self.media_info = media_info
+        self.platform_index = tables.platform_index(platform)
+        self.config = tables.configs[self.platform_index]
+        self.day_index = DAY_INDEX.get(day_of_week, -1)
+
+        self.caption_length = len(caption)
+        self.hashtag_count = len(HASHTAG_PATTERN.findall(hashtags))
+        # Whitespace-separated tokens, as counted for recommendations
+        self.hashtag_word_count = len(hashtags.split()) if hashtags else 0
+
+        self.hour = self.parse_hour(posting_time)
+        self.is_peak = tables.is_peak(self.platform_index, self.hour)
+        self.is_best_day = tables.is_best_day(self.platform_index, self.day_index)
+
+        self.has_cta = 1 if CTA_PATTERN.search(caption.lower()) else 0
+        self.has_emoji = 1 if EMOJI_PATTERN.search(caption) else 0
+
+    @staticmethod
+    def parse_hour(posting_time: str) -> int:
+        """Hour of an "HH:MM" time, 12 if it can't be parsed."""
+        try:
+            return int(posting_time.split(':')[0])
+        except (ValueError, IndexError):
+            return 12
@@ -0,0 +1,104 @@
+"""
+EngagePredict - Prediction Cache
+In-process LRU/TTL cache in front of the model ensemble.
+
+Keys are the quantized 14-feature vector, so posts that differ only in
+cosmetic edits (same lengths, hashtag count, timing and media) share an
+entry and skip the scaler and all 3 predict_proba calls.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+# Decimal places kept for the ratio features when building a key
+KEY_DECIMALS = 4
+
+
+def feature_key(features: np.ndarray) -> Tuple:
+    """Quantize one feature row into a hashable cache key."""
+    return tuple(np.round(np.asarray(features, dtype=np.float64).ravel(), KEY_DECIMALS).tolist())
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with optional time-to-live.
+
+    `max_size=0` disables caching; `ttl_seconds=0` keeps entries until
+    they are evicted by size.
+    """
+
+    def __init__(self, max_size: int = 4096, ttl_seconds: float = 0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable) -> Optional[object]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: object):
+        if not self.enabled:
+            return
+
+        evicted = []
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted_key, (_, evicted_value) = self._entries.popitem(last=False)
+                evicted.append((evicted_key, evicted_value))
+                self.evictions += 1
+        if evicted:
+            self._on_evict(evicted)
+
+    def _on_evict(self, entries):
+        """Hook for subclasses; called outside the lock with (key, value) pairs."""
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -165,7 +165,8 @@ class RecommendationEngine:
             tier = "low"
         
         # Get platform-specific tips
-        platform_key = platform.lower() if platform.lower() in self.platform_tips else "instagram"
+        platform = platform.lower()
+        platform_key = platform if platform in self.platform_tips else "instagram"
         platform_specific = self.platform_tips[platform_key][tier][:3]
         
         # Get general tips
@@ -195,6 +196,7 @@ class RecommendationEngine:
     ) -> List[str]:
         """
         Generate specific improvement suggestions based on weaknesses
+        (`platform` is already lowercased by generate)
         """
         improvements = []
         
@@ -203,9 +205,9 @@ class RecommendationEngine:
             resolution = media_info.get("resolution", "")
             
             # Orientation improvements
-            if platform.lower() in ["instagram", "tiktok"] and orientation == "Landscape":
+            if platform in ("instagram", "tiktok") and orientation == "Landscape":
                 improvements.append("🔄 Crop to Portrait (9:16) for 40% more reach")
-            elif platform.lower() == "youtube" and orientation == "Portrait":
+            elif platform == "youtube" and orientation == "Portrait":
                 improvements.append("🔄 Use Landscape (16:9) for better viewing experience")
             
             # Resolution improvements
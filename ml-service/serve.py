@@ -0,0 +1,226 @@
+"""
+EngagePredict - Production Server
+Pre-fork multi-worker entry point for the ML service (`python app.py` is
+the single-process development server with auto-reload).
+
+The master process imports the app and loads the models once, then forks
+N uvicorn workers that accept connections on one shared listening socket:
+
+- Model weights are loaded once and shared by every worker. Memory-mapped
+  artifacts (ML_MMAP_ARTIFACTS=1, the default) sit in the page cache once
+  for all workers; objects loaded onto the heap before the fork stay
+  shared copy-on-write (gc.freeze() keeps the collector from writing to
+  their pages).
+- --pin-cpus pins worker i to the i-th CPU this process may run on, and
+  BLAS/OpenMP pools default to one thread per worker.
+- SIGTERM/SIGINT drain the workers: each stops accepting, finishes its
+  in-flight requests (up to --graceful-timeout seconds) and exits; the
+  master kills any worker still running after that. A worker that exits
+  on its own is restarted.
+- SIGHUP reloads the active model registry version in every worker
+  (POST /admin/reload only reaches the worker that receives it).
+
+Usage:
+    python serve.py                                  # one worker per CPU on :8000
+    python serve.py --workers 4 --pin-cpus --port 8080
+    kill -HUP <master pid>                           # hot-reload all workers
+"""
+
+import argparse
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+# Seconds to wait before restarting a worker that exited unexpectedly
+RESTART_DELAY_SECONDS = 1.0
+# Extra time after --graceful-timeout before remaining workers are killed
+KILL_GRACE_SECONDS = 5.0
+# Thread pools that would otherwise start one thread per core in every worker
+NATIVE_THREAD_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
+
+
+def available_cpus() -> Optional[List[int]]:
+    """CPUs this process may run on, or None where affinity is unsupported."""
+    if not hasattr(os, "sched_getaffinity"):
+        return None
+    return sorted(os.sched_getaffinity(0))
+
+
+def default_workers() -> int:
+    cpus = available_cpus()
+    return len(cpus) if cpus else (os.cpu_count() or 1)
+
+
+def preload():
+    """Import the app and load every model in the master, before forking."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as service
+
+    start = time.perf_counter()
+    service.predictor.ensure_loaded()
+    service.user_insights.ensure_loaded()
+    print(f"[OK] Models preloaded in {time.perf_counter() - start:.2f}s "
+          f"({service.predictor.load_source}, version {service.predictor.model_version})")
+    # Move everything allocated so far out of the collector's reach so
+    # workers do not copy shared pages just by scanning them
+    gc.collect()
+    gc.freeze()
+    return service
+
+
+def _reload_in_background(predictor):
+    """SIGHUP handler for workers: reload the active registry version on a thread."""
+    def reload():
+        try:
+            predictor.reload()
+        except Exception as e:
+            print(f"[WARN] Worker {os.getpid()} reload failed: {e}")
+
+    def handler(signum, frame):
+        threading.Thread(target=reload, name="model-reload", daemon=True).start()
+
+    return handler
+
+
+def run_worker(index: int, config, sock, predictor, cpus: Optional[List[int]]):
+    import uvicorn
+
+    # Drop the master's inherited handlers; uvicorn installs its own for SIGINT/SIGTERM
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGHUP, _reload_in_background(predictor))
+    placement = ""
+    if cpus:
+        cpu = cpus[index % len(cpus)]
+        os.sched_setaffinity(0, {cpu})
+        placement = f" on CPU {cpu}"
+    print(f"[OK] Worker {index} (pid {os.getpid()}) started{placement}")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """Forks, restarts and drains the worker processes."""
+
+    def __init__(self, config, sock, predictor, workers: int,
+                 cpus: Optional[List[int]], graceful_timeout: float):
+        self.config = config
+        self.sock = sock
+        self.predictor = predictor
+        self.n_workers = workers
+        self.cpus = cpus
+        self.graceful_timeout = graceful_timeout
+        self.workers: Dict[int, int] = {}  # pid -> worker index
+        self.stopping_since: Optional[float] = None
+
+    def spawn(self, index: int):
+        # Buffered output would otherwise be printed by both processes
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(index, self.config, self.sock, self.predictor, self.cpus)
+            except BaseException as e:
+                print(f"[ERROR] Worker {index} crashed: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.workers[pid] = index
+
+    def signal_workers(self, signum: int):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _on_stop(self, signum, frame):
+        if self.stopping_since is None:
+            print(f"[OK] Draining {len(self.workers)} workers "
+                  f"(up to {self.graceful_timeout:.0f}s)")
+            self.stopping_since = time.monotonic()
+        self.signal_workers(signal.SIGTERM)
+
+    def _on_reload(self, signum, frame):
+        print(f"[OK] Reloading models in {len(self.workers)} workers")
+        self.signal_workers(signal.SIGHUP)
+
+    def run(self):
+        for index in range(self.n_workers):
+            self.spawn(index)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if (self.stopping_since is not None and time.monotonic() - self.stopping_since
+                        > self.graceful_timeout + KILL_GRACE_SECONDS):
+                    print(f"[WARN] Killing {len(self.workers)} workers that did not drain")
+                    self.signal_workers(signal.SIGKILL)
+                    self.stopping_since = time.monotonic()
+                time.sleep(0.1)
+                continue
+
+            index = self.workers.pop(pid, None)
+            if index is None or self.stopping_since is not None:
+                continue
+            print(f"[WARN] Worker {index} (pid {pid}) exited with code "
+                  f"{os.waitstatus_to_exitcode(status)}; restarting")
+            time.sleep(RESTART_DELAY_SECONDS)
+            if self.stopping_since is None:
+                self.spawn(index)
+
+        self.sock.close()
+        print("[OK] All workers stopped")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the ML service with multiple workers")
+    parser.add_argument("--host", default=os.getenv("ML_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ML_PORT", "8000")))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("ML_WORKERS", "0")) or None,
+                        help="Worker processes (default: one per available CPU)")
+    parser.add_argument("--pin-cpus", action="store_true",
+                        default=os.getenv("ML_PIN_CPUS", "0") == "1",
+                        help="Pin each worker to its own CPU")
+    parser.add_argument("--graceful-timeout", type=float,
+                        default=float(os.getenv("ML_GRACEFUL_TIMEOUT", "30")),
+                        help="Seconds a draining worker may spend on in-flight requests")
+    parser.add_argument("--backlog", type=int, default=2048)
+    args = parser.parse_args(argv)
+
+    workers = args.workers or default_workers()
+    # Must happen before NumPy is imported: parallelism comes from the workers
+    for name in NATIVE_THREAD_VARS:
+        os.environ.setdefault(name, "1")
+
+    cpus = available_cpus() if args.pin_cpus else None
+    if args.pin_cpus and cpus is None:
+        print("[WARN] CPU pinning is not supported on this platform")
+    elif cpus is not None and workers > len(cpus):
+        print(f"[WARN] {workers} workers on {len(cpus)} CPUs; some CPUs get several workers")
+
+    import uvicorn
+
+    service = preload()
+    config = uvicorn.Config(
+        service.app, host=args.host, port=args.port, backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout
+    )
+    sock = config.bind_socket()
+    print(f"[OK] Master {os.getpid()} serving on http://{args.host}:{args.port} "
+          f"with {workers} workers")
+    Supervisor(config, sock, service.predictor, workers, cpus, args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Shared fixtures: a small ensemble trained once per session on synthetic
+data, saved as pickles in the layout train_models.py writes to models/.
+"""
+
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from train_models import build_models, prepare_dataset  # noqa: E402
+
+# Pickle names written by train_models.py
+MODEL_FILES = {
+    "Logistic Regression": "logistic_regression.pkl",
+    "Random Forest": "random_forest.pkl",
+    "KNN": "knn.pkl",
+}
+
+
+@pytest.fixture(scope="session")
+def models_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("models")
+    prepared = prepare_dataset(n_samples=1500, seed=7, test_size=0.2)
+    for name, model in build_models().items():
+        if name == "Random Forest":
+            model.set_params(n_estimators=20, n_jobs=1)
+        model.fit(prepared["X_train"], prepared["y_train"])
+        with open(directory / MODEL_FILES[name], "wb") as f:
+            pickle.dump(model, f)
+    for name in ("scaler", "label_encoder"):
+        with open(directory / f"{name}.pkl", "wb") as f:
+            pickle.dump(prepared[name], f)
+    return str(directory)
+
+
+@pytest.fixture(scope="session")
+def sklearn_models(models_dir):
+    """(scaler, lr, rf, knn) as fitted by train_models.py."""
+    def load(name):
+        with open(os.path.join(models_dir, name), "rb") as f:
+            return pickle.load(f)
+
+    return tuple(load(name) for name in (
+        "scaler.pkl", "logistic_regression.pkl", "random_forest.pkl", "knn.pkl"
+    ))
+
+
+@pytest.fixture(scope="session")
+def raw_features(sklearn_models):
+    """Raw N×14 feature rows near the training data, plus exact training rows."""
+    scaler, _, _, knn = sklearn_models
+    rng = np.random.default_rng(3)
+    scaled = knn._fit_X[rng.choice(knn._fit_X.shape[0], 200, replace=False)].copy()
+    scaled[20:] += rng.normal(0.0, 0.1, size=scaled[20:].shape)
+    return scaler.inverse_transform(scaled)
@@ -0,0 +1,154 @@
+"""MicroBatcher: batch formation, per-caller results, errors and shutdown."""
+
+import asyncio
+
+import pytest
+
+from batcher import MicroBatcher
+
+
+class Recorder:
+    """process_batch that doubles each item and records the batches it saw."""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.batches = []
+        self.fail = fail
+        self.delay = delay
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.fail:
+            raise ValueError("model exploded")
+        return [item * 2 for item in items]
+
+    async def run(self, process_batch, items):
+        await asyncio.sleep(self.delay)
+        return process_batch(items)
+
+
+async def started(recorder, **kwargs):
+    batcher = MicroBatcher(recorder, recorder.run, **kwargs)
+    batcher.start()
+    return batcher
+
+
+def test_concurrent_submits_share_a_batch_and_get_their_own_rows():
+    async def main():
+        recorder = Recorder()
+        batcher = await started(recorder, max_batch_size=64, max_wait_ms=50)
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+        await batcher.stop()
+        return recorder, results
+
+    recorder, results = asyncio.run(main())
+    assert results == [i * 2 for i in range(10)]
+    assert recorder.batches == [list(range(10))]
+
+
+def test_full_batches_flush_without_waiting_for_the_window():
+    async def main():
+        recorder = Recorder()
+        batcher = await started(recorder, max_batch_size=4, max_wait_ms=10_000)
+        results = await asyncio.wait_for(
+            asyncio.gather(*[batcher.submit(i) for i in range(8)]), timeout=5
+        )
+        await batcher.stop()
+        return recorder, results
+
+    recorder, results = asyncio.run(main())
+    assert results == [i * 2 for i in range(8)]
+    assert recorder.batches == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+
+def test_window_flushes_a_partial_batch():
+    async def main():
+        recorder = Recorder()
+        batcher = await started(recorder, max_batch_size=64, max_wait_ms=5)
+        first = await batcher.submit(1)
+        second = await asyncio.gather(batcher.submit(2), batcher.submit(3))
+        await batcher.stop()
+        return recorder, first, second
+
+    recorder, first, second = asyncio.run(main())
+    assert (first, second) == (2, [4, 6])
+    assert recorder.batches == [[1], [2, 3]]
+
+
+def test_scoring_error_reaches_every_waiter():
+    async def main():
+        batcher = await started(Recorder(fail=True), max_batch_size=64, max_wait_ms=20)
+        outcomes = await asyncio.gather(*[batcher.submit(i) for i in range(5)],
+                                        return_exceptions=True)
+        await batcher.stop()
+        return outcomes
+
+    outcomes = asyncio.run(main())
+    assert len(outcomes) == 5
+    assert all(isinstance(o, ValueError) and str(o) == "model exploded" for o in outcomes)
+
+
+def test_short_result_list_fails_the_batch():
+    async def main():
+        async def runner(process_batch, items):
+            return process_batch(items)[:-1]
+
+        batcher = MicroBatcher(lambda items: items, runner, max_wait_ms=20)
+        batcher.start()
+        outcomes = await asyncio.gather(*[batcher.submit(i) for i in range(3)],
+                                        return_exceptions=True)
+        await batcher.stop()
+        return outcomes
+
+    outcomes = asyncio.run(main())
+    assert all(isinstance(o, RuntimeError) for o in outcomes)
+
+
+def test_stop_completes_the_batch_being_gathered():
+    async def main():
+        recorder = Recorder()
+        batcher = await started(recorder, max_batch_size=64, max_wait_ms=10_000)
+        waiters = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.05)  # the collector holds all three, waiting for more
+        await asyncio.wait_for(batcher.stop(), timeout=5)
+        return recorder, await asyncio.wait_for(asyncio.gather(*waiters), timeout=5)
+
+    recorder, results = asyncio.run(main())
+    assert results == [0, 2, 4]
+    assert recorder.batches == [[0, 1, 2]]
+
+
+def test_stop_waits_for_dispatched_batches():
+    async def main():
+        batcher = await started(Recorder(delay=0.1), max_batch_size=2, max_wait_ms=1)
+        waiters = [asyncio.ensure_future(batcher.submit(i)) for i in range(2)]
+        await asyncio.sleep(0.02)  # dispatched, still scoring
+        await batcher.stop()
+        return [waiter.result() for waiter in waiters]
+
+    assert asyncio.run(main()) == [0, 2]
+
+
+def test_stop_fails_items_that_never_reached_a_batch():
+    async def main():
+        batcher = await started(Recorder(), max_batch_size=1, max_wait_ms=0)
+        # Queued behind the collector, which is cancelled before it runs again
+        waiters = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        await batcher.stop()
+        return await asyncio.wait_for(
+            asyncio.gather(*waiters, return_exceptions=True), timeout=5
+        )
+
+    outcomes = asyncio.run(main())
+    assert all(o in (0, 2, 4) or isinstance(o, RuntimeError) for o in outcomes)
+    assert any(isinstance(o, RuntimeError) for o in outcomes)
+
+
+def test_submit_after_stop_is_rejected():
+    async def main():
+        batcher = await started(Recorder())
+        await batcher.stop()
+        with pytest.raises(RuntimeError, match="not running"):
+            await batcher.submit(1)
+
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""bulk_score resumes from its checkpoint and produces the same output."""
+
+import argparse
+import json
+
+import pandas as pd
+import pytest
+
+import bulk_score
+from inference import EngagementPredictor
+
+CHUNK_SIZE = 10
+ROWS = 47
+
+
+@pytest.fixture
+def predictor(models_dir, monkeypatch):
+    predictor = EngagementPredictor(lazy=True, models_dir=models_dir)
+
+    def init_worker():
+        bulk_score._predictor = predictor
+
+    monkeypatch.setattr(bulk_score, "_init_worker", init_worker)
+    return predictor
+
+
+@pytest.fixture
+def posts_csv(tmp_path):
+    path = tmp_path / "posts.csv"
+    pd.DataFrame({
+        "id": range(ROWS),
+        "caption": [f"Post {i} - comment below 😀" if i % 3 else f"post {i}" for i in range(ROWS)],
+        "hashtags": ["#a #b" if i % 2 else "" for i in range(ROWS)],
+        "platform": ["instagram", "tiktok", "linkedin", "twitter"] * 11 + ["facebook"] * 3,
+        "postingTime": [f"{i % 24:02d}:15" for i in range(ROWS)],
+        "dayOfWeek": ["Monday", "Friday", "Sunday"] * 15 + ["Tuesday"] * 2,
+        "resolution": ["4K", "", "720p"] * 15 + ["1080p"] * 2,
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def args_for(input_path, output_path, restart=False):
+    return argparse.Namespace(
+        input=input_path, output=output_path, input_format=None, output_format=None,
+        chunk_size=CHUNK_SIZE, workers=1, keep=["id"], restart=restart
+    )
+
+
+def read_text(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".jsonl"])
+def test_interrupted_run_resumes_to_identical_output(predictor, posts_csv, tmp_path, monkeypatch, suffix):
+    reference = str(tmp_path / f"reference{suffix}")
+    bulk_score.run(args_for(posts_csv, reference))
+
+    output = str(tmp_path / f"scores{suffix}")
+    real_score_chunk = bulk_score.score_chunk
+    calls = []
+
+    def dies_on_fourth_chunk(*args):
+        calls.append(1)
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+        return real_score_chunk(*args)
+
+    monkeypatch.setattr(bulk_score, "score_chunk", dies_on_fourth_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        bulk_score.run(args_for(posts_csv, output))
+    monkeypatch.setattr(bulk_score, "score_chunk", real_score_chunk)
+
+    with open(output + ".checkpoint") as f:
+        checkpoint = json.load(f)
+    assert (checkpoint["chunks_done"], checkpoint["rows_done"], checkpoint["complete"]) == (3, 30, False)
+    # Bytes written after the last checkpoint (a torn write) are discarded
+    with open(output, "ab") as f:
+        f.write(b"partial row")
+
+    summary = bulk_score.run(args_for(posts_csv, output))
+    assert summary["rows"] == ROWS
+    assert summary["rows_this_run"] == ROWS - 30
+    assert read_text(output) == read_text(reference)
+
+    # A completed run is not redone
+    assert bulk_score.run(args_for(posts_csv, output))["complete"]
+    assert read_text(output) == read_text(reference)
+
+
+def test_checkpoint_for_other_input_is_refused(predictor, posts_csv, tmp_path):
+    output = str(tmp_path / "scores.csv")
+    bulk_score.run(args_for(posts_csv, output))
+    with open(posts_csv, "a") as f:
+        f.write("99,late post,,instagram,10:00,Monday,\n")
+
+    with pytest.raises(SystemExit, match="input_size"):
+        bulk_score.run(args_for(posts_csv, output))
+    assert bulk_score.run(args_for(posts_csv, output, restart=True))["rows"] == ROWS + 1
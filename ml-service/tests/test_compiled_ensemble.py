@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from artifacts import export_arrays, load_arrays
+from compiled_ensemble import CompiledEnsemble
+from inference import COMPILED_TOLERANCE, EngagementPredictor
+
+WEIGHTS = {"logistic_regression": 0.30, "random_forest": 0.40, "knn": 0.30}
+
+
+def sklearn_proba(models, features):
+    scaler, lr, rf, knn = models
+    scaled = scaler.transform(features)
+    lr_p, rf_p, knn_p = lr.predict_proba(scaled), rf.predict_proba(scaled), knn.predict_proba(scaled)
+    return lr_p, rf_p, knn_p, 0.30 * lr_p + 0.40 * rf_p + 0.30 * knn_p
+
+
+@pytest.fixture(scope="module")
+def compiled(sklearn_models):
+    return CompiledEnsemble(*sklearn_models, WEIGHTS)
+
+
+@pytest.mark.parametrize("rows", [1, 7, 200])
+def test_members_match_sklearn(compiled, sklearn_models, raw_features, rows):
+    features = raw_features[:rows]
+    for got, expected in zip(compiled.predict_proba(features), sklearn_proba(sklearn_models, features)):
+        np.testing.assert_allclose(got, expected, atol=1e-5)
+
+
+def test_exact_training_rows_take_all_knn_weight(compiled, sklearn_models):
+    scaler, _, _, knn = sklearn_models
+    features = scaler.inverse_transform(knn._fit_X[:5])
+    np.testing.assert_allclose(
+        compiled.predict_proba(features)[2], knn.predict_proba(knn._fit_X[:5]), atol=1e-6
+    )
+
+
+def test_memory_mapped_artifacts_round_trip(compiled, raw_features, tmp_path):
+    export_arrays(compiled, str(tmp_path / "arrays"), ["High", "Low", "Medium"])
+    loaded, manifest = load_arrays(str(tmp_path / "arrays"), WEIGHTS)
+
+    assert manifest["classes"] == ["High", "Low", "Medium"]
+    np.testing.assert_array_equal(
+        loaded.predict_proba(raw_features)[3], compiled.predict_proba(raw_features)[3]
+    )
+
+
+def test_predictor_enables_compiled_engine(models_dir):
+    predictor = EngagementPredictor(compiled=True, use_arrays=False, models_dir=models_dir)
+
+    assert predictor.compiled_ensemble is not None
+    error = predictor.compiled_ensemble.max_abs_error(
+        lambda features: predictor._sklearn_ensemble_proba(features)[3]
+    )
+    assert error <= COMPILED_TOLERANCE
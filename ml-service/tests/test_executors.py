@@ -0,0 +1,57 @@
+"""BoundedExecutor queue limit and broken process pool recovery."""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from executors import BoundedExecutor, ExecutorSaturated
+
+
+def _die_once(flag_path: str) -> int:
+    """Kill the worker the first time it is called, then return normally."""
+    if not os.path.exists(flag_path):
+        open(flag_path, "w").close()
+        os._exit(1)
+    return 42
+
+
+def _always_die() -> int:
+    os._exit(1)
+
+
+def _spawn_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+
+def test_broken_pool_is_rebuilt_and_call_retried(tmp_path):
+    bounded = BoundedExecutor("media", _spawn_pool(), max_pending=4, rebuild=_spawn_pool)
+    try:
+        assert asyncio.run(bounded.run(_die_once, str(tmp_path / "died"))) == 42
+        assert bounded.rebuilds == 1
+        assert bounded.pending == 0
+    finally:
+        bounded.shutdown()
+
+
+def test_pool_broken_twice_raises_but_leaves_a_fresh_pool():
+    bounded = BoundedExecutor("media", _spawn_pool(), max_pending=4, rebuild=_spawn_pool)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            asyncio.run(bounded.run(_always_die))
+        assert bounded.rebuilds == 2
+        assert asyncio.run(bounded.run(abs, -3)) == 3
+    finally:
+        bounded.shutdown()
+
+
+def test_saturated_executor_rejects_new_work():
+    bounded = BoundedExecutor("predict", ThreadPoolExecutor(max_workers=1), max_pending=0)
+    try:
+        with pytest.raises(ExecutorSaturated):
+            asyncio.run(bounded.run(abs, -1))
+    finally:
+        bounded.shutdown()
@@ -0,0 +1,73 @@
+"""extract_features_batch must equal _extract_features row by row."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from inference import EngagementPredictor
+
+POSTS = [
+    # caption, hashtags, platform, postingTime, dayOfWeek, mediaInfo
+    ("Sunset vibes 😀 tag a friend!", "#sunset #travel", "instagram", "18:30", "Friday",
+     {"resolution": "4K", "orientation": "Portrait", "qualityScore": "High"}),
+    ("CLICK THE LINK IN BIO", "#sale", "facebook", "09:05", "Monday",
+     {"resolution": "720p", "orientation": "Landscape", "qualityScore": "Low"}),
+    ("Nouvel été à Montréal 🤩🧡 — Sağlıklı yaşam", "#été #café #日本 #straße", "twitter",
+     "23:59", "Sunday", {"resolution": "1080p", "orientation": "Square", "qualityScore": "Medium"}),
+    ("İSTANBUL", "##double #a_b #123", "linkedin", "7", "Tuesday", None),
+    ("Heart ❤ is outside the emoji range, 🚀 is inside", "", "tiktok", "noon", "Someday", {}),
+    ("", "#x", "mastodon", "", "", {"orientation": "Portrait"}),
+    ("plain caption with no signals", "nohash", "youtube", "12:00", "Saturday",
+     {"resolution": "480p", "orientation": "Landscape", "qualityScore": "High"}),
+    ("Checkout 🎉 and share", "#一 #二", "instagram", "25:00", "Wednesday", None),
+]
+
+
+def single_rows(predictor, posts):
+    return np.vstack([
+        predictor._extract_features(predictor.parse_post(*post)) for post in posts
+    ])
+
+
+def frame_of(posts):
+    return pd.DataFrame(
+        posts, columns=["caption", "hashtags", "platform", "postingTime", "dayOfWeek", "mediaInfo"]
+    )
+
+
+@pytest.fixture(scope="module")
+def predictor(models_dir):
+    return EngagementPredictor(lazy=True, models_dir=models_dir)
+
+
+def test_batch_matches_single_rows(predictor):
+    np.testing.assert_array_equal(
+        predictor.extract_features_batch(frame_of(POSTS)), single_rows(predictor, POSTS)
+    )
+
+
+def test_batch_handles_arrow_strings_and_missing_values(predictor):
+    frame = frame_of(POSTS)
+    text = ["caption", "hashtags", "platform", "postingTime", "dayOfWeek"]
+    frame[text] = frame[text].astype("string[pyarrow]")
+    frame.loc[1, "caption"] = None
+    frame.loc[2, "hashtags"] = None
+
+    posts = [list(post) for post in POSTS]
+    posts[1][0] = ""
+    posts[2][1] = ""
+    np.testing.assert_array_equal(
+        predictor.extract_features_batch(frame), single_rows(predictor, posts)
+    )
+
+
+def test_flat_media_columns_match_dicts(predictor):
+    frame = pd.json_normalize([
+        dict(zip(["caption", "hashtags", "platform", "postingTime", "dayOfWeek"], post[:5]),
+             **({"mediaInfo": post[5]} if post[5] else {}))
+        for post in POSTS
+    ])
+    posts = [post[:5] + (post[5] or None,) for post in POSTS]
+    np.testing.assert_array_equal(
+        predictor.extract_features_batch(frame), single_rows(predictor, posts)
+    )
@@ -0,0 +1,90 @@
+"""Perceptual quality scoring, thumbnail loading and decode-cost estimates."""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from image_quality import (
+    THUMBNAIL_SIDE, analyze_quality, estimate_decode_ms, load_thumbnail
+)
+from media_analyzer import MediaAnalyzer
+from media_cache import MediaCache
+
+
+def photo(width: int = 3840, height: int = 2160, seed: int = 0) -> Image.Image:
+    """Gradients, hard-edged shapes and light sensor noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = 128 + 60 * np.sin(x / 300) + 40 * np.cos(y / 200)
+    image = Image.fromarray(base.astype(np.uint8)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(400):
+        x0, y0, side = rng.integers(0, width), rng.integers(0, height), rng.integers(20, 300)
+        draw.rectangle([x0, y0, x0 + side, y0 + side // 2], fill=tuple(rng.integers(0, 255, 3).tolist()))
+    noisy = np.asarray(image).astype(np.int16) + rng.normal(0, 4, (height, width, 3)).astype(np.int16)
+    return Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))
+
+
+def encode(image: Image.Image, fmt: str, **params) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def photo_4k():
+    return photo()
+
+
+def test_sharp_4k_photo_scores_high(photo_4k):
+    result = analyze_quality(encode(photo_4k, "JPEG", quality=90), budget_ms=1000)
+    assert result["label"] == "High"
+    assert not result["partial"]
+
+
+@pytest.mark.parametrize("radius", [8, 32])
+def test_blurred_4k_photo_scores_low(photo_4k, radius):
+    blurred = photo_4k.filter(ImageFilter.GaussianBlur(radius))
+    result = analyze_quality(encode(blurred, "JPEG", quality=90), budget_ms=1000)
+    assert result["label"] == "Low"
+
+
+def test_jpeg_estimate_uses_draft_scale(photo_4k):
+    data = encode(photo_4k, "JPEG", quality=90)
+    full = Image.open(BytesIO(data))
+    full_estimate = estimate_decode_ms(full, len(data))
+    drafted = Image.open(BytesIO(data))
+    drafted.draft("L", (THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+    assert max(drafted.size) < max(full.size)
+    assert estimate_decode_ms(drafted, len(data)) < full_estimate
+
+
+def test_png_over_budget_is_skipped(photo_4k):
+    result = analyze_quality(encode(photo_4k, "PNG", compress_level=1), budget_ms=100)
+    assert result == {"partial": True, "reason": "decode over budget"}
+
+
+@pytest.mark.parametrize("fmt, mode", [
+    ("PNG", "RGB"), ("PNG", "RGBA"), ("PNG", "P"), ("PNG", "L"), ("PNG", "I;16"),
+    ("WEBP", "RGB"), ("WEBP", "RGBA"), ("GIF", "P"),
+])
+def test_thumbnail_is_reduced_grayscale(fmt, mode):
+    image = Image.new(mode, (2000, 1200))
+    decoded = Image.open(BytesIO(encode(image, fmt)))
+    gray = load_thumbnail(decoded)
+    assert gray.dtype == np.uint8 and gray.ndim == 2
+    assert THUMBNAIL_SIDE <= max(gray.shape) < 2 * THUMBNAIL_SIDE
+
+
+def test_default_analyzer_caps_blurred_4k_photo(photo_4k, monkeypatch):
+    monkeypatch.delenv("ML_IMAGE_QUALITY", raising=False)
+    monkeypatch.delenv("ML_IMAGE_QUALITY_BUDGET_MS", raising=False)
+    analyzer = MediaAnalyzer(cache=MediaCache(max_size=0))
+    blurred = encode(photo_4k.filter(ImageFilter.GaussianBlur(8)), "JPEG", quality=90)
+
+    metrics = analyzer.analyze(blurred, "image/jpeg")
+    assert metrics["resolution"] == "4K"
+    assert metrics["quality"]["label"] == "Low"
+    assert metrics["qualityScore"] == "Low"
@@ -0,0 +1,178 @@
+"""Keyframe sampling: frame selection, the time budget and MJPEG frame reads."""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+import keyframes
+from keyframes import (
+    _sample_frames, evenly_spaced, read_mjpeg_frames, sample_animated, sample_jpeg_frames
+)
+from media_analyzer import MediaAnalyzer
+from media_cache import MediaCache
+from media_probe import mp4_video_samples
+from test_video_probe import build_mp4
+
+
+def frame(seed: int, size=(160, 120), blur: float = 0) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8))
+    return image.filter(ImageFilter.GaussianBlur(blur)) if blur else image
+
+
+def animated_gif(count: int) -> bytes:
+    frames = [frame(i).convert("P") for i in range(count)]
+    buffer = BytesIO()
+    frames[0].save(buffer, "GIF", save_all=True, append_images=frames[1:], duration=40, loop=0)
+    return buffer.getvalue()
+
+
+def jpeg(image: Image.Image) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+# ─── Frame selection ────────────────────────────────────────────
+
+@pytest.mark.parametrize("total, count, expected", [
+    (0, 4, []),
+    (1, 4, [0]),
+    (1, 1, [0]),
+    (3, 3, [0, 1, 2]),
+    (3, 8, [0, 1, 2]),
+    (10, 1, [0]),
+    (10, 3, [0, 3, 6]),
+    (100, 4, [0, 25, 50, 75]),
+    (10, 0, []),
+])
+def test_evenly_spaced(total, count, expected):
+    assert evenly_spaced(total, count) == expected
+
+
+def test_evenly_spaced_is_distinct_and_in_range():
+    for total in range(1, 40):
+        for count in range(1, 12):
+            indices = evenly_spaced(total, count)
+            assert indices[0] == 0
+            assert len(indices) == min(total, count) == len(set(indices))
+            assert all(0 <= i < total for i in indices)
+
+
+# ─── Budget ─────────────────────────────────────────────────────
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sampling_stops_before_a_frame_predicted_to_overrun(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(keyframes.time, "perf_counter", clock)
+
+    def measure(index):
+        clock.now += 0.030  # 30 ms per frame
+        return {"index": index}
+
+    frames, partial = _sample_frames(range(10), measure, budget_ms=100)
+    # 3 frames end at 90 ms; a 4th would end at 120 ms
+    assert [f["index"] for f in frames] == [0, 1, 2]
+    assert partial
+
+
+def test_first_frame_is_always_measured(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(keyframes.time, "perf_counter", clock)
+
+    def measure(index):
+        clock.now += 1.0
+        return {"index": index}
+
+    frames, partial = _sample_frames([0, 5], measure, budget_ms=0)
+    assert frames == [{"index": 0}] and partial
+
+
+def test_frames_that_fail_to_measure_are_skipped():
+    frames, partial = _sample_frames(range(4), lambda i: None if i % 2 else {"i": i}, 1000)
+    assert frames == [{"i": 0}, {"i": 2}]
+    assert not partial
+
+
+# ─── Animated images ────────────────────────────────────────────
+
+def test_animated_gif_samples_evenly_spaced_frames():
+    image = Image.open(BytesIO(animated_gif(12)))
+    result = sample_animated(image, count=4, budget_ms=10_000)
+    assert result["framesTotal"] == 12
+    assert result["framesSampled"] == 4
+    assert not result["partial"]
+    assert result["label"] in ("Low", "Medium", "High")
+    assert result["minScore"] <= result["score"]
+
+
+def test_animated_gif_with_tiny_budget_is_partial():
+    image = Image.open(BytesIO(animated_gif(12)))
+    result = sample_animated(image, count=6, budget_ms=0.001)
+    assert result["partial"]
+    assert result["framesSampled"] == 1
+    assert result["framesTotal"] == 12
+
+
+def test_analyzer_samples_animated_gif(monkeypatch):
+    monkeypatch.setenv("ML_KEYFRAME_SAMPLES", "3")
+    analyzer = MediaAnalyzer(cache=MediaCache(max_size=0))
+    metrics = analyzer.analyze(animated_gif(9), "image/gif")
+    assert metrics["quality"]["framesSampled"] == 3
+    assert metrics["quality"]["framesTotal"] == 9
+
+
+# ─── MJPEG ──────────────────────────────────────────────────────
+
+def mjpeg_mp4(count: int, blur: float = 0) -> bytes:
+    frames = [jpeg(frame(i, blur=blur)) for i in range(count)]
+    return build_mp4(frames, width=160, height=120, codec=b"jpeg", brand=b"qt  ",
+                     chunks=(count - count // 2, count // 2))
+
+
+def test_mjpeg_frames_are_split_at_sample_boundaries():
+    frames = [jpeg(frame(i)) for i in range(7)]
+    stream = BytesIO(build_mp4(frames, codec=b"jpeg", chunks=(4, 3)))
+    samples = mp4_video_samples(stream)
+
+    read = read_mjpeg_frames(stream, samples, 3)
+    assert read == [frames[i] for i in evenly_spaced(7, 3)]
+    for data in read:
+        assert data.startswith(b"\xff\xd8") and data.endswith(b"\xff\xd9")
+        assert Image.open(BytesIO(data)).size == (160, 120)
+
+
+def test_jpeg_frames_measured_and_aggregated():
+    frames = [jpeg(frame(i)) for i in range(3)]
+    result = sample_jpeg_frames(frames, frames_total=30, budget_ms=10_000)
+    assert result["framesSampled"] == 3
+    assert result["framesTotal"] == 30
+    assert not result["partial"]
+
+    partial = sample_jpeg_frames(frames, frames_total=30, budget_ms=0)
+    assert partial["partial"] and partial["framesSampled"] == 1
+
+
+def test_corrupt_jpeg_frames_are_skipped():
+    frames = [b"\xff\xd8 not a jpeg", jpeg(frame(1))]
+    result = sample_jpeg_frames(frames, frames_total=2, budget_ms=10_000)
+    assert result["framesSampled"] == 1
+    assert sample_jpeg_frames([], frames_total=0, budget_ms=100) is None
+
+
+def test_analyzer_caps_blurry_mjpeg_video(monkeypatch):
+    monkeypatch.setenv("ML_KEYFRAME_SAMPLES", "4")
+    analyzer = MediaAnalyzer(cache=MediaCache(max_size=0))
+    metrics = analyzer.analyze_stream(BytesIO(mjpeg_mp4(8, blur=6)), "video/quicktime")
+    assert metrics["quality"]["framesSampled"] == 4
+    assert metrics["quality"]["framesTotal"] == 8
+    assert metrics["qualityScore"] == "Low"
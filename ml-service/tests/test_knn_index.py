@@ -0,0 +1,68 @@
+"""Neighbour indexes against exact KNN: ids, recall floor and persistence."""
+
+import numpy as np
+import pytest
+
+from knn_index import (
+    KINDS, BruteForceIndex, IVFIndex, build_index, evaluate_index, load_index,
+    sample_queries, save_index
+)
+from train_models import prepare_dataset
+
+K = 7
+# Recall@7 the default IVF settings must keep (measured ~0.98-0.99)
+IVF_RECALL_FLOOR = 0.95
+
+
+@pytest.fixture(scope="module")
+def fit_x():
+    prepared = prepare_dataset(n_samples=20000, seed=7, test_size=0.2)
+    return np.ascontiguousarray(prepared["X_train"], dtype=np.float32)
+
+
+@pytest.fixture(scope="module")
+def queries(fit_x):
+    return sample_queries(fit_x, 500)
+
+
+def recall(index, exact, queries):
+    return evaluate_index(index, exact, queries, K, latency_queries=1)["recall_at_k"]
+
+
+def test_brute_force_matches_sklearn(sklearn_models):
+    knn = sklearn_models[3]
+    fit_x = np.ascontiguousarray(knn._fit_X, dtype=np.float32)
+    queries = sample_queries(fit_x, 200)
+    sq, ids = BruteForceIndex(fit_x).search(queries, K)
+    dist, expected = knn.kneighbors(queries, K)
+
+    np.testing.assert_allclose(np.sqrt(sq), dist, rtol=1e-4, atol=1e-5)
+    assert (np.sort(ids, axis=1) == np.sort(expected, axis=1)).mean() > 0.999
+
+
+@pytest.mark.parametrize("kind", ["kd_tree", "ball_tree"])
+def test_tree_indexes_are_exact(fit_x, queries, kind):
+    assert recall(build_index(kind, fit_x), BruteForceIndex(fit_x), queries) == 1.0
+
+
+def test_ivf_recall_floor(fit_x, queries):
+    assert recall(IVFIndex.build(fit_x), BruteForceIndex(fit_x), queries) >= IVF_RECALL_FLOOR
+
+
+def test_ivf_recall_survives_append(fit_x, queries):
+    index = IVFIndex.build(fit_x[:-2000])
+    appended = index.appended(fit_x[-2000:], fit_x)
+    assert recall(appended, BruteForceIndex(fit_x), queries) >= IVF_RECALL_FLOOR
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_saved_index_gives_same_neighbours(fit_x, queries, kind, tmp_path):
+    index = build_index(kind, fit_x)
+    directory = str(tmp_path / "knn_index")
+    save_index(index, directory, fit_x)
+    loaded = load_index(directory, fit_x)
+
+    assert loaded.kind == kind and loaded.params() == index.params()
+    np.testing.assert_array_equal(loaded.search(queries, K)[1], index.search(queries, K)[1])
+    with pytest.raises(ValueError, match="different training data"):
+        load_index(directory, fit_x[:-1])
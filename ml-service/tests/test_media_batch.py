@@ -0,0 +1,81 @@
+"""/analyze-media/batch end to end: per-file limits, file count, ordering."""
+
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app as service
+import media_upload
+
+
+def encode(size, fmt="PNG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 40, 40)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def jpeg_without_header_fast_path(size) -> bytes:
+    """A JPEG whose SOF sits past the header probe, so it needs a full decode."""
+    jpeg = encode(size, "JPEG")
+    padding = b"\xff\xe2" + (60002).to_bytes(2, "big") + b"\x00" * 60000
+    return jpeg[:2] + padding + padding + jpeg[2:]
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(service.app) as client:
+        yield client
+
+
+def post_batch(client, files):
+    return client.post("/analyze-media/batch", files=[
+        ("files", (name, data, content_type)) for name, data, content_type in files
+    ])
+
+
+def test_results_keep_request_order_across_probed_and_decoded_files(client):
+    response = post_batch(client, [
+        ("slow.jpg", jpeg_without_header_fast_path((640, 480)), "image/jpeg"),
+        ("wide.png", encode((1920, 1080)), "image/png"),
+        ("tall.png", encode((720, 1280)), "image/png"),
+        ("notes.txt", b"plain text, not media", "text/plain"),
+    ])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["filename"] for r in results] == ["slow.jpg", "wide.png", "tall.png", "notes.txt"]
+    assert (results[0]["width"], results[0]["height"]) == (640, 480)
+    assert (results[1]["width"], results[1]["height"]) == (1920, 1080)
+    assert results[2]["orientation"] == "Portrait"
+    assert results[3]["error"] == "Unsupported media type"
+
+
+def test_oversized_file_fails_alone(client, monkeypatch):
+    small = encode((64, 64))
+    large = jpeg_without_header_fast_path((64, 64))
+    monkeypatch.setattr(media_upload, "MEDIA_MAX_BYTES", len(small) + 1000)
+    response = post_batch(client, [
+        ("small.png", small, "image/png"),
+        ("large.jpg", large, "image/jpeg"),
+        ("after.png", small, "image/png"),
+    ])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["filename"] for r in results] == ["small.png", "large.jpg", "after.png"]
+    assert results[1] == {"filename": "large.jpg",
+                          "error": f"File exceeds the {len(small) + 1000} byte limit"}
+    assert results[0]["width"] == results[2]["width"] == 64
+
+
+def test_too_many_files(client):
+    png = encode((8, 8))
+    limit = media_upload.MEDIA_BATCH_MAX_FILES
+    response = post_batch(client, [(f"{i}.png", png, "image/png") for i in range(limit + 1)])
+    assert response.status_code == 413
+    assert f"{limit} file limit" in response.json()["detail"]
+
+
+def test_batch_without_files_field(client):
+    response = client.post("/analyze-media/batch", files=[("file", ("a.png", encode((8, 8)), "image/png"))])
+    assert response.status_code == 400
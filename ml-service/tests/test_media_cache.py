@@ -0,0 +1,85 @@
+"""MediaCache spill store and MediaAnalyzer cache keys."""
+
+import os
+
+import pytest
+
+from media_analyzer import MediaAnalyzer
+from media_cache import MediaCache, content_key
+
+HEADER = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 8
+
+
+def fill(cache, keys):
+    for key in keys:
+        cache.put(key, {"key": key})
+
+
+def test_evicted_entries_spill_and_are_promoted(tmp_path):
+    cache = MediaCache(max_size=2, db_path=str(tmp_path / "media.db"))
+    fill(cache, ["a", "b", "c"])  # "a" spills
+
+    assert cache.get("a") == {"key": "a"}
+    stats = cache.stats()
+    assert stats["spilled"] >= 1
+    assert stats["disk_hits"] == 1
+
+
+def test_spill_store_survives_a_restart(tmp_path):
+    path = str(tmp_path / "media.db")
+    fill(MediaCache(max_size=1, db_path=path), ["a", "b"])
+    assert MediaCache(max_size=1, db_path=path).get("a") == {"key": "a"}
+
+
+def test_no_connection_until_first_use(tmp_path):
+    path = tmp_path / "media.db"
+    cache = MediaCache(max_size=2, db_path=str(path))
+    assert not path.exists()
+    assert cache.get("missing") is None
+    assert path.exists()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_child_opens_its_own_connection(tmp_path):
+    cache = MediaCache(max_size=1, db_path=str(tmp_path / "media.db"))
+    fill(cache, ["parent-1", "parent-2"])  # the parent's connection is open
+    parent_db = cache._db
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            hit = cache.get("parent-1")
+            fill(cache, ["child-1", "child-2", "child-3"])
+            if hit == {"key": "parent-1"} and cache._db is not parent_db:
+                code = 0
+        finally:
+            os._exit(code)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # The parent's connection still works and sees what the child spilled
+    assert cache._db is parent_db
+    assert cache.get("child-1") == {"key": "child-1"}
+
+
+def test_key_depends_on_analyzer_settings(monkeypatch):
+    monkeypatch.setenv("ML_IMAGE_QUALITY", "0")
+    monkeypatch.setenv("ML_KEYFRAME_SAMPLES", "0")
+    analyzer = MediaAnalyzer(cache=MediaCache(max_size=8))
+    base = analyzer.cache_key(HEADER, 4096, "image/jpeg")
+    assert base != content_key(HEADER, 4096, "image/jpeg")
+
+    # Budgets of disabled features do not matter
+    analyzer.quality_budget_ms = 5
+    analyzer.keyframe_budget_ms = 5
+    assert analyzer.cache_key(HEADER, 4096, "image/jpeg") == base
+
+    analyzer.image_quality = True
+    with_quality = analyzer.cache_key(HEADER, 4096, "image/jpeg")
+    assert with_quality != base
+    analyzer.quality_budget_ms = 50
+    assert analyzer.cache_key(HEADER, 4096, "image/jpeg") != with_quality
+
+    analyzer.keyframe_samples = 4
+    assert analyzer.cache_key(HEADER, 4096, "image/jpeg") not in (base, with_quality)
@@ -0,0 +1,46 @@
+"""Header probing of image dimensions, checked against what PIL encodes."""
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from media_probe import IMAGE_PROBE_BYTES, probe_image_size, sniff_media_type
+
+
+def encode(size, fmt, mode="RGB", **params) -> bytes:
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 80, 40) if mode == "RGB" else None).save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("fmt, mode, params, expected", [
+    ("JPEG", "RGB", {}, "jpeg"),
+    ("JPEG", "RGB", {"progressive": True}, "jpeg"),
+    ("JPEG", "RGB", {"exif": b"Exif\x00\x00" + b"\x00" * 64}, "jpeg"),
+    ("PNG", "RGB", {}, "png"),
+    ("GIF", "P", {}, "gif"),
+    ("WEBP", "RGB", {"quality": 80}, "webp"),        # VP8
+    ("WEBP", "RGB", {"lossless": True}, "webp"),     # VP8L
+    ("WEBP", "RGBA", {"quality": 80}, "webp"),       # VP8X (alpha)
+])
+@pytest.mark.parametrize("size", [(1, 1), (641, 479), (1080, 1350)])
+def test_probe_matches_encoded_size(fmt, mode, params, expected, size):
+    data = encode(size, fmt, mode, **params)
+    assert probe_image_size(data[:IMAGE_PROBE_BYTES]) == (expected, *size)
+    assert sniff_media_type(data[:12]) == f"image/{expected}"
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "GIF", "WEBP"])
+def test_truncated_header_is_not_probed(fmt):
+    data = encode((320, 240), fmt, "P" if fmt == "GIF" else "RGB")
+    assert probe_image_size(data[:8]) is None
+
+
+def test_jpeg_with_scan_before_frame_header_is_rejected():
+    assert probe_image_size(b"\xff\xd8\xff\xda\x00\x08" + b"\x00" * 32) is None
+
+
+def test_unknown_format():
+    assert probe_image_size(b"BM" + b"\x00" * 64) is None
+    assert sniff_media_type(b"%PDF-1.7\n\x00\x00\x00") is None
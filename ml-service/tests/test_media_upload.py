@@ -0,0 +1,205 @@
+"""Streaming multipart reader: chunk splits, byte budgets, probing and draining."""
+
+import asyncio
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from media_analyzer import MediaAnalyzer
+from media_cache import MediaCache
+from media_probe import IMAGE_PROBE_BYTES
+from media_upload import (
+    MultipartMediaReader, UploadError, UploadTooLarge, read_media_upload
+)
+
+BOUNDARY = "----engagepredict-test"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def multipart(parts, close=True) -> bytes:
+    """Body for [(field, filename or None, content type or None, bytes)]."""
+    body = b""
+    for name, filename, content_type, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if content_type:
+            body += f"Content-Type: {content_type}\r\n".encode()
+        body += b"\r\n" + data + b"\r\n"
+    if close:
+        body += f"--{BOUNDARY}--\r\n".encode()
+    return body
+
+
+def noisy_png(size=(300, 300)) -> bytes:
+    """A PNG that does not compress, so it spans several probe points."""
+    pixels = os.urandom(size[0] * size[1] * 3)
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", size, pixels).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def upload(body, probe, chunk_size=8192, **kwargs):
+    return asyncio.run(read_media_upload(CONTENT_TYPE, chunked(body, chunk_size), probe, **kwargs))
+
+
+def recording_probe(result=None):
+    """Probe that records the size it saw each time and returns `result`."""
+    sizes = []
+
+    async def probe(media):
+        sizes.append(media.size)
+        return result
+
+    return probe, sizes
+
+
+analyzer = MediaAnalyzer(cache=MediaCache(max_size=0))
+# Header-only metrics, so probes can succeed before the file is complete
+analyzer.image_quality = False
+
+
+async def header_probe(media):
+    return analyzer.probe_stream(media.file, media.media_type)
+
+
+# ─── Parsing ────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 1000])
+def test_small_chunks_split_boundaries_and_headers(chunk_size):
+    data = b"GIF89a" + bytes(range(256)) * 4
+    body = multipart([("file", "a.gif", "image/gif", data)])
+    probe, _ = recording_probe()
+
+    media, metrics = upload(body, probe, chunk_size)
+    assert metrics is None
+    assert media.complete
+    assert media.filename == "a.gif"
+    assert media.declared_type == "image/gif"
+    assert media.media_type == "image/gif"
+    assert media.read_all() == data
+
+
+def test_boundary_lookalike_inside_file_is_data():
+    data = b"\x89PNG\r\n\x1a\n" + f"\r\n--{BOUNDARY}x".encode() * 20
+    body = multipart([("file", "a.png", "image/png", data)])
+    probe, _ = recording_probe()
+    media, _ = upload(body, probe, 5)
+    assert media.read_all() == data
+
+
+def test_fields_before_the_file_are_skipped():
+    data = b"GIF89a" + b"\x00" * 100
+    body = multipart([
+        ("caption", None, None, b"x" * 5000),
+        ("platform", None, None, b"instagram"),
+        ("file", "a.gif", "image/gif", data),
+    ])
+    probe, _ = recording_probe()
+    media, _ = upload(body, probe, 333)
+    assert media.read_all() == data
+
+
+def test_missing_file_field():
+    body = multipart([("caption", None, None, b"hello")])
+    probe, _ = recording_probe()
+    with pytest.raises(UploadError, match="No 'file' field"):
+        upload(body, probe)
+
+
+def test_non_multipart_body_is_rejected():
+    with pytest.raises(UploadError, match="multipart/form-data"):
+        MultipartMediaReader("application/json")
+
+
+# ─── Budgets ────────────────────────────────────────────────────
+
+def test_over_budget_body_is_rejected():
+    body = multipart([("file", "a.gif", "image/gif", b"GIF89a" + b"\x00" * 5000)])
+    probe, _ = recording_probe()
+    with pytest.raises(UploadTooLarge) as excinfo:
+        upload(body, probe, 512, max_bytes=2048)
+    assert excinfo.value.max_bytes == 2048
+
+
+def test_fields_count_against_the_budget():
+    body = multipart([
+        ("caption", None, None, b"x" * 4000),
+        ("file", "a.gif", "image/gif", b"GIF89a" + b"\x00" * 100),
+    ])
+    probe, _ = recording_probe()
+    with pytest.raises(UploadTooLarge):
+        upload(body, probe, max_bytes=2048)
+
+
+def test_drained_bytes_still_count_against_the_budget():
+    png = noisy_png()
+    body = multipart([("file", "a.png", "image/png", png)])
+    with pytest.raises(UploadTooLarge):
+        upload(body, header_probe, max_bytes=len(png) // 2)
+
+
+# ─── Probing ────────────────────────────────────────────────────
+
+def test_probes_at_the_header_size_then_each_doubling():
+    data = b"\x89PNG\r\n\x1a\n" + b"\x00" * (IMAGE_PROBE_BYTES * 6)
+    body = multipart([("file", "a.png", "image/png", data)])
+    probe, sizes = recording_probe()
+
+    media, metrics = upload(body, probe, 4096)
+    assert metrics is None
+    assert media.read_all() == data
+    assert sizes[0] >= IMAGE_PROBE_BYTES
+    for previous, size in zip(sizes, sizes[1:-1]):
+        assert size >= 2 * previous
+    # The last probe sees the complete file
+    assert sizes[-1] == len(data)
+    assert len(sizes) <= 5
+
+
+def test_early_metrics_stop_spooling_and_drain_the_rest():
+    png = noisy_png()
+    assert len(png) > 2 * IMAGE_PROBE_BYTES
+    body = multipart([
+        ("file", "a.png", "image/png", png),
+        ("caption", None, None, b"after the file"),
+    ])
+    chunks_read = []
+
+    async def stream():
+        async for chunk in chunked(body, 4096):
+            chunks_read.append(chunk)
+            yield chunk
+
+    media, metrics = asyncio.run(read_media_upload(CONTENT_TYPE, stream(), header_probe))
+    assert metrics["width"] == 300 and metrics["height"] == 300
+    # The whole body was consumed, but the spooled copy was freed after the probe
+    assert b"".join(chunks_read) == body
+    assert media.size < len(png)
+    assert media.read_all() == b""
+
+
+def test_unknown_magic_bytes_return_no_metrics():
+    body = multipart([("file", "a.bin", "image/png", b"not an image at all" * 10)])
+    probe, sizes = recording_probe()
+    media, metrics = upload(body, probe, 16)
+    assert metrics is None
+    assert media.media_type is None
+    assert sizes == []
+
+
+def test_truncated_body_is_rejected():
+    data = b"GIF89a" + b"\x00" * 5000
+    body = multipart([("file", "a.gif", "image/gif", data)], close=False)
+    probe, _ = recording_probe()
+    with pytest.raises(UploadError, match="ended before the file was complete"):
+        upload(body[:len(body) // 2], probe)
+
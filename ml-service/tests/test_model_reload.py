@@ -0,0 +1,75 @@
+"""EngagementPredictor.reload: cached predictions never outlive their model version."""
+
+import shutil
+
+import numpy as np
+import pytest
+
+from artifacts import ARRAYS_DIRNAME, export_arrays
+from compiled_ensemble import CompiledEnsemble
+from inference import EngagementPredictor
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+
+WEIGHTS = {"logistic_regression": 0.30, "random_forest": 0.40, "knn": 0.30}
+CLASSES = ["High", "Low", "Medium"]
+POST = {"caption": "Golden hour at the pier", "hashtags": "#sunset #travel",
+        "platform": "instagram", "posting_time": "19:00", "day_of_week": "Friday"}
+
+
+def publish(registry, ensemble):
+    def write(staging):
+        export_arrays(ensemble, f"{staging}/{ARRAYS_DIRNAME}", CLASSES)
+
+    return registry.publish(write, activate=False)
+
+
+@pytest.fixture
+def predictor(tmp_path, models_dir, sklearn_models):
+    """A predictor over a copy of the session models with two registry versions."""
+    directory = tmp_path / "models"
+    shutil.copytree(models_dir, directory)
+    registry = ModelRegistry(str(directory))
+
+    base = CompiledEnsemble(*sklearn_models, WEIGHTS)
+    # Same forest and neighbours, but the LR member always votes "Low"
+    skewed = CompiledEnsemble(*sklearn_models, WEIGHTS)
+    skewed.lr_intercept = np.array([-50.0, 50.0, -50.0])
+    versions = [publish(registry, base), publish(registry, skewed)]
+
+    predictor = EngagementPredictor(compiled=True, models_dir=str(directory))
+    predictor.cache = PredictionCache(max_size=64)
+    predictor.reload(versions[0])
+    return predictor, versions
+
+
+def uncached_score(predictor):
+    cache, predictor.cache = predictor.cache, PredictionCache(max_size=0)
+    try:
+        return predictor.predict(**POST)["score"]
+    finally:
+        predictor.cache = cache
+
+
+def test_reload_invalidates_cached_predictions(predictor):
+    predictor, (_, second) = predictor
+    before = predictor.predict(**POST)["score"]
+    assert predictor.cache.stats()["size"] == 1
+
+    predictor.reload(second)
+    after = predictor.predict(**POST)["score"]
+    assert after == uncached_score(predictor)
+    assert after != before
+
+
+def test_late_put_from_previous_version_is_never_served(predictor):
+    predictor, (_, second) = predictor
+    features = predictor._extract_features(predictor.parse_post(**POST))
+    stale_key = predictor._cache_key(features)
+
+    predictor.reload(second)
+    # A request that scored with the old ensemble finishes after the reload cleared the cache
+    predictor.cache.put(stale_key, (0, "High"))
+    result = predictor.predict(**POST)
+    assert (result["score"], result["engagement_level"]) != (0, "High")
+    assert result["score"] == uncached_score(predictor)
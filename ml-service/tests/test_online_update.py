@@ -0,0 +1,115 @@
+"""OnlineUpdater: rescaling alone must not change what the ensemble predicts."""
+
+import numpy as np
+import pytest
+
+from compiled_ensemble import CompiledEnsemble
+from knn_index import BruteForceIndex, IVFIndex, TreeIndex
+from online_update import OnlineUpdater
+
+WEIGHTS = {"logistic_regression": 0.30, "random_forest": 0.40, "knn": 0.30}
+CLASSES = ["High", "Low", "Medium"]
+
+
+def fresh_ensemble(sklearn_models):
+    return CompiledEnsemble(*sklearn_models, WEIGHTS)
+
+
+def shifted_batch(raw_features):
+    """Rows whose mean and variance differ from the training data."""
+    rng = np.random.default_rng(11)
+    batch = raw_features[rng.choice(len(raw_features), 120)] * 1.3
+    batch[:, 0] += 40.0
+    return batch
+
+
+def build_index(kind, fit_x):
+    if kind == "ivf":
+        return IVFIndex.build(fit_x)
+    if kind == "kd_tree":
+        return TreeIndex.build(fit_x)
+    return None
+
+
+@pytest.mark.parametrize("index_kind", [None, "kd_tree", "ivf"])
+def test_scaler_update_alone_leaves_predictions_unchanged(sklearn_models, raw_features, index_kind):
+    scaler = sklearn_models[0]
+    ensemble = fresh_ensemble(sklearn_models)
+    index = build_index(index_kind, np.asarray(ensemble.knn_fit_x))
+    if index is not None:
+        ensemble.knn_index = index
+    before = ensemble.predict_proba(raw_features)
+
+    updater = OnlineUpdater(
+        ensemble, CLASSES, int(scaler.n_samples_seen_), knn_index=index,
+        learning_rate=0.0, alpha=0.0, append_knn=False
+    )
+    batch = shifted_batch(raw_features)
+    updater.partial_fit(batch[:60], np.zeros(60, dtype=np.int64))
+    updater.partial_fit(batch[60:], np.ones(60, dtype=np.int64))
+
+    # The scaler really moved
+    assert not np.allclose(updater.mean, scaler.mean_)
+    np.testing.assert_allclose(updater.predict_proba(raw_features), before[3], atol=1e-6)
+
+    updated = updater.finalize()
+    np.testing.assert_array_equal(updated.mean, scaler.mean_)
+    lr, rf, knn, _ = updated.predict_proba(raw_features)
+    np.testing.assert_allclose(lr, before[0], atol=1e-9)
+    # The members that never learn are untouched, even for inputs on a split threshold
+    np.testing.assert_array_equal(rf, before[1])
+    np.testing.assert_array_equal(knn, before[2])
+    assert isinstance(updated.knn_index, type(index) if index is not None else BruteForceIndex)
+
+
+def test_running_scaler_carries_over_to_the_next_update(sklearn_models, raw_features):
+    scaler = sklearn_models[0]
+    batch = shifted_batch(raw_features)
+    first = OnlineUpdater(
+        fresh_ensemble(sklearn_models), CLASSES, int(scaler.n_samples_seen_),
+        learning_rate=0.05, append_knn=False
+    )
+    first.partial_fit(batch, np.zeros(len(batch), dtype=np.int64))
+    updated = first.finalize()
+
+    # As run() restarts from a published version and its manifest
+    second = OnlineUpdater(
+        updated, CLASSES, first.n_samples, running_scaler=first.running_scaler(),
+        learning_rate=0.05, append_knn=False
+    )
+    np.testing.assert_allclose(second.lr_coef_t, first.lr_coef_t, atol=1e-12)
+    np.testing.assert_allclose(second.lr_intercept, first.lr_intercept, atol=1e-12)
+    np.testing.assert_allclose(
+        second.predict_proba(raw_features), first.predict_proba(raw_features), atol=1e-12
+    )
+
+
+def test_learning_changes_lr_member_only(sklearn_models, raw_features):
+    scaler = sklearn_models[0]
+    before = fresh_ensemble(sklearn_models).predict_proba(raw_features)
+    updater = OnlineUpdater(
+        fresh_ensemble(sklearn_models), CLASSES, int(scaler.n_samples_seen_),
+        learning_rate=0.05, append_knn=False
+    )
+    batch = shifted_batch(raw_features)
+    updater.partial_fit(batch, np.zeros(len(batch), dtype=np.int64))
+    lr, rf, knn, _ = updater.finalize().predict_proba(raw_features)
+
+    assert not np.allclose(lr, before[0], atol=1e-4)
+    np.testing.assert_array_equal(rf, before[1])
+    np.testing.assert_array_equal(knn, before[2])
+
+
+def test_appended_rows_become_neighbours(sklearn_models, raw_features):
+    scaler = sklearn_models[0]
+    ensemble = fresh_ensemble(sklearn_models)
+    rows_before = ensemble.knn_fit_x.shape[0]
+    updater = OnlineUpdater(ensemble, CLASSES, int(scaler.n_samples_seen_), learning_rate=0.0)
+    batch = shifted_batch(raw_features)
+    updater.partial_fit(batch, np.full(len(batch), 1, dtype=np.int64))
+    updated = updater.finalize()
+
+    assert updated.knn_fit_x.shape[0] == rows_before + len(batch)
+    # A query equal to an appended row is its own nearest neighbour: all KNN weight on "Low"
+    knn = updated.predict_proba(batch[:1])[2]
+    assert knn[0, 1] == pytest.approx(1.0)
@@ -0,0 +1,66 @@
+"""PredictionCache LRU eviction, TTL expiry and key quantization."""
+
+import numpy as np
+
+import prediction_cache
+from prediction_cache import PredictionCache, feature_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(prediction_cache.time, "monotonic", clock)
+    cache = PredictionCache(max_size=8, ttl_seconds=30)
+    cache.put("a", 1)
+
+    clock.now += 29
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_zero_ttl_keeps_entries_and_zero_size_disables(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(prediction_cache.time, "monotonic", clock)
+    cache = PredictionCache(max_size=8, ttl_seconds=0)
+    cache.put("a", 1)
+    clock.now += 10 ** 6
+    assert cache.get("a") == 1
+
+    disabled = PredictionCache(max_size=0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
+    assert disabled.stats()["size"] == 0
+
+
+def test_feature_key_quantizes_ratio_features():
+    row = np.array([120, 3, 0.123456, 14, 1], dtype=np.float64)
+    nudged = row + np.array([0, 0, 0.00001, 0, 0])
+    assert feature_key(row) == feature_key(nudged)
+    assert feature_key(row) != feature_key(row + np.array([0, 1, 0, 0, 0]))
+    hash(feature_key(row))
@@ -0,0 +1,137 @@
+"""UserInsightsPredictor: fused projection parity and the /user-insights endpoints."""
+
+import os
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from user_insights import USER_FEATURES, UserInsightsPredictor
+
+ROOT_MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "models")
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(os.path.join(ROOT_MODELS, "pca.pkl")),
+    reason="root user pipeline not trained (python train_models.py at the repo root)"
+)
+
+
+def load(name):
+    return joblib.load(os.path.join(ROOT_MODELS, f"{name}.pkl"))
+
+
+@pytest.fixture(scope="module")
+def predictors():
+    with warnings.catch_warnings():
+        # Pickles from an older sklearn; not what these tests are about
+        warnings.simplefilter("ignore", UserWarning)
+        return (UserInsightsPredictor(ROOT_MODELS, fused=True),
+                UserInsightsPredictor(ROOT_MODELS, fused=False))
+
+
+def random_users(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "session_duration_minutes": float(rng.uniform(0, 120)),
+            "pages_visited": float(rng.integers(1, 40)),
+            "click_through_rate": float(rng.uniform(0, 1)),
+            "historical_likes": float(rng.integers(0, 2000)),
+            "historical_comments": float(rng.integers(0, 300)),
+            "days_since_last_login": float(rng.integers(0, 90)),
+            "device_type": ["Desktop", "Mobile", "Tablet"][rng.integers(0, 3)],
+        }
+        for _ in range(n)
+    ]
+
+
+def pipeline_projection(features):
+    """What the root train_models.py pipeline computes."""
+    frame = pd.DataFrame(features, columns=USER_FEATURES)
+    return load("pca").transform(load("scaler").transform(frame))
+
+
+def test_fused_projection_matches_the_sklearn_pipeline(predictors):
+    fused, _ = predictors
+    assert fused.projection_weight is not None
+    features = fused.feature_matrix(random_users(500))
+    np.testing.assert_allclose(fused.project(features), pipeline_projection(features),
+                               rtol=0, atol=1e-9)
+
+
+def test_fused_and_sklearn_paths_give_the_same_insights(predictors):
+    fused, unfused = predictors
+    assert unfused.projection_weight is None
+    users = random_users(200, seed=1)
+    for a, b in zip(fused.predict_batch(users), unfused.predict_batch(users)):
+        assert a["cluster"] == b["cluster"]
+        assert a["engagement_tier"] == b["engagement_tier"]
+        assert a["churn_probability"] == pytest.approx(b["churn_probability"], abs=1e-4)
+        np.testing.assert_allclose(a["components"], b["components"], atol=1e-5)
+
+
+def test_sklearn_path_passes_feature_names(predictors):
+    _, unfused = predictors
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        unfused.predict_batch(random_users(3))
+
+
+def test_unknown_device_type(predictors):
+    fused, _ = predictors
+    user = dict(random_users(1)[0], device_type="Watch")
+    with pytest.raises(ValueError, match="Unknown device_type"):
+        fused.predict_batch([user])
+
+
+# ─── Endpoints ──────────────────────────────────────────────────
+
+def request_body(user, user_id):
+    return {
+        "userId": user_id,
+        "sessionDurationMinutes": user["session_duration_minutes"],
+        "pagesVisited": user["pages_visited"],
+        "clickThroughRate": user["click_through_rate"],
+        "historicalLikes": user["historical_likes"],
+        "historicalComments": user["historical_comments"],
+        "daysSinceLastLogin": user["days_since_last_login"],
+        "deviceType": user["device_type"],
+    }
+
+
+@pytest.fixture(scope="module")
+def client():
+    import app as service
+
+    with TestClient(service.app) as client:
+        yield client
+
+
+def test_user_insights_endpoints_match_the_predictor(client, predictors):
+    fused, _ = predictors
+    users = random_users(5, seed=2)
+    expected = fused.predict_batch(users)
+
+    single = client.post("/user-insights", json=request_body(users[0], "u0"))
+    assert single.status_code == 200
+    assert single.json()["userId"] == "u0"
+    assert single.json()["cluster"] == expected[0]["cluster"]
+
+    batch = client.post("/user-insights/batch", json={
+        "items": [request_body(user, f"u{i}") for i, user in enumerate(users)]
+    })
+    assert batch.status_code == 200
+    results = batch.json()["results"]
+    assert [r["userId"] for r in results] == [f"u{i}" for i in range(5)]
+    for result, want in zip(results, expected):
+        assert result["engagementTier"] == want["engagement_tier"]
+        assert result["churnProbability"] == want["churn_probability"]
+        assert result["components"] == want["components"]
+
+
+def test_user_insights_rejects_unknown_device(client):
+    body = request_body(dict(random_users(1)[0], device_type="Watch"), "u0")
+    assert client.post("/user-insights", json=body).status_code == 400
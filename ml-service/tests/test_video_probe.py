@@ -0,0 +1,139 @@
+"""Container probing of MP4/QuickTime and WebM files built box by box."""
+
+import struct
+from io import BytesIO
+
+import pytest
+
+from media_probe import mp4_video_samples, probe_video, sniff_media_type
+
+
+# ─── MP4 / QuickTime ────────────────────────────────────────────
+
+def box(box_type: bytes, *payload: bytes) -> bytes:
+    body = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(body), box_type) + body
+
+
+def full_box(box_type: bytes, *payload: bytes, version: int = 0) -> bytes:
+    return box(box_type, bytes([version, 0, 0, 0]), *payload)
+
+
+IDENTITY = (0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+ROTATE_90 = (0, 0x10000, 0, -0x10000, 0, 0, 0, 0, 0x40000000)
+
+
+def tkhd(width: int, height: int, matrix=IDENTITY, version: int = 0) -> bytes:
+    times = struct.pack(">QQIIQ", 0, 0, 1, 0, 0) if version == 1 else struct.pack(">IIIII", 0, 0, 1, 0, 0)
+    return full_box(
+        b"tkhd", times, b"\x00" * 8, struct.pack(">hhhH", 0, 0, 0, 0),
+        struct.pack(">9i", *matrix), struct.pack(">II", width << 16, height << 16),
+        version=version
+    )
+
+
+def build_mp4(frames, width=1280, height=720, codec=b"avc1", brand=b"isom",
+              matrix=IDENTITY, handler=b"vide", chunks=(2, 1), tkhd_version=0) -> bytes:
+    """ftyp, mdat holding `frames` back to back, then moov (so offsets are known)."""
+    ftyp = box(b"ftyp", brand, b"\x00\x00\x02\x00", brand)
+    mdat_start = len(ftyp) + 8
+    chunk_offsets, position = [], mdat_start
+    remaining = list(frames)
+    for per_chunk in chunks:
+        chunk_offsets.append(position)
+        position += sum(len(f) for f in remaining[:per_chunk])
+        remaining = remaining[per_chunk:]
+
+    stbl = box(
+        b"stbl",
+        full_box(b"stsd", struct.pack(">I", 1), box(codec, b"\x00" * 70)),
+        full_box(b"stsz", struct.pack(">II", 0, len(frames)),
+                 b"".join(struct.pack(">I", len(f)) for f in frames)),
+        full_box(b"stsc", struct.pack(">I", len(chunks)),
+                 b"".join(struct.pack(">III", i + 1, n, 1) for i, n in enumerate(chunks))),
+        full_box(b"stco", struct.pack(">I", len(chunk_offsets)),
+                 b"".join(struct.pack(">I", o) for o in chunk_offsets)),
+    )
+    trak = box(
+        b"trak", tkhd(width, height, matrix, tkhd_version),
+        box(b"mdia", full_box(b"hdlr", b"\x00" * 4, handler, b"\x00" * 12), box(b"minf", stbl))
+    )
+    mvhd = full_box(b"mvhd", struct.pack(">IIII", 0, 0, 600, 6300), b"\x00" * 80)
+    return ftyp + box(b"mdat", *frames) + box(b"moov", mvhd, trak)
+
+
+FRAMES = [b"frame-one", b"second frame", b"3rd"]
+
+
+def test_mp4_dimensions_duration_and_codec():
+    data = build_mp4(FRAMES)
+    assert sniff_media_type(data[:12]) == "video/mp4"
+    assert probe_video(BytesIO(data)) == {
+        "format": "mp4", "width": 1280, "height": 720, "duration": 10.5, "codec": "avc1"
+    }
+
+
+def test_quicktime_brand_and_64bit_track_header():
+    data = build_mp4(FRAMES, brand=b"qt  ", codec=b"jpeg", tkhd_version=1)
+    assert sniff_media_type(data[:12]) == "video/quicktime"
+    probed = probe_video(BytesIO(data))
+    assert (probed["format"], probed["width"], probed["height"], probed["codec"]) == \
+        ("mov", 1280, 720, "jpeg")
+
+
+def test_rotation_matrix_swaps_portrait_dimensions():
+    probed = probe_video(BytesIO(build_mp4(FRAMES, 1920, 1080, matrix=ROTATE_90)))
+    assert (probed["width"], probed["height"]) == (1080, 1920)
+
+
+def test_sample_table_resolves_frame_ranges():
+    stream = BytesIO(build_mp4(FRAMES))
+    samples = mp4_video_samples(stream)
+    assert len(samples) == len(FRAMES)
+    for (offset, size), frame in zip(samples, FRAMES):
+        stream.seek(offset)
+        assert stream.read(size) == frame
+
+
+def test_audio_only_or_truncated_mp4_is_not_probed():
+    assert probe_video(BytesIO(build_mp4(FRAMES, handler=b"soun"))) is None
+    data = build_mp4(FRAMES)
+    assert probe_video(BytesIO(data[:-20])) is None
+
+
+# ─── WebM / Matroska ────────────────────────────────────────────
+
+def element(element_id: int, *payload: bytes, unknown_size: bool = False) -> bytes:
+    body = b"".join(payload)
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    size = b"\x01" + (b"\xff" * 7 if unknown_size else len(body).to_bytes(7, "big"))
+    return id_bytes + size + body
+
+
+def uint(element_id: int, value: int) -> bytes:
+    return element(element_id, value.to_bytes(4, "big"))
+
+
+def build_webm(width=640, height=360, duration_ms=2500.0, unknown_size=False, track_type=1) -> bytes:
+    info = element(0x1549A966, uint(0x2AD7B1, 1_000_000), element(0x4489, struct.pack(">d", duration_ms)))
+    tracks = element(0x1654AE6B, element(
+        0xAE, uint(0x83, track_type), element(0x86, b"V_VP9"),
+        element(0xE0, uint(0xB0, width), uint(0xBA, height))
+    ))
+    cluster = element(0x1F43B675, b"\x00" * 32)
+    header = element(0x1A45DFA3, element(0x4282, b"webm"))
+    return header + element(0x18538067, info, tracks, cluster, unknown_size=unknown_size)
+
+
+@pytest.mark.parametrize("unknown_size", [False, True])
+def test_webm_dimensions_duration_and_codec(unknown_size):
+    data = build_webm(unknown_size=unknown_size)
+    assert sniff_media_type(data[:12]) == "video/webm"
+    assert probe_video(BytesIO(data)) == {
+        "format": "webm", "width": 640, "height": 360, "duration": 2.5, "codec": "V_VP9"
+    }
+
+
+def test_webm_without_video_track_is_not_probed():
+    assert probe_video(BytesIO(build_webm(track_type=2))) is None
+    assert probe_video(BytesIO(b"\x1a\x45\xdf\xa3\x81")) is None
@@ -2,12 +2,31 @@
 EngagePredict - ML Model Training Script
 Trains Multiclass Logistic Regression, Random Forest Classifier, and KNN
 for social media engagement prediction (High / Medium / Low).
+
+Usage:
+    python train_models.py
+    python train_models.py --samples 2000000
+    python train_models.py --samples 2000000 --no-cache
+    python train_models.py --samples 2000000 --knn-index ivf
+    python train_models.py --publish       # also publish a model registry version
+
+The prepared dataset (train/test split, scaled features, fitted scaler and
+label encoder) is cached under training_cache/<config hash>/, so re-running
+with the same --samples/--seed/--test-size skips generation and scaling.
 """
 
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
 import numpy as np
 import pandas as pd
-import pickle
-import os
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.linear_model import LogisticRegression
@@ -37,204 +56,327 @@ FEATURE_NAMES = [
 # Engagement classes
 CLASSES = ["Low", "Medium", "High"]
 
+# ─── Platform-specific optimal ranges (ig, tiktok, yt, twitter, fb) ──
+CAPTION_RANGES = np.array([(100, 2200), (50, 300), (200, 5000), (50, 280), (40, 500)])
+HASHTAG_RANGES = np.array([(3, 30), (3, 8), (3, 15), (1, 3), (1, 5)])
+PEAK_HOURS = [
+    [9, 10, 12, 13, 19, 20],
+    [19, 20, 21, 22, 12, 13, 14],
+    [14, 15, 19, 20],
+    [8, 9, 12, 17],
+    [13, 14, 15, 19, 20],
+]
+# PEAK_TABLE[platform, hour] is True during that platform's peak hours
+PEAK_TABLE = np.zeros((len(PEAK_HOURS), 24), dtype=bool)
+for _platform, _hours in enumerate(PEAK_HOURS):
+    PEAK_TABLE[_platform, _hours] = True
+
+RESOLUTION_IMPACT = np.array([-10, -5, 5, 15, 20])
+QUALITY_IMPACT = np.array([-8, 3, 10])
+
+# Bump when generate_synthetic_data changes, so cached datasets are rebuilt
+DATA_VERSION = 2
+CACHE_DIR = os.getenv(
+    "ML_TRAINING_CACHE_DIR", os.path.join(os.path.dirname(__file__), "training_cache")
+)
+# Models are scored on at most this many held-out rows (KNN predict is O(train × test))
+EVAL_MAX_SAMPLES = 50_000
 
-def generate_synthetic_data(n_samples=5000):
+
+def generate_synthetic_data(n_samples=5000, seed=42):
     """
     Generate realistic synthetic social media engagement data.
     Features are designed to reflect real-world patterns where
     certain combinations of features lead to higher engagement.
+
+    Every column is drawn for all rows at once, so millions of rows
+    take seconds.
     """
-    np.random.seed(42)
-    data = []
-
-    for _ in range(n_samples):
-        platform = np.random.choice([0, 1, 2, 3, 4])  # ig, tiktok, yt, twitter, fb
-
-        # Platform-specific optimal ranges
-        platform_configs = {
-            0: {"cap_range": (100, 2200), "hash_range": (3, 30), "peaks": [9,10,12,13,19,20]},
-            1: {"cap_range": (50, 300),   "hash_range": (3, 8),  "peaks": [19,20,21,22,12,13,14]},
-            2: {"cap_range": (200, 5000), "hash_range": (3, 15), "peaks": [14,15,19,20]},
-            3: {"cap_range": (50, 280),   "hash_range": (1, 3),  "peaks": [8,9,12,17]},
-            4: {"cap_range": (40, 500),   "hash_range": (1, 5),  "peaks": [13,14,15,19,20]},
-        }
-        config = platform_configs[platform]
-
-        # Generate features with realistic distributions
-        caption_length = int(np.random.exponential(300) + 10)
-        caption_length = min(caption_length, 5000)
-
-        hashtag_count = int(np.random.exponential(5))
-        hashtag_count = min(hashtag_count, 50)
-
-        posting_hour = np.random.randint(0, 24)
-        is_peak = 1 if posting_hour in config["peaks"] else 0
-        is_best_day = np.random.choice([0, 1], p=[0.4, 0.6])
-
-        resolution_score = np.random.choice([0, 1, 2, 3, 4], p=[0.05, 0.10, 0.20, 0.45, 0.20])
-        orientation_match = np.random.choice([0, 1], p=[0.35, 0.65])
-        media_quality = np.random.choice([0, 1, 2], p=[0.15, 0.30, 0.55])
-
-        has_location = np.random.choice([0, 1], p=[0.5, 0.5])
-        has_cta = np.random.choice([0, 1], p=[0.6, 0.4])
-        has_emoji = np.random.choice([0, 1], p=[0.4, 0.6])
-
-        # Calculate ratios
-        cap_min, cap_max = config["cap_range"]
-        hash_min, hash_max = config["hash_range"]
-        hashtag_ratio = hashtag_count / hash_max if hash_max > 0 else 0
-        caption_ratio = caption_length / cap_max if cap_max > 0 else 0
-
-        # ─── Engagement Score Calculation (ground truth) ─────────
-        score = 50.0
-
-        # Resolution impact
-        score += [-10, -5, 5, 15, 20][resolution_score]
-
-        # Orientation match
-        score += 15 if orientation_match else -10
-
-        # Caption length fit
-        if cap_min <= caption_length <= cap_max:
-            score += 10
-        elif caption_length < cap_min * 0.5:
-            score -= 10
-        elif caption_length < cap_min:
-            score -= 5
-        elif caption_length > cap_max * 1.5:
-            score -= 10
-        else:
-            score -= 3
-
-        # Hashtag fit
-        if hash_min <= hashtag_count <= hash_max:
-            score += 10
-        elif hashtag_count < hash_min:
-            score -= 5
-        elif hashtag_count > hash_max * 1.5:
-            score -= 15
-        else:
-            score -= 5
-
-        # Time and day
-        score += 10 if is_peak else -5
-        score += 5 if is_best_day else 0
-
-        # Media quality
-        score += [-8, 3, 10][media_quality]
-
-        # Extra features
-        score += 3 if has_location else 0
-        score += 5 if has_cta else 0
-        score += 2 if has_emoji else 0
-
-        # Add noise to simulate real-world variability
-        score += np.random.normal(0, 8)
-
-        # Clamp
-        score = max(0, min(100, score))
-
-        # Classify
-        if score >= 75:
-            label = "High"
-        elif score >= 50:
-            label = "Medium"
-        else:
-            label = "Low"
-
-        data.append([
-            caption_length, hashtag_count, posting_hour, is_peak,
-            is_best_day, resolution_score, orientation_match,
-            media_quality, platform, has_location, has_cta,
-            has_emoji, hashtag_ratio, caption_ratio, label
-        ])
-
-    columns = FEATURE_NAMES + ["engagement_level"]
-    df = pd.DataFrame(data, columns=columns)
+    rng = np.random.RandomState(seed)
+    n = n_samples
+
+    platform = rng.randint(0, 5, n)
+
+    # Generate features with realistic distributions
+    caption_length = np.minimum((rng.exponential(300, n) + 10).astype(int), 5000)
+    hashtag_count = np.minimum(rng.exponential(5, n).astype(int), 50)
+
+    posting_hour = rng.randint(0, 24, n)
+    is_peak = PEAK_TABLE[platform, posting_hour].astype(int)
+    is_best_day = rng.choice([0, 1], n, p=[0.4, 0.6])
+
+    resolution_score = rng.choice([0, 1, 2, 3, 4], n, p=[0.05, 0.10, 0.20, 0.45, 0.20])
+    orientation_match = rng.choice([0, 1], n, p=[0.35, 0.65])
+    media_quality = rng.choice([0, 1, 2], n, p=[0.15, 0.30, 0.55])
+
+    has_location = rng.choice([0, 1], n, p=[0.5, 0.5])
+    has_cta = rng.choice([0, 1], n, p=[0.6, 0.4])
+    has_emoji = rng.choice([0, 1], n, p=[0.4, 0.6])
+
+    # Calculate ratios
+    cap_min, cap_max = CAPTION_RANGES[platform].T
+    hash_min, hash_max = HASHTAG_RANGES[platform].T
+    hashtag_ratio = hashtag_count / hash_max
+    caption_ratio = caption_length / cap_max
+
+    # ─── Engagement Score Calculation (ground truth) ─────────
+    score = np.full(n, 50.0)
+
+    # Resolution impact
+    score += RESOLUTION_IMPACT[resolution_score]
+
+    # Orientation match
+    score += np.where(orientation_match == 1, 15, -10)
+
+    # Caption length fit
+    score += np.select(
+        [
+            (cap_min <= caption_length) & (caption_length <= cap_max),
+            caption_length < cap_min * 0.5,
+            caption_length < cap_min,
+            caption_length > cap_max * 1.5,
+        ],
+        [10, -10, -5, -10],
+        default=-3
+    )
+
+    # Hashtag fit
+    score += np.select(
+        [
+            (hash_min <= hashtag_count) & (hashtag_count <= hash_max),
+            hashtag_count < hash_min,
+            hashtag_count > hash_max * 1.5,
+        ],
+        [10, -5, -15],
+        default=-5
+    )
+
+    # Time and day
+    score += np.where(is_peak == 1, 10, -5)
+    score += 5 * is_best_day
+
+    # Media quality
+    score += QUALITY_IMPACT[media_quality]
+
+    # Extra features
+    score += 3 * has_location + 5 * has_cta + 2 * has_emoji
+
+    # Add noise to simulate real-world variability
+    score += rng.normal(0, 8, n)
+
+    # Clamp
+    score = np.clip(score, 0, 100)
+
+    # Classify
+    label = np.select([score >= 75, score >= 50], ["High", "Medium"], default="Low")
+
+    columns = [
+        caption_length, hashtag_count, posting_hour, is_peak,
+        is_best_day, resolution_score, orientation_match,
+        media_quality, platform, has_location, has_cta,
+        has_emoji, hashtag_ratio, caption_ratio
+    ]
+    df = pd.DataFrame(dict(zip(FEATURE_NAMES, columns)))
+    df["engagement_level"] = label
     return df
 
 
-def train_and_save_models():
+# ─── Prepared Dataset Cache ─────────────────────────────────────
+
+PREPARED_ARRAYS = ("X_train", "X_test", "y_train", "y_test")
+
+
+def config_hash(config: Dict) -> str:
+    payload = json.dumps(dict(config, data_version=DATA_VERSION), sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def prepare_dataset(n_samples: int, seed: int, test_size: float) -> Dict:
+    """Generate, encode, split and scale the training data."""
+    df = generate_synthetic_data(n_samples=n_samples, seed=seed)
+    class_counts = df["engagement_level"].value_counts()
+
+    X = df[FEATURE_NAMES].to_numpy(dtype=float)
+    label_encoder = LabelEncoder()
+    y_encoded = label_encoder.fit_transform(df["engagement_level"].to_numpy())
+    del df
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_encoded, test_size=test_size, random_state=seed, stratify=y_encoded
+    )
+
+    scaler = StandardScaler()
+    return {
+        "X_train": scaler.fit_transform(X_train),
+        "X_test": scaler.transform(X_test),
+        "y_train": y_train,
+        "y_test": y_test,
+        "scaler": scaler,
+        "label_encoder": label_encoder,
+        "class_counts": {cls: int(class_counts.get(cls, 0)) for cls in CLASSES}
+    }
+
+
+def save_prepared(prepared: Dict, directory: str, config: Dict):
+    """Write a prepared dataset; renamed into place like the model artifacts."""
+    staging = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    for name in PREPARED_ARRAYS:
+        np.save(os.path.join(staging, f"{name}.npy"), prepared[name])
+    for name in ("scaler", "label_encoder"):
+        with open(os.path.join(staging, f"{name}.pkl"), "wb") as f:
+            pickle.dump(prepared[name], f)
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump({"config": config, "data_version": DATA_VERSION,
+                   "class_counts": prepared["class_counts"]}, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+
+def load_prepared(directory: str) -> Optional[Dict]:
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        return None
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    prepared = {name: np.load(os.path.join(directory, f"{name}.npy")) for name in PREPARED_ARRAYS}
+    for name in ("scaler", "label_encoder"):
+        with open(os.path.join(directory, f"{name}.pkl"), "rb") as f:
+            prepared[name] = pickle.load(f)
+    prepared["class_counts"] = meta["class_counts"]
+    return prepared
+
+
+def load_or_prepare_dataset(
+    n_samples: int, seed: int = 42, test_size: float = 0.2,
+    use_cache: bool = True, cache_dir: str = CACHE_DIR
+) -> Dict:
+    config = {"n_samples": n_samples, "seed": seed, "test_size": test_size}
+    directory = os.path.join(cache_dir, config_hash(config))
+
+    if use_cache:
+        prepared = load_prepared(directory)
+        if prepared is not None:
+            print(f"   Loaded cached dataset from {directory}")
+            return prepared
+
+    prepared = prepare_dataset(n_samples, seed, test_size)
+    if use_cache:
+        save_prepared(prepared, directory, config)
+        print(f"   Cached dataset in {directory}")
+    return prepared
+
+
+# ─── Models ─────────────────────────────────────────────────────
+
+def build_models() -> Dict:
+    return {
+        # Model 1: Multiclass Logistic Regression
+        "Logistic Regression": LogisticRegression(
+            solver="lbfgs",
+            max_iter=1000,
+            C=1.0,
+            random_state=42
+        ),
+        # Model 2: Random Forest Classifier
+        "Random Forest": RandomForestClassifier(
+            n_estimators=100,
+            max_depth=12,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=42,
+            n_jobs=-1
+        ),
+        # Model 3: K-Nearest Neighbors
+        "KNN": KNeighborsClassifier(
+            n_neighbors=7,
+            weights="distance",
+            metric="minkowski",
+            p=2
+        ),
+    }
+
+
+def fit_and_evaluate(model, X_train, y_train, X_eval, y_eval, target_names):
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    pred = model.predict(X_eval)
+    return {
+        "model": model,
+        "accuracy": accuracy_score(y_eval, pred),
+        "report": classification_report(y_eval, pred, target_names=target_names),
+        "fit_seconds": fit_seconds
+    }
+
+
+def train_and_save_models(
+    n_samples: int = 8000, seed: int = 42, use_cache: bool = True, workers: int = 3,
+    knn_index: Optional[str] = None, publish: bool = False
+):
     """
     Train all 3 ML models and save them to the models/ directory.
+
+    The models are fitted concurrently on a thread pool: the heavy loops
+    (lbfgs gradients, forest building, KD-tree construction) run in
+    compiled code that releases the GIL, and threads share the training
+    arrays instead of copying them into each worker.
     """
     print("=" * 60)
     print("  EngagePredict - ML Model Training")
     print("=" * 60)
 
     # Generate data
-    print("\n[DATA] Generating synthetic training data...")
-    df = generate_synthetic_data(n_samples=8000)
+    print("\n[DATA] Preparing training data...")
+    start = time.perf_counter()
+    prepared = load_or_prepare_dataset(n_samples, seed=seed, use_cache=use_cache)
+    print(f"   Ready in {time.perf_counter() - start:.1f}s")
 
-    print(f"   Dataset size: {len(df)} samples")
-    print(f"   Class distribution:")
+    print(f"   Dataset size: {n_samples} samples")
+    print("   Class distribution:")
     for cls in CLASSES:
-        count = len(df[df["engagement_level"] == cls])
-        print(f"     {cls}: {count} ({count/len(df)*100:.1f}%)")
-
-    # Prepare features and labels
-    X = df[FEATURE_NAMES].values
-    y = df["engagement_level"].values
-
-    # Encode labels
-    label_encoder = LabelEncoder()
-    y_encoded = label_encoder.fit_transform(y)
+        count = prepared["class_counts"][cls]
+        print(f"     {cls}: {count} ({count/n_samples*100:.1f}%)")
+
+    X_train_scaled, y_train = prepared["X_train"], prepared["y_train"]
+    X_test_scaled, y_test = prepared["X_test"], prepared["y_test"]
+    scaler, label_encoder = prepared["scaler"], prepared["label_encoder"]
+
+    print(f"\n   Train set: {len(X_train_scaled)} | Test set: {len(X_test_scaled)}")
+
+    if len(X_test_scaled) > EVAL_MAX_SAMPLES:
+        eval_rows = np.random.RandomState(seed).choice(
+            len(X_test_scaled), EVAL_MAX_SAMPLES, replace=False
+        )
+        X_eval, y_eval = X_test_scaled[eval_rows], y_test[eval_rows]
+        print(f"   Evaluating on {EVAL_MAX_SAMPLES} sampled test rows")
+    else:
+        X_eval, y_eval = X_test_scaled, y_test
+
+    # ─── Train LR, RF and KNN concurrently ─────────────────────
+    models = build_models()
+    print(f"\n[MODELS] Training {', '.join(models)} ({workers} workers)...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            name: pool.submit(
+                fit_and_evaluate, model, X_train_scaled, y_train,
+                X_eval, y_eval, label_encoder.classes_
+            )
+            for name, model in models.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
 
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
-    )
+    for number, (name, result) in enumerate(results.items(), start=1):
+        print(f"\n[MODEL {number}] {name} (fit {result['fit_seconds']:.1f}s)")
+        print(f"   Accuracy: {result['accuracy']:.4f}")
+        print(result["report"])
 
-    # Scale features
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-
-    print(f"\n   Train set: {len(X_train)} | Test set: {len(X_test)}")
-
-    # ─── Model 1: Multiclass Logistic Regression ────────────────
-    print("\n[MODEL 1] Training Multiclass Logistic Regression...")
-    lr_model = LogisticRegression(
-        solver="lbfgs",
-        max_iter=1000,
-        C=1.0,
-        random_state=42
-    )
-    lr_model.fit(X_train_scaled, y_train)
-    lr_pred = lr_model.predict(X_test_scaled)
-    lr_acc = accuracy_score(y_test, lr_pred)
-    print(f"   Accuracy: {lr_acc:.4f}")
-    print(classification_report(y_test, lr_pred, target_names=label_encoder.classes_))
-
-    # ─── Model 2: Random Forest Classifier ──────────────────────
-    print("[MODEL 2] Training Random Forest Classifier...")
-    rf_model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=12,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        random_state=42,
-        n_jobs=-1
-    )
-    rf_model.fit(X_train_scaled, y_train)
-    rf_pred = rf_model.predict(X_test_scaled)
-    rf_acc = accuracy_score(y_test, rf_pred)
-    print(f"   Accuracy: {rf_acc:.4f}")
-    print(classification_report(y_test, rf_pred, target_names=label_encoder.classes_))
-
-    # ─── Model 3: K-Nearest Neighbors ───────────────────────────
-    print("[MODEL 3] Training KNN Classifier...")
-    knn_model = KNeighborsClassifier(
-        n_neighbors=7,
-        weights="distance",
-        metric="minkowski",
-        p=2
-    )
-    knn_model.fit(X_train_scaled, y_train)
-    knn_pred = knn_model.predict(X_test_scaled)
-    knn_acc = accuracy_score(y_test, knn_pred)
-    print(f"   Accuracy: {knn_acc:.4f}")
-    print(classification_report(y_test, knn_pred, target_names=label_encoder.classes_))
+    lr_model = results["Logistic Regression"]["model"]
+    rf_model = results["Random Forest"]["model"]
+    knn_model = results["KNN"]["model"]
 
     # ─── Save Models ────────────────────────────────────────────
     models_dir = os.path.join(os.path.dirname(__file__), "models")
@@ -265,18 +407,59 @@ def train_and_save_models():
         pickle.dump(FEATURE_NAMES, f)
     print("[SAVED] feature_names.pkl")
 
+    # Memory-mappable copy of the ensemble for fast service startup
+    from artifacts import export_from_pickles
+    export_from_pickles()
+
+    # Neighbour index for the compiled KNN member (see knn_index.py)
+    from knn_index import INDEX_DIRNAME, build_and_save
+    if knn_index:
+        build_and_save(knn_index, models_dir)
+    else:
+        # An index over the previous training rows can't be used any more
+        shutil.rmtree(os.path.join(models_dir, INDEX_DIRNAME), ignore_errors=True)
+
+    # Publish as a new registry version; running services pick it up on reload
+    from model_registry import ModelRegistry
+    registry = ModelRegistry(models_dir)
+    if publish:
+        version = registry.publish_from(
+            models_dir, {"source": "train_models", "samples": n_samples, "seed": seed}
+        )
+        print(f"[SAVED] registry version {version}")
+    elif registry.active_version():
+        print(f"[WARN] Registry version {registry.active_version()} stays active and is still "
+              "served; use --publish (or 'python model_registry.py publish') to serve these models")
+
     # ─── Summary ────────────────────────────────────────────────
     print("\n" + "=" * 60)
     print("  Training Summary")
     print("=" * 60)
-    print(f"  Logistic Regression : {lr_acc:.4f}")
-    print(f"  Random Forest       : {rf_acc:.4f}")
-    print(f"  KNN                 : {knn_acc:.4f}")
-    print(f"  Best Model          : ", end="")
-    best = max([("Logistic Regression", lr_acc), ("Random Forest", rf_acc), ("KNN", knn_acc)], key=lambda x: x[1])
-    print(f"{best[0]} ({best[1]:.4f})")
+    for name, result in results.items():
+        print(f"  {name:<20}: {result['accuracy']:.4f}")
+    print("  Best Model          : ", end="")
+    best = max(results.items(), key=lambda item: item[1]["accuracy"])
+    print(f"{best[0]} ({best[1]['accuracy']:.4f})")
     print("=" * 60)
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Train the engagement ensemble")
+    parser.add_argument("--samples", type=int, default=8000, help="Synthetic rows to generate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=3, help="Models trained at once")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Regenerate the dataset instead of using training_cache/")
+    parser.add_argument("--knn-index", choices=["kd_tree", "ball_tree", "ivf"],
+                        help="Also build a KNN neighbour index in models/knn_index/")
+    parser.add_argument("--publish", action="store_true",
+                        help="Publish the trained models as a new model registry version")
+    args = parser.parse_args()
+    train_and_save_models(
+        n_samples=args.samples, seed=args.seed, use_cache=not args.no_cache,
+        workers=args.workers, knn_index=args.knn_index, publish=args.publish
+    )
+
+
 if __name__ == "__main__":
-    train_and_save_models()
+    main()
@@ -0,0 +1,219 @@
+"""
+EngagePredict - User Insights
+Serves the root-level user pipeline (train_models.py at the repo root):
+StandardScaler -> PCA(3) -> KMeans segments, a RandomForest engagement
+tier classifier and an XGBoost churn regressor, all fitted on the PCA
+projection.
+
+The projection is computed once per batch and shared by the cluster
+assignment, the tier classifier and the churn regressor. With
+ML_USER_INSIGHTS_FUSED=1 (the default) the scaler and PCA are folded into
+one affine map at load time, so the projection is a single matmul:
+
+    ((x - mu) / s - m) @ C.T  ==  x @ (C / s).T - (mu / s + m) @ C.T
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from metrics import STAGE_SECONDS
+
+
+# Model inputs, in the column order the root pipeline was fitted on
+USER_FEATURES = [
+    "session_duration_minutes", "pages_visited", "click_through_rate",
+    "historical_likes", "historical_comments", "days_since_last_login", "device_type"
+]
+# LabelEncoder order used by the root pipeline when no encoder was saved
+DEFAULT_DEVICE_TYPES = ["Desktop", "Mobile", "Tablet"]
+
+# Max allowed |fused - sklearn| projection before the fused map is disabled
+FUSED_TOLERANCE = 1e-6
+
+
+class UserInsightsPredictor:
+    """Segment, engagement tier and churn probability for user activity records."""
+
+    def __init__(self, models_dir: Optional[str] = None, fused: Optional[bool] = None,
+                 lazy: bool = False):
+        self.models_dir = models_dir or os.getenv(
+            "ML_USER_MODELS_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+        )
+        if fused is None:
+            fused = os.getenv("ML_USER_INSIGHTS_FUSED", "1") == "1"
+        self.fused_requested = fused
+
+        self.model_loaded = False
+        self._load_lock = threading.Lock()
+        self.load_state = "pending"
+        self.load_seconds = None
+
+        self.projection_weight = None
+        self.projection_bias = None
+
+        if not lazy:
+            self.ensure_loaded()
+
+    def ensure_loaded(self):
+        """Load models once; concurrent callers wait for the first load."""
+        if self.load_state == "loaded":
+            return
+
+        with self._load_lock:
+            if self.load_state == "loaded":
+                return
+            self.load_state = "loading"
+            start = time.perf_counter()
+            self._load_models()
+            self.load_seconds = round(time.perf_counter() - start, 4)
+            self.load_state = "loaded"
+
+    def is_ready(self) -> bool:
+        return self.model_loaded
+
+    def load_stats(self) -> Dict:
+        return {
+            "state": self.load_state,
+            "load_seconds": self.load_seconds,
+            "fused_projection": self.projection_weight is not None
+        }
+
+    def _load_models(self):
+        try:
+            import joblib
+
+            self.scaler = joblib.load(os.path.join(self.models_dir, "scaler.pkl"))
+            self.pca = joblib.load(os.path.join(self.models_dir, "pca.pkl"))
+            self.kmeans = joblib.load(os.path.join(self.models_dir, "kmeans.pkl"))
+            self.rf_model = joblib.load(os.path.join(self.models_dir, "rf_classifier.pkl"))
+            self.xgb_model = joblib.load(os.path.join(self.models_dir, "xgb_regressor.pkl"))
+
+            encoder_path = os.path.join(self.models_dir, "device_encoder.pkl")
+            device_types = (
+                list(joblib.load(encoder_path).classes_)
+                if os.path.exists(encoder_path) else DEFAULT_DEVICE_TYPES
+            )
+            self.device_index = {name: i for i, name in enumerate(device_types)}
+            self.cluster_centers = np.asarray(self.kmeans.cluster_centers_, dtype=np.float64)
+            self.tiers = np.asarray(self.rf_model.classes_)
+
+            self.model_loaded = True
+            print("[OK] User insights models loaded (scaler, PCA, KMeans, RF, XGBoost)")
+
+        except FileNotFoundError as e:
+            print(f"[WARN] User insights model files not found: {e}")
+            print("   Run 'python train_models.py' at the repo root to train them.")
+            self.model_loaded = False
+            return
+
+        except Exception as e:
+            print(f"[ERROR] Error loading user insights models: {e}")
+            self.model_loaded = False
+            return
+
+        if self.fused_requested:
+            self._fuse_projection()
+
+    def _fuse_projection(self):
+        """Fold the scaler and PCA into one affine map, verified against sklearn."""
+        mean = self.scaler.mean_ if self.scaler.with_mean else 0.0
+        scale = self.scaler.scale_ if self.scaler.with_std else 1.0
+        components = self.pca.components_
+        if self.pca.whiten:
+            components = components / np.sqrt(self.pca.explained_variance_)[:, np.newaxis]
+
+        weight = np.ascontiguousarray((components / scale).T)
+        bias = -(mean / scale + self.pca.mean_) @ components.T
+
+        rng = np.random.default_rng(0)
+        sample = rng.normal(self.scaler.mean_, self.scaler.scale_, size=(64, len(USER_FEATURES)))
+        error = float(np.max(np.abs(sample @ weight + bias - self._sklearn_project(sample))))
+        if error > FUSED_TOLERANCE:
+            print(f"[WARN] Fused user projection deviates by {error:.2e}, using sklearn")
+            return
+
+        self.projection_weight = weight
+        self.projection_bias = bias
+
+    # ─── Inference ──────────────────────────────────────────────
+
+    def feature_matrix(self, users: List[Dict]) -> np.ndarray:
+        """N×7 raw feature matrix; raises ValueError on an unknown device type."""
+        features = np.empty((len(users), len(USER_FEATURES)))
+        for row, user in enumerate(users):
+            device = user["device_type"]
+            if device not in self.device_index:
+                raise ValueError(
+                    f"Unknown device_type {device!r} (expected one of {', '.join(self.device_index)})"
+                )
+            features[row, :-1] = [user[name] for name in USER_FEATURES[:-1]]
+            features[row, -1] = self.device_index[device]
+        return features
+
+    def _sklearn_project(self, features: np.ndarray) -> np.ndarray:
+        # The root pipeline fitted the scaler on a DataFrame; pass one with
+        # its columns so sklearn doesn't warn about missing feature names
+        names = getattr(self.scaler, "feature_names_in_", None)
+        if names is not None:
+            features = pd.DataFrame(features, columns=USER_FEATURES)[list(names)]
+        return self.pca.transform(self.scaler.transform(features))
+
+    def project(self, features: np.ndarray) -> np.ndarray:
+        """Scaler -> PCA projection of an N×7 feature matrix."""
+        if self.projection_weight is not None:
+            return features @ self.projection_weight + self.projection_bias
+        return self._sklearn_project(features)
+
+    def predict_batch(self, users: List[Dict]) -> List[Dict]:
+        """
+        Insights for many users in one pass.
+
+        Each user is a dict with the USER_FEATURES keys. The PCA projection
+        is computed once and reused by KMeans, the RF classifier and the
+        XGBoost regressor.
+        """
+        if not users:
+            return []
+        self.ensure_loaded()
+        if not self.model_loaded:
+            raise RuntimeError("User insights models not loaded; run the root train_models.py first")
+
+        features = self.feature_matrix(users)
+        with STAGE_SECONDS.time("user_projection"):
+            projected = self.project(features)
+
+        with STAGE_SECONDS.time("user_segment"):
+            sq_dist = (
+                np.einsum("ij,ij->i", projected, projected)[:, np.newaxis]
+                - 2.0 * projected @ self.cluster_centers.T
+                + np.einsum("ij,ij->i", self.cluster_centers, self.cluster_centers)
+            )
+            clusters = np.argmin(sq_dist, axis=1)
+        with STAGE_SECONDS.time("user_tier"):
+            tier_proba = self.rf_model.predict_proba(projected)
+        with STAGE_SECONDS.time("user_churn"):
+            churn = np.clip(self.xgb_model.predict(projected), 0.0, 1.0)
+
+        tiers = self.tiers[np.argmax(tier_proba, axis=1)]
+        return [
+            {
+                "cluster": int(cluster),
+                "engagement_tier": str(tier),
+                "tier_probabilities": {
+                    str(name): round(float(p), 4) for name, p in zip(self.tiers, proba)
+                },
+                "churn_probability": round(float(churn_p), 4),
+                "components": [round(float(c), 6) for c in components]
+            }
+            for cluster, tier, proba, churn_p, components
+            in zip(clusters, tiers, tier_proba, churn, projected)
+        ]
+
+    def predict(self, user: Dict) -> Dict:
+        return self.predict_batch([user])[0]
@@ -70,5 +70,6 @@ joblib.dump(pca, 'models/pca.pkl')
 joblib.dump(kmeans, 'models/kmeans.pkl')
 joblib.dump(rf_model, 'models/rf_classifier.pkl')
 joblib.dump(xgb_model, 'models/xgb_regressor.pkl')
+joblib.dump(le_device, 'models/device_encoder.pkl')
 print("All models successfully saved to the 'models' directory.")
 print("PIPELINE EXECUTION 100% COMPLETE.")